@@ -0,0 +1,22 @@
+# Configuración de gunicorn (se carga sola al arrancar desde la raíz del proyecto).
+#
+# Con PROMETHEUS_MULTIPROC_DIR definido, cada worker escribe sus métricas en
+# ese directorio y /metrics las suma (ver tienda.metricas). Aquí se vacía al
+# arrancar, para no sumar valores de una ejecución anterior, y se marcan los
+# workers que terminan para que sus métricas de proceso dejen de exponerse.
+import os
+import shutil
+
+directorio_metricas = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+
+def on_starting(server):
+    if directorio_metricas:
+        shutil.rmtree(directorio_metricas, ignore_errors=True)
+        os.makedirs(directorio_metricas, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if directorio_metricas:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
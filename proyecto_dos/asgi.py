@@ -5,6 +5,12 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Con SERVIDOR_ASGI (y DEBUG desactivado) WhiteNoiseMiddleware no está en
+MIDDLEWARE, porque solo es síncrono y obligaría a ejecutar toda la cadena de
+middleware a través de un adaptador sync. Las peticiones a STATIC_URL se
+desvían aquí a WhiteNoise, en un hilo, y el resto llega a Django sin pasar
+por ningún adaptador.
 """
 
 import os
@@ -14,3 +20,21 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'proyecto_dos.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402  (después de configurar Django)
+
+if 'whitenoise.middleware.WhiteNoiseMiddleware' not in settings.MIDDLEWARE:
+    from asgiref.wsgi import WsgiToAsgi
+    from whitenoise import WhiteNoise
+
+    def _no_encontrado(environ, start_response):
+        start_response('404 Not Found', [('Content-Type', 'text/plain')])
+        return [b'Not Found']
+
+    _estaticos = WsgiToAsgi(WhiteNoise(_no_encontrado, root=settings.STATIC_ROOT, prefix=settings.STATIC_URL))
+    _django = application
+
+    async def application(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'].startswith(settings.STATIC_URL):
+            return await _estaticos(scope, receive, send)
+        return await _django(scope, receive, send)
@@ -66,10 +66,18 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     # WhiteNoise should be placed directly after SecurityMiddleware
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Latencia y consultas por URL para Prometheus (ver tienda.metricas)
+    'tienda.metricas.MetricasMiddleware',
+    # Cabecera Server-Timing con el tiempo de base de datos, plantillas y PDF (ver tienda.tiempos)
+    'tienda.tiempos.ServerTimingMiddleware',
+    # Consultas por petición y avisos de N+1 (TIENDA_MEDIR_CONSULTAS, ver tienda.consultas)
+    'tienda.consultas.ConsultasMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Lecturas de la primaria tras escribir (solo con REPORTS_DATABASE_URL)
+    'tienda.replica.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -78,7 +86,8 @@ ROOT_URLCONF = 'proyecto_dos.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que mide el tiempo de renderizado para Server-Timing
+        'BACKEND': 'tienda.tiempos.DjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -104,11 +113,34 @@ WSGI_APPLICATION = 'proyecto_dos.wsgi.application'
 #     }
 # }
 
+# Despliegue ASGI (gunicorn con workers de uvicorn, ver ACCESO_RÁPIDO.txt).
+# Con ASGI las conexiones persistentes no se reutilizan entre peticiones y se
+# acumulan: se cierran al terminar cada petición (CONN_MAX_AGE = 0)
+SERVIDOR_ASGI = os.environ.get('SERVIDOR_ASGI', '') == '1'
+if SERVIDOR_ASGI and not DEBUG:
+    # WhiteNoiseMiddleware solo es síncrono: haría pasar cada petición por un hilo
+    # (adaptador sync). Los estáticos los sirve proyecto_dos.asgi antes de Django
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
+# Opciones del perfil de rendimiento de SQLite (ver DATABASES)
+SQLITE_OPCIONES_RENDIMIENTO = {
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA busy_timeout=5000;'
+        'PRAGMA mmap_size=268435456;'
+        'PRAGMA cache_size=-65536;'
+        'PRAGMA temp_store=MEMORY;'
+    ),
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 5,
+}
+
 # DATABASE: usar DATABASE_URL si está definido, sino SQLite para desarrollo local
 DATABASE_URL = os.environ.get('DATABASE_URL')
 if DATABASE_URL:
     DATABASES = {
-        'default': dj_database_url.config(default=DATABASE_URL, conn_max_age=600)
+        'default': dj_database_url.config(default=DATABASE_URL, conn_max_age=0 if SERVIDOR_ASGI else 600)
     }
 else:
     DATABASES = {
@@ -117,6 +149,53 @@ else:
             'NAME': BASE_DIR / 'db.sqlite3',
         }
     }
+    # Perfil de rendimiento de SQLite (SQLITE_PERFIL=basico lo desactiva):
+    # WAL para que las lecturas no bloqueen las escrituras, synchronous=NORMAL
+    # (seguro con WAL), espera de hasta 5 s si la base está bloqueada, mmap y
+    # caché de páginas de 64 MB, y transacciones IMMEDIATE para que una
+    # transacción que lee y luego escribe no falle con "database is locked".
+    # Comparar perfiles con: python manage.py probar_concurrencia
+    if os.environ.get('SQLITE_PERFIL', 'rendimiento') == 'rendimiento':
+        DATABASES['default']['OPTIONS'] = SQLITE_OPCIONES_RENDIMIENTO
+        DATABASES['default']['CONN_MAX_AGE'] = 0 if SERVIDOR_ASGI else 600
+    # Los tests usan SQLite en memoria. La memoria compartida no espera a los
+    # bloqueos, así que la prueba de compras concurrentes solo se ejecuta con la
+    # base de tests en archivo: SQLITE_TESTS_ARCHIVO=1 python manage.py test
+    if os.environ.get('SQLITE_TESTS_ARCHIVO') == '1':
+        DATABASES['default']['TEST'] = {'NAME': BASE_DIR / 'test_db.sqlite3'}
+
+# Réplica de solo lectura para reportes (opcional, ver tienda.replica). Para
+# probar en local con dos archivos SQLite: REPORTS_DATABASE_URL=sqlite:///replica.sqlite3
+REPORTS_DATABASE_URL = os.environ.get('REPORTS_DATABASE_URL')
+if REPORTS_DATABASE_URL:
+    DATABASES['reportes'] = dj_database_url.parse(REPORTS_DATABASE_URL, conn_max_age=0 if SERVIDOR_ASGI else 600)
+    # En los tests la réplica es la misma base que la primaria
+    DATABASES['reportes']['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['tienda.replica.RouterReplica']
+# Segundos que una sesión lee de la primaria después de escribir (margen para el retraso de la réplica)
+TIENDA_REPLICA_RETRASO_SEGUNDOS = int(os.environ.get('TIENDA_REPLICA_RETRASO_SEGUNDOS', '10'))
+
+# Caché: Redis si REDIS_URL está definido (compartida entre workers de gunicorn),
+# memoria local del proceso en desarrollo. En producción la memoria local no
+# sirve: cada worker tendría su propio carrito, versión de reportes y permisos
+# cacheados. Con un solo proceso se puede aceptar con TIENDA_CACHE_LOCAL=1.
+REDIS_URL = os.environ.get('REDIS_URL')
+if not REDIS_URL and not DEBUG and os.environ.get('TIENDA_CACHE_LOCAL') != '1':
+    raise RuntimeError('Falta la variable de entorno REDIS_URL (caché compartida entre workers)')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'tienda',
+        }
+    }
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -181,6 +260,9 @@ if not DEBUG:
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Permisos de usuario, grupos y roles (tienda.Rol) con caché por usuario
+AUTHENTICATION_BACKENDS = ['tienda.permisos.RolBackend']
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'tienda:home'
 LOGOUT_REDIRECT_URL = 'login'
@@ -193,3 +275,77 @@ if env_csrf:
     for origin in [o.strip() for o in env_csrf.split(',') if o.strip()]:
         CSRF_TRUSTED_ORIGINS.append(origin)
 
+
+# Reportes: agregar sobre el resumen diario (VentaDiaria) en lugar de recorrer
+# todas las ventas. Reconstruir con: python manage.py reconstruir_resumen
+TIENDA_REPORTES_DESDE_RESUMEN = os.environ.get('TIENDA_REPORTES_DESDE_RESUMEN', 'True').lower() in ('1', 'true', 'yes')
+
+# Tamaño de página por defecto de los listados de ventas (paginación por cursor)
+TIENDA_VENTAS_POR_PAGINA = int(os.environ.get('TIENDA_VENTAS_POR_PAGINA', '50'))
+
+# Filas de detalle en la descarga directa del PDF de reportes. ReportLab guarda todas
+# las páginas hasta terminar (la memoria crece con las filas): para más, la
+# exportación en segundo plano o el CSV
+TIENDA_PDF_MAX_FILAS = int(os.environ.get('TIENDA_PDF_MAX_FILAS', '2000'))
+# Lo mismo para los PDF de las exportaciones en segundo plano (memoria del worker)
+TIENDA_EXPORTACION_PDF_MAX_FILAS = int(os.environ.get('TIENDA_EXPORTACION_PDF_MAX_FILAS', '20000'))
+
+# Minutos tras los que una exportación en proceso se da por abandonada (el worker
+# terminó a mitad) y otro worker la vuelve a generar
+TIENDA_EXPORTACION_MINUTOS_MAXIMOS = int(os.environ.get('TIENDA_EXPORTACION_MINUTOS_MAXIMOS', '30'))
+
+# Archivos generados (exportaciones de reportes en segundo plano)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = Path(os.environ.get('MEDIA_ROOT', BASE_DIR / 'media'))
+
+# Segundos que se guarda en caché el resultado de un reporte (0 desactiva la caché).
+# Con caché local por proceso limita también cuánto puede tardar un worker en ver datos nuevos.
+TIENDA_CACHE_REPORTES_SEGUNDOS = int(os.environ.get('TIENDA_CACHE_REPORTES_SEGUNDOS', '300'))
+
+# Productos por página en el catálogo
+TIENDA_CATALOGO_POR_PAGINA = int(os.environ.get('TIENDA_CATALOGO_POR_PAGINA', '24'))
+
+# Segundos que se guardan las tarjetas de producto del catálogo (0 desactiva la caché)
+TIENDA_CACHE_TARJETAS_SEGUNDOS = int(os.environ.get('TIENDA_CACHE_TARJETAS_SEGUNDOS', '3600'))
+
+# Dónde vive el carrito activo: 'bd' (CarritoItem), 'cache' o 'sesion' (ver tienda.carrito).
+# Con 'cache', ejecutar periódicamente `manage.py guardar_carritos`.
+TIENDA_CARRITO = os.environ.get('TIENDA_CARRITO', 'bd')
+TIENDA_CARRITO_SEGUNDOS = 7 * 24 * 3600
+
+# Minutos que una línea del carrito mantiene reservado su stock (0 desactiva las reservas)
+TIENDA_RESERVA_MINUTOS = int(os.environ.get('TIENDA_RESERVA_MINUTOS', '15'))
+# Días tras los que `manage.py limpiar_reservas` borra líneas de carrito sin reserva vigente
+TIENDA_CARRITO_ABANDONADO_DIAS = 7
+
+# Cabeceras X-Consultas y avisos de N+1 (logger 'tienda.consultas') en cada petición;
+# por defecto solo con DEBUG
+TIENDA_MEDIR_CONSULTAS = os.environ.get('TIENDA_MEDIR_CONSULTAS', str(DEBUG)).lower() in ('1', 'true', 'yes')
+# Repeticiones de una misma consulta en una petición a partir de las que se avisa de un N+1
+TIENDA_N_MAS_1_UMBRAL = 5
+
+# Línea JSON por petición en el logger 'tienda.tiempos' y cabecera Server-Timing
+# (esta solo en DEBUG o para el personal de la tienda)
+TIENDA_SERVER_TIMING = os.environ.get('TIENDA_SERVER_TIMING', 'True').lower() in ('1', 'true', 'yes')
+
+# Métricas de Prometheus en /metrics (requiere prometheus-client). Con varios workers de
+# gunicorn, definir PROMETHEUS_MULTIPROC_DIR en el entorno (ver gunicorn.conf.py).
+TIENDA_METRICAS = os.environ.get('TIENDA_METRICAS', 'True').lower() in ('1', 'true', 'yes')
+# Token que debe enviar Prometheus (Authorization: Bearer ...); sin él, /metrics solo
+# responde al personal de la tienda (o a cualquiera con DEBUG)
+TIENDA_METRICAS_TOKEN = os.environ.get('TIENDA_METRICAS_TOKEN', '')
+
+# Logs de la aplicación (tiempos por petición, avisos de N+1) a la consola
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'consola': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'tienda': {
+            'handlers': ['consola'],
+            'level': os.environ.get('TIENDA_LOG_NIVEL', 'INFO'),
+        },
+    },
+}
@@ -1,11 +1,13 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.contrib.auth import views as auth_views
-from tienda.views import logout_view
+from tienda.views import logout_view, metricas
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('tienda.urls')),
     path('login/', auth_views.LoginView.as_view(template_name='login.html'), name='login'),
     path('logout/', logout_view, name='logout'),
+    # Métricas para Prometheus (ver tienda.metricas)
+    path('metrics', metricas, name='metricas'),
 ]
@@ -76,9 +76,19 @@ def crear_roles():
     gerente_rol.permisos.set(gerente_perms)
     print("✓ Rol Gerente configurado" if created else "✓ Rol Gerente ya existe")
 
+def asignar_roles():
+    """Asigna a los usuarios de prueba su rol (los permisos se resuelven desde Rol)"""
+    for username, tipo in [('vendedor', 'vendedor'), ('gerente', 'gerente')]:
+        user = User.objects.filter(username=username).first()
+        if user:
+            Rol.objects.get(tipo=tipo).usuarios.add(user)
+            print(f"✓ Usuario {username} asignado al rol {tipo}")
+
 if __name__ == '__main__':
     print("Configurando permisos y roles del sistema...")
     crear_permisos()
     print("\nCreando roles...")
     crear_roles()
+    print("\nAsignando roles...")
+    asignar_roles()
     print("\n✓ Configuración completada!")
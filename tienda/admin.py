@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.models import User, Group, Permission
+from django.utils.decorators import method_decorator
 from .models import Categoria, Producto, Venta, Rol
+from .replica import leer_de_replica
 
 @admin.register(Categoria)
 class CategoriaAdmin(admin.ModelAdmin):
@@ -17,19 +19,27 @@ class ProductoAdmin(admin.ModelAdmin):
 @admin.register(Venta)
 class VentaAdmin(admin.ModelAdmin):
     list_display = ['producto', 'cantidad', 'fecha', 'vendedor', 'get_total']
+    # producto y vendedor se muestran en cada fila
+    list_select_related = ['producto', 'vendedor']
     list_filter = ['fecha', 'producto__categoria', 'vendedor']
     search_fields = ['producto__nombre', 'vendedor__username']
-    readonly_fields = ['fecha', 'id']
+    # Venta.save() fija el precio del momento y calcula el total
+    readonly_fields = ['fecha', 'id', 'precio_unitario', 'total']
     date_hierarchy = 'fecha'
     
     def get_total(self, obj):
-        return f"${obj.total():.2f}"
+        return f"${obj.total:.2f}"
     get_total.short_description = 'Total'
+    
+    @method_decorator(leer_de_replica)
+    def changelist_view(self, request, extra_context=None):
+        # El listado de ventas lee de la réplica de reportes (ver tienda.replica)
+        return super().changelist_view(request, extra_context)
 
 @admin.register(Rol)
 class RolAdmin(admin.ModelAdmin):
     list_display = ['tipo', 'descripcion']
-    filter_horizontal = ['permisos']
+    filter_horizontal = ['permisos', 'usuarios']
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class TiendaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tienda'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .consultas import instalar
+
+        # El medidor de consultas va en todas las conexiones desde su apertura;
+        # sin un registro activo (ver tienda.consultas) no hace nada
+        instalar()
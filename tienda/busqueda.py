@@ -0,0 +1,179 @@
+"""
+Índice de búsqueda de texto completo del catálogo.
+
+- SQLite: tabla virtual FTS5 (tienda_producto_fts) con el tokenizador
+  unicode61 sin diacríticos, mantenida por triggers.
+- PostgreSQL: columna tsvector (tienda_producto.busqueda) con índice GIN,
+  configuración 'spanish' + unaccent, mantenida por triggers.
+
+En ambos casos "cafe" encuentra "Café" y los resultados se ordenan por
+relevancia. Con otros motores se usa icontains.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+SQLITE_CREAR = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS tienda_producto_fts USING fts5(
+        nombre, categoria, tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS tienda_producto_fts_ai AFTER INSERT ON tienda_producto BEGIN
+        INSERT INTO tienda_producto_fts(rowid, nombre, categoria)
+        VALUES (new.id, new.nombre, (SELECT nombre FROM tienda_categoria WHERE id = new.categoria_id));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tienda_producto_fts_au AFTER UPDATE OF nombre, categoria_id ON tienda_producto BEGIN
+        DELETE FROM tienda_producto_fts WHERE rowid = old.id;
+        INSERT INTO tienda_producto_fts(rowid, nombre, categoria)
+        VALUES (new.id, new.nombre, (SELECT nombre FROM tienda_categoria WHERE id = new.categoria_id));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tienda_producto_fts_ad AFTER DELETE ON tienda_producto BEGIN
+        DELETE FROM tienda_producto_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tienda_categoria_fts_au AFTER UPDATE OF nombre ON tienda_categoria BEGIN
+        UPDATE tienda_producto_fts SET categoria = new.nombre
+        WHERE rowid IN (SELECT id FROM tienda_producto WHERE categoria_id = new.id);
+    END""",
+]
+
+SQLITE_POBLAR = [
+    "DELETE FROM tienda_producto_fts",
+    """INSERT INTO tienda_producto_fts(rowid, nombre, categoria)
+       SELECT p.id, p.nombre, c.nombre
+       FROM tienda_producto p JOIN tienda_categoria c ON c.id = p.categoria_id""",
+]
+
+SQLITE_ELIMINAR_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS tienda_categoria_fts_au",
+    "DROP TRIGGER IF EXISTS tienda_producto_fts_ad",
+    "DROP TRIGGER IF EXISTS tienda_producto_fts_au",
+    "DROP TRIGGER IF EXISTS tienda_producto_fts_ai",
+]
+
+SQLITE_ELIMINAR = SQLITE_ELIMINAR_TRIGGERS + [
+    "DROP TABLE IF EXISTS tienda_producto_fts",
+]
+
+POSTGRES_CREAR = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "ALTER TABLE tienda_producto ADD COLUMN IF NOT EXISTS busqueda tsvector",
+    "CREATE INDEX IF NOT EXISTS tienda_producto_busqueda_gin ON tienda_producto USING GIN (busqueda)",
+    """CREATE OR REPLACE FUNCTION tienda_producto_busqueda_actualizar() RETURNS trigger AS $$
+    BEGIN
+        NEW.busqueda :=
+            setweight(to_tsvector('spanish', unaccent(coalesce(NEW.nombre, ''))), 'A') ||
+            setweight(to_tsvector('spanish', unaccent(coalesce(
+                (SELECT nombre FROM tienda_categoria WHERE id = NEW.categoria_id), ''))), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS tienda_producto_busqueda_trg ON tienda_producto",
+    """CREATE TRIGGER tienda_producto_busqueda_trg
+       BEFORE INSERT OR UPDATE OF nombre, categoria_id ON tienda_producto
+       FOR EACH ROW EXECUTE FUNCTION tienda_producto_busqueda_actualizar()""",
+    """CREATE OR REPLACE FUNCTION tienda_categoria_busqueda_actualizar() RETURNS trigger AS $$
+    BEGIN
+        UPDATE tienda_producto SET nombre = nombre WHERE categoria_id = NEW.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS tienda_categoria_busqueda_trg ON tienda_categoria",
+    """CREATE TRIGGER tienda_categoria_busqueda_trg
+       AFTER UPDATE OF nombre ON tienda_categoria
+       FOR EACH ROW EXECUTE FUNCTION tienda_categoria_busqueda_actualizar()""",
+]
+
+POSTGRES_POBLAR = [
+    "UPDATE tienda_producto SET nombre = nombre",
+]
+
+POSTGRES_ELIMINAR = [
+    "DROP TRIGGER IF EXISTS tienda_categoria_busqueda_trg ON tienda_categoria",
+    "DROP FUNCTION IF EXISTS tienda_categoria_busqueda_actualizar()",
+    "DROP TRIGGER IF EXISTS tienda_producto_busqueda_trg ON tienda_producto",
+    "DROP FUNCTION IF EXISTS tienda_producto_busqueda_actualizar()",
+    "DROP INDEX IF EXISTS tienda_producto_busqueda_gin",
+    "ALTER TABLE tienda_producto DROP COLUMN IF EXISTS busqueda",
+]
+
+_SENTENCIAS = {
+    'sqlite': (SQLITE_CREAR, SQLITE_POBLAR, SQLITE_ELIMINAR),
+    'postgresql': (POSTGRES_CREAR, POSTGRES_POBLAR, POSTGRES_ELIMINAR),
+}
+
+
+def _ejecutar(conexion, sentencias):
+    with conexion.cursor() as cursor:
+        for sql in sentencias:
+            cursor.execute(sql)
+
+
+def crear_indice(conexion, poblar=True):
+    """
+    Crea (si falta) el índice y sus triggers y, opcionalmente, lo rellena
+    con los productos existentes. También restaura los triggers tras
+    suspender_triggers().
+    """
+    if conexion.vendor not in _SENTENCIAS:
+        return
+    crear, rellenar, _ = _SENTENCIAS[conexion.vendor]
+    _ejecutar(conexion, crear)
+    if poblar:
+        _ejecutar(conexion, rellenar)
+
+
+def suspender_triggers(conexion):
+    """
+    Quita los triggers de SQLite antes de una migración que reconstruya
+    tienda_producto o tienda_categoria (el renombrado de tablas falla con
+    triggers que las referencian). Restaurar después con crear_indice().
+    """
+    if conexion.vendor == 'sqlite':
+        _ejecutar(conexion, SQLITE_ELIMINAR_TRIGGERS)
+
+
+def eliminar_indice(conexion):
+    if conexion.vendor in _SENTENCIAS:
+        _ejecutar(conexion, _SENTENCIAS[conexion.vendor][2])
+
+
+def _terminos(q):
+    """Palabras de la búsqueda (letras y dígitos), sin operadores del motor"""
+    return re.findall(r'\w+', q.lower())
+
+
+def buscar_productos(productos, q):
+    """
+    Filtra el queryset `productos` por el texto `q` y lo ordena por relevancia.
+    Cada palabra se busca como prefijo ("lamp" encuentra "Lámpara").
+    """
+    terminos = _terminos(q)
+    if not terminos:
+        return productos
+
+    if connection.vendor == 'sqlite':
+        consulta = ' '.join(f'"{t}"*' for t in terminos)
+        # La relevancia se lee por rowid de la misma búsqueda: FTS5 resuelve
+        # MATCH + rowid = ? saltando en la lista de coincidencias
+        return productos.filter(
+            id__in=RawSQL('SELECT rowid FROM tienda_producto_fts WHERE tienda_producto_fts MATCH %s', (consulta,)),
+        ).annotate(
+            rango=RawSQL(
+                'SELECT rank FROM tienda_producto_fts '
+                'WHERE tienda_producto_fts MATCH %s AND rowid = tienda_producto.id',
+                (consulta,),
+                output_field=FloatField(),
+            ),
+        ).order_by('rango', 'nombre')
+
+    if connection.vendor == 'postgresql':
+        consulta = ' & '.join(f'{t}:*' for t in terminos)
+        tsquery = "to_tsquery('spanish', unaccent(%s))"
+        return productos.filter(
+            RawSQL(f'tienda_producto.busqueda @@ {tsquery}', (consulta,), output_field=BooleanField()),
+        ).annotate(
+            rango=RawSQL(f'ts_rank(tienda_producto.busqueda, {tsquery})', (consulta,), output_field=FloatField()),
+        ).order_by('-rango', 'nombre')
+
+    return productos.filter(Q(nombre__icontains=q) | Q(categoria__nombre__icontains=q))
@@ -0,0 +1,147 @@
+"""
+Caché de resultados de reportes.
+
+La clave combina el nombre del reporte, los criterios normalizados y una
+versión global de los datos de ventas. Cualquier cambio en Venta, Producto o
+Categoria incrementa la versión (al confirmarse la transacción), con lo que
+las entradas anteriores dejan de consultarse y caducan solas.
+
+Las funciones con prefijo `a` son las versiones para vistas async: usan los
+métodos async de la caché para no bloquear el bucle de eventos con las
+llamadas de red a Redis.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .metricas import contar_cache
+
+CLAVE_VERSION = 'tienda:reportes:version'
+CLAVE_ACIERTOS = 'tienda:reportes:aciertos'
+CLAVE_FALLOS = 'tienda:reportes:fallos'
+
+
+def _nueva_version():
+    # Basada en el reloj: si la caché pierde la clave, nunca se reutiliza una versión antigua
+    return time.time_ns()
+
+
+def version_ventas():
+    """Versión actual de los datos de ventas"""
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        version = _nueva_version()
+        if not cache.add(CLAVE_VERSION, version, timeout=None):
+            version = cache.get(CLAVE_VERSION, version)
+    return version
+
+
+async def aversion_ventas():
+    version = await cache.aget(CLAVE_VERSION)
+    if version is None:
+        version = _nueva_version()
+        if not await cache.aadd(CLAVE_VERSION, version, timeout=None):
+            version = await cache.aget(CLAVE_VERSION, version)
+    return version
+
+
+def _incrementar_version():
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        cache.set(CLAVE_VERSION, _nueva_version(), timeout=None)
+
+
+def invalidar_reportes():
+    """Invalida los reportes cacheados cuando se confirme la transacción en curso"""
+    transaction.on_commit(_incrementar_version)
+
+
+def _contar(clave):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        if not cache.add(clave, 1, timeout=None):
+            cache.incr(clave)
+
+
+async def _acontar(clave):
+    try:
+        await cache.aincr(clave)
+    except ValueError:
+        if not await cache.aadd(clave, 1, timeout=None):
+            await cache.aincr(clave)
+
+
+def _huella(criterios):
+    normalizado = json.dumps(criterios, sort_keys=True, default=str)
+    return hashlib.sha256(normalizado.encode('utf-8')).hexdigest()[:32]
+
+
+def clave_reporte(nombre, criterios):
+    return f'tienda:reporte:{nombre}:{version_ventas()}:{_huella(criterios)}'
+
+
+async def aclave_reporte(nombre, criterios):
+    return f'tienda:reporte:{nombre}:{await aversion_ventas()}:{_huella(criterios)}'
+
+
+def obtener_reporte(nombre, criterios, calcular):
+    """
+    Devuelve el resultado cacheado del reporte `nombre` para `criterios`,
+    o lo calcula con `calcular()` y lo guarda.
+    """
+    segundos = getattr(settings, 'TIENDA_CACHE_REPORTES_SEGUNDOS', 300)
+    if not segundos:
+        return calcular()
+
+    clave = clave_reporte(nombre, criterios)
+    resultado = cache.get(clave)
+    if resultado is not None:
+        _contar(CLAVE_ACIERTOS)
+        contar_cache('reportes', aciertos=1)
+        return resultado
+
+    _contar(CLAVE_FALLOS)
+    contar_cache('reportes', fallos=1)
+    resultado = calcular()
+    cache.set(clave, resultado, timeout=segundos)
+    return resultado
+
+
+async def aobtener_reporte(nombre, criterios, calcular):
+    """Versión async de obtener_reporte: `calcular` es una función async"""
+    segundos = getattr(settings, 'TIENDA_CACHE_REPORTES_SEGUNDOS', 300)
+    if not segundos:
+        return await calcular()
+
+    clave = await aclave_reporte(nombre, criterios)
+    resultado = await cache.aget(clave)
+    if resultado is not None:
+        await _acontar(CLAVE_ACIERTOS)
+        contar_cache('reportes', aciertos=1)
+        return resultado
+
+    await _acontar(CLAVE_FALLOS)
+    contar_cache('reportes', fallos=1)
+    resultado = await calcular()
+    await cache.aset(clave, resultado, timeout=segundos)
+    return resultado
+
+
+def estadisticas():
+    """Aciertos, fallos y ratio de acierto acumulados de la caché de reportes"""
+    valores = cache.get_many([CLAVE_ACIERTOS, CLAVE_FALLOS])
+    aciertos = valores.get(CLAVE_ACIERTOS, 0)
+    fallos = valores.get(CLAVE_FALLOS, 0)
+    total = aciertos + fallos
+    return {
+        'aciertos': aciertos,
+        'fallos': fallos,
+        'ratio_acierto': aciertos / total if total else None,
+        'version': version_ventas(),
+    }
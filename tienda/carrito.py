@@ -0,0 +1,345 @@
+"""
+Almacenamiento del carrito de compras.
+
+Según TIENDA_CARRITO el carrito activo vive en:
+
+- 'bd' (por defecto): CarritoItem, una escritura por operación.
+- 'cache': la caché de Django (Redis en producción), por usuario.
+- 'sesion': la sesión del usuario.
+
+En los modos 'cache' y 'sesion' las operaciones no tocan CarritoItem: el
+contenido se vuelca a la base de datos (persistir) al procesar la compra, al
+cerrar sesión (ver tienda.signals) y, en modo 'cache', periódicamente con el
+comando guardar_carritos. Si el carrito no está en la caché o la sesión se
+carga desde CarritoItem. Las líneas se identifican por el id del producto.
+
+Las cantidades se limitan al stock disponible y quedan reservadas durante
+un tiempo (ver tienda.reservas). En los modos 'cache' y 'sesion' añadir o
+cambiar una línea solo lee el stock: las reservas se escriben al persistir,
+para que el tráfico del carrito no pase por transacciones en la base de
+datos. El total del carrito se calcula siempre con un único agregado en la base de
+datos (totales()), que es lo que devuelve la API JSON del carrito.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Sum, Value, When
+
+from .models import CarritoItem, Producto
+from .reservas import liberar, limitar_varios, reservar, reservar_varios, sincronizar
+
+CLAVE_PENDIENTES = 'tienda:carritos:pendientes'
+CLAVE_SESION = 'tienda_carrito'
+
+
+class Linea:
+    """Línea del carrito con la misma interfaz que CarritoItem en las plantillas"""
+
+    def __init__(self, producto, cantidad):
+        self.producto = producto
+        self.cantidad = cantidad
+
+    @property
+    def id(self):
+        return self.producto.pk
+
+    def subtotal(self):
+        return self.cantidad * self.producto.precio
+
+    def como_dict(self):
+        return {
+            'producto_id': self.producto.pk,
+            'nombre': self.producto.nombre,
+            'cantidad': self.cantidad,
+            'precio': str(self.producto.precio),
+            'subtotal': str(self.subtotal()),
+            'stock': self.producto.stock,
+        }
+
+
+def _totales(agregado):
+    return {
+        'num_lineas': agregado['num_lineas'] or 0,
+        'unidades': agregado['unidades'] or 0,
+        'total': (agregado['total'] or Decimal('0')).quantize(Decimal('0.01')),
+    }
+
+
+class CarritoBD:
+    """Carrito guardado directamente en CarritoItem"""
+
+    def __init__(self, usuario_id, request=None):
+        self.usuario_id = usuario_id
+
+    def _items(self):
+        return CarritoItem.objects.filter(usuario_id=self.usuario_id)
+
+    def lineas(self, producto_ids=None):
+        # carrito.html muestra la categoría de cada producto
+        items = self._items().select_related('producto__categoria')
+        if producto_ids is not None:
+            items = items.filter(producto_id__in=producto_ids)
+        return [Linea(item.producto, item.cantidad) for item in items]
+
+    def totales(self):
+        """Número de líneas, unidades y total del carrito en una sola consulta"""
+        return _totales(self._items().aggregate(
+            num_lineas=Count('id'),
+            unidades=Sum('cantidad'),
+            total=Sum(
+                F('cantidad') * F('producto__precio'),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+        ))
+
+    def agregar(self, producto, cantidad):
+        """Suma `cantidad` a la línea, limitada al stock disponible, y la reserva"""
+        # Reserva y línea en la misma transacción: no queda una sin la otra
+        with transaction.atomic():
+            actual = self._items().filter(producto=producto).values_list('cantidad', flat=True).first() or 0
+            concedida = reservar(self.usuario_id, producto.pk, actual + cantidad)
+            CarritoItem.objects.update_or_create(
+                usuario_id=self.usuario_id,
+                producto=producto,
+                defaults={'cantidad': concedida},
+            )
+
+    def actualizar(self, producto_id, cantidad):
+        """Cambia la cantidad de una línea; con cantidad <= 0 la elimina"""
+        presentes, _ = self.actualizar_varios({producto_id: cantidad})
+        return producto_id in presentes
+
+    def actualizar_varios(self, cantidades):
+        """
+        Aplica {producto_id: cantidad} a las líneas existentes: las cantidades
+        <= 0 eliminan la línea y las que superan el stock disponible se ignoran.
+        Devuelve (ids de producto que estaban en el carrito, ids rechazados
+        por falta de stock).
+        """
+        with transaction.atomic():
+            items = list(self._items().filter(producto_id__in=cantidades))
+            concedidas = reservar_varios(
+                self.usuario_id,
+                {item.producto_id: cantidades[item.producto_id] for item in items if cantidades[item.producto_id] > 0},
+                parcial=False,
+            )
+            cambiados = []
+            eliminados = []
+            for item in items:
+                cantidad = cantidades[item.producto_id]
+                if cantidad <= 0:
+                    eliminados.append(item)
+                elif item.producto_id in concedidas and cantidad != item.cantidad:
+                    item.cantidad = cantidad
+                    cambiados.append(item)
+            CarritoItem.objects.bulk_update(cambiados, ['cantidad'])
+            if eliminados:
+                CarritoItem.objects.filter(pk__in=[item.pk for item in eliminados]).delete()
+                liberar(self.usuario_id, [item.producto_id for item in eliminados])
+        rechazados = {
+            item.producto_id for item in items
+            if cantidades[item.producto_id] > 0 and item.producto_id not in concedidas
+        }
+        return {item.producto_id for item in items}, rechazados
+
+    def eliminar(self, producto_id):
+        liberar(self.usuario_id, [producto_id])
+        return self._items().filter(producto_id=producto_id).delete()[0] > 0
+
+    def persistir(self):
+        pass
+
+    def vaciar(self):
+        pass
+
+
+class _CarritoMemoria(CarritoBD):
+    """
+    Base de los carritos en caché o sesión: el contenido es un dict
+    {id de producto (str): cantidad} en orden de inserción.
+    """
+
+    def _leer(self):
+        raise NotImplementedError
+
+    def _escribir(self, contenido):
+        raise NotImplementedError
+
+    def _borrar(self):
+        raise NotImplementedError
+
+    def _contenido(self):
+        contenido = self._leer()
+        if contenido is None:
+            contenido = {
+                str(producto_id): cantidad
+                for producto_id, cantidad in self._items().order_by('fecha_agregado').values_list('producto_id', 'cantidad')
+            }
+            self._escribir(contenido)
+        return contenido
+
+    def lineas(self, producto_ids=None):
+        contenido = self._contenido()
+        if producto_ids is not None:
+            contenido = {p: c for p, c in contenido.items() if int(p) in producto_ids}
+        if not contenido:
+            return []
+        productos = Producto.objects.select_related('categoria').in_bulk([int(p) for p in contenido])
+        # Las más recientes primero, como CarritoItem
+        return [
+            Linea(productos[int(p)], cantidad)
+            for p, cantidad in reversed(contenido.items())
+            if int(p) in productos
+        ]
+
+    def totales(self):
+        contenido = self._contenido()
+        if not contenido:
+            return _totales({'num_lineas': 0, 'unidades': 0, 'total': None})
+        return _totales(Producto.objects.filter(pk__in=[int(p) for p in contenido]).aggregate(
+            num_lineas=Count('id'),
+            unidades=Sum(Case(*[When(pk=int(p), then=Value(c)) for p, c in contenido.items()])),
+            total=Sum(
+                Case(*[When(pk=int(p), then=F('precio') * Value(c)) for p, c in contenido.items()]),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+        ))
+
+    def agregar(self, producto, cantidad):
+        contenido = self._contenido()
+        clave = str(producto.pk)
+        concedidas = limitar_varios(self.usuario_id, {producto.pk: contenido.get(clave, 0) + cantidad})
+        contenido[clave] = concedidas.get(producto.pk)
+        self._escribir(contenido)
+
+    def actualizar_varios(self, cantidades):
+        contenido = self._contenido()
+        presentes = {p for p in cantidades if str(p) in contenido}
+        concedidas = limitar_varios(
+            self.usuario_id,
+            {p: cantidades[p] for p in presentes if cantidades[p] > 0},
+            parcial=False,
+        )
+        for producto_id in presentes:
+            if cantidades[producto_id] <= 0:
+                del contenido[str(producto_id)]
+        for producto_id, cantidad in concedidas.items():
+            contenido[str(producto_id)] = cantidad
+        if presentes:
+            self._escribir(contenido)
+        rechazados = {p for p in presentes if cantidades[p] > 0 and p not in concedidas}
+        return presentes, rechazados
+
+    def eliminar(self, producto_id):
+        contenido = self._contenido()
+        if contenido.pop(str(producto_id), None) is None:
+            return False
+        self._escribir(contenido)
+        return True
+
+    def persistir(self):
+        """
+        Vuelca el contenido a CarritoItem (la memoria manda sobre la base de
+        datos) y deja reservadas sus líneas.
+        """
+        contenido = self._leer()
+        if contenido is None:
+            return
+        cantidades = {int(p): c for p, c in contenido.items()}
+        with transaction.atomic():
+            existentes = set(Producto.objects.filter(pk__in=cantidades).values_list('pk', flat=True))
+            cantidades = {p: c for p, c in cantidades.items() if p in existentes}
+            items = self._items()
+            items.exclude(producto_id__in=cantidades).delete()
+            actuales = {item.producto_id: item for item in items.select_for_update()}
+            cambiados = []
+            for producto_id, cantidad in cantidades.items():
+                item = actuales.get(producto_id)
+                if item is not None and item.cantidad != cantidad:
+                    item.cantidad = cantidad
+                    cambiados.append(item)
+            CarritoItem.objects.bulk_update(cambiados, ['cantidad'])
+            CarritoItem.objects.bulk_create([
+                CarritoItem(usuario_id=self.usuario_id, producto_id=producto_id, cantidad=cantidad)
+                for producto_id, cantidad in cantidades.items()
+                if producto_id not in actuales
+            ])
+            sincronizar(self.usuario_id, cantidades)
+
+    def vaciar(self):
+        """Olvida el carrito en memoria (tras la compra)"""
+        self._borrar()
+
+
+class CarritoCache(_CarritoMemoria):
+    """Carrito en la caché de Django; los carritos modificados se anotan para guardar_carritos"""
+
+    def _clave(self):
+        return f'tienda:carrito:{self.usuario_id}'
+
+    def _leer(self):
+        return cache.get(self._clave())
+
+    def _escribir(self, contenido):
+        cache.set(self._clave(), contenido, timeout=getattr(settings, 'TIENDA_CARRITO_SEGUNDOS', 7 * 24 * 3600))
+        _marcar_pendiente(self.usuario_id)
+
+    def _borrar(self):
+        cache.delete(self._clave())
+
+
+class CarritoSesion(_CarritoMemoria):
+    """Carrito en la sesión del usuario"""
+
+    def __init__(self, usuario_id, request=None):
+        super().__init__(usuario_id)
+        self.session = request.session
+
+    def _leer(self):
+        return self.session.get(CLAVE_SESION)
+
+    def _escribir(self, contenido):
+        self.session[CLAVE_SESION] = contenido
+
+    def _borrar(self):
+        self.session.pop(CLAVE_SESION, None)
+
+
+MODOS = {
+    'bd': CarritoBD,
+    'cache': CarritoCache,
+    'sesion': CarritoSesion,
+}
+
+
+def obtener_carrito(request):
+    """Carrito del usuario de la petición según TIENDA_CARRITO"""
+    clase = MODOS[getattr(settings, 'TIENDA_CARRITO', 'bd')]
+    return clase(request.user.pk, request)
+
+
+def total_carrito(lineas):
+    return sum((linea.subtotal() for linea in lineas), Decimal('0'))
+
+
+def _marcar_pendiente(usuario_id):
+    # get + set no es atómico: si dos escrituras se cruzan, un carrito puede
+    # quedarse sin anotar hasta su próxima modificación (sigue en la caché y
+    # se guarda igualmente al comprar o al cerrar sesión)
+    pendientes = cache.get(CLAVE_PENDIENTES) or set()
+    if usuario_id not in pendientes:
+        pendientes.add(usuario_id)
+        cache.set(CLAVE_PENDIENTES, pendientes, timeout=None)
+
+
+def guardar_pendientes():
+    """Persiste los carritos en caché modificados desde la última pasada; devuelve cuántos"""
+    pendientes = cache.get(CLAVE_PENDIENTES) or set()
+    if not pendientes:
+        return 0
+    cache.delete(CLAVE_PENDIENTES)
+    for usuario_id in pendientes:
+        CarritoCache(usuario_id).persistir()
+    return len(pendientes)
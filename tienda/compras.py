@@ -0,0 +1,83 @@
+"""
+Proceso de compra del carrito.
+
+Toda la compra ocurre en una transacción: los productos del carrito se
+bloquean con un único SELECT ... FOR UPDATE (en orden de id, para que dos
+compras simultáneas no se bloqueen mutuamente), solo se vende el stock no
+reservado por otros usuarios (ver tienda.reservas), el stock se descuenta con
+un solo UPDATE con expresiones F() y las ventas se insertan con bulk_create.
+El resumen diario se actualiza también por lotes (ver
+resumen.acumular_ventas). Así no se vende más stock del que hay y una compra
+cuesta como máximo CONSULTAS_COMPRA consultas, con una línea o con cien.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .metricas import contar_compra
+from .models import CarritoItem, Producto, Venta
+from .reservas import disponible, liberar
+from .resumen import acumular_ventas
+
+# BEGIN, carrito, productos (FOR UPDATE), reservas, UPDATE de stock, INSERT de
+# ventas, resumen (SELECT, SAVEPOINT + INSERT + RELEASE, UPDATE), DELETE del
+# carrito y de las reservas, COMMIT
+CONSULTAS_COMPRA = 14
+
+
+def procesar_carrito(usuario):
+    """
+    Convierte el carrito de `usuario` en ventas y lo vacía.
+    Devuelve (ventas creadas, líneas rechazadas); cada línea rechazada es un
+    dict con producto, cantidad pedida y stock disponible.
+    """
+    with transaction.atomic():
+        items = list(
+            CarritoItem.objects.select_for_update().filter(usuario=usuario)
+            .values_list('producto_id', 'cantidad')
+        )
+        if not items:
+            return [], []
+
+        productos = Producto.objects.select_for_update().filter(
+            pk__in=[producto_id for producto_id, _ in items]
+        ).order_by('pk').in_bulk()
+        libres = disponible(productos.values(), usuario.pk)
+
+        ventas = []
+        rechazadas = []
+        for producto_id, cantidad in items:
+            producto = productos.get(producto_id)
+            if producto is None:
+                continue
+            if cantidad > libres[producto_id]:
+                rechazadas.append({
+                    'producto': producto.nombre,
+                    'cantidad': cantidad,
+                    'disponible': libres[producto_id],
+                })
+                continue
+            venta = Venta(producto=producto, cantidad=cantidad, vendedor=usuario)
+            # bulk_create no llama a save(): precio y total se fijan aquí
+            venta.calcular_total()
+            ventas.append(venta)
+
+        if ventas:
+            # update() no aplica auto_now: se actualiza `actualizado` a mano
+            # para que el catálogo (ETag y tarjetas cacheadas) vea el cambio
+            Producto.objects.filter(pk__in=[v.producto_id for v in ventas]).update(
+                stock=F('stock') - Case(
+                    *[When(pk=v.producto_id, then=Value(v.cantidad)) for v in ventas],
+                    output_field=IntegerField(),
+                ),
+                actualizado=timezone.now(),
+            )
+            # bulk_create no envía post_save: el resumen diario se suma aquí
+            Venta.objects.bulk_create(ventas)
+            acumular_ventas(ventas)
+
+        CarritoItem.objects.filter(usuario=usuario).delete()
+        liberar(usuario.pk)
+
+    contar_compra(len(ventas), len(rechazadas))
+    return ventas, rechazadas
@@ -0,0 +1,186 @@
+"""
+Recuento de consultas por petición y detección de patrones N+1.
+
+Un execute_wrapper instalado en cada conexión al abrirse (desde
+TiendaConfig.ready) anota en el registro de la petición en curso (una
+ContextVar, así que sirve también para vistas async, cuyas consultas corren
+en otro hilo) el número de consultas, el tiempo en base de datos y cuántas
+veces se ejecuta cada forma de SQL. Una misma forma
+repetida TIENDA_N_MAS_1_UMBRAL veces o más en una petición suele ser una
+consulta dentro de un bucle (N+1).
+
+ConsultasMiddleware (activo con TIENDA_MEDIR_CONSULTAS, por defecto en DEBUG)
+añade las cabeceras X-Consultas y X-Consultas-Tiempo y registra un aviso en
+el logger 'tienda.consultas' por cada patrón N+1. PresupuestoConsultasMixin
+permite fijar en los tests un máximo de consultas por nombre de URL (ver
+PresupuestoConsultasTests en tienda/tests.py).
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.urls import reverse
+
+logger = logging.getLogger('tienda.consultas')
+
+# Máximo de consultas por nombre de URL (con un usuario con sesión iniciada)
+PRESUPUESTO_CONSULTAS = {
+    'tienda:home': 4,
+    'tienda:productos': 8,
+    'tienda:ventas': 8,
+    'tienda:reporte_ventas': 8,
+    'tienda:reporte_categorias': 8,
+    'tienda:reporte_productos': 7,
+    'tienda:carrito': 7,
+    # Sesión y usuario + la compra (tienda.compras.CONSULTAS_COMPRA), sea cual sea el número de líneas
+    'tienda:procesar_compra': 17,
+}
+
+# IN (%s, %s, ...) y VALUES (...), (...) cambian de longitud con los datos
+_LISTA_PARAMETROS = re.compile(r'\((?:%s, )+%s\)')
+_LISTA_FILAS = re.compile(r'(\(%s[^()]*\))(?:, \(%s[^()]*\))+')
+
+
+def forma_sql(sql):
+    """SQL sin la longitud de las listas de parámetros: agrupa las consultas iguales"""
+    return _LISTA_FILAS.sub(r'\1...', _LISTA_PARAMETROS.sub('(%s...)', sql))
+
+
+def umbral_n_mas_1():
+    return getattr(settings, 'TIENDA_N_MAS_1_UMBRAL', 5)
+
+
+class RegistroConsultas:
+    """Consultas, tiempo y formas de SQL ejecutadas mientras está activo"""
+
+    def __init__(self, padre=None):
+        # Los registros anidados (un test alrededor del middleware) también cuentan en el exterior
+        self.padre = padre
+        self.total = 0
+        self.segundos = 0.0
+        # Por SQL literal: se normaliza solo al consultar, no en cada consulta
+        self.sqls = Counter()
+
+    def anotar(self, sql, segundos):
+        self.total += 1
+        self.segundos += segundos
+        self.sqls[sql] += 1
+        if self.padre is not None:
+            self.padre.anotar(sql, segundos)
+
+    def formas(self):
+        formas = Counter()
+        for sql, veces in self.sqls.items():
+            formas[forma_sql(sql)] += veces
+        return formas
+
+    def repetidas(self, umbral=None):
+        """[(forma, veces)] de las formas que alcanzan el umbral de N+1"""
+        umbral = umbral or umbral_n_mas_1()
+        return [(forma, veces) for forma, veces in self.formas().most_common() if veces >= umbral]
+
+
+_registro = ContextVar('tienda_consultas', default=None)
+
+
+def _medir(execute, sql, params, many, context):
+    registro = _registro.get()
+    if registro is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        registro.anotar(sql, time.perf_counter() - inicio)
+
+
+def _instalar_en(connection, **kwargs):
+    if _medir not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir)
+
+
+def instalar():
+    """Instala el medidor en las conexiones actuales y en las que se abran después"""
+    connection_created.connect(_instalar_en, dispatch_uid='tienda.consultas')
+    for conexion in connections.all(initialized_only=True):
+        _instalar_en(conexion)
+
+
+@contextmanager
+def registrar_consultas():
+    """Devuelve un RegistroConsultas con las consultas ejecutadas dentro del bloque"""
+    instalar()
+    registro = RegistroConsultas(padre=_registro.get())
+    token = _registro.set(registro)
+    try:
+        yield registro
+    finally:
+        _registro.reset(token)
+
+
+class ConsultasMiddleware:
+    """Cuenta las consultas de cada petición y avisa de los patrones N+1"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'TIENDA_MEDIR_CONSULTAS', settings.DEBUG):
+            raise MiddlewareNotUsed
+        instalar()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with registrar_consultas() as registro:
+            respuesta = self.get_response(request)
+        return self._informar(request, respuesta, registro)
+
+    async def __acall__(self, request):
+        with registrar_consultas() as registro:
+            respuesta = await self.get_response(request)
+        return self._informar(request, respuesta, registro)
+
+    def _informar(self, request, respuesta, registro):
+        respuesta['X-Consultas'] = str(registro.total)
+        respuesta['X-Consultas-Tiempo'] = f'{registro.segundos * 1000:.1f}ms'
+        for forma, veces in registro.repetidas():
+            logger.warning('Posible N+1 en %s %s: %d consultas iguales: %s',
+                           request.method, request.path, veces, forma)
+        return respuesta
+
+
+class PresupuestoConsultasMixin:
+    """
+    Mixin para TestCase: assertPresupuestoConsultas('tienda:ventas') hace la
+    petición con self.client y falla si supera el presupuesto de
+    PRESUPUESTO_CONSULTAS (o `maximo`) o si repite una consulta N+1.
+    """
+
+    def assertPresupuestoConsultas(self, nombre_url, *args, maximo=None, metodo='get', datos=None, **kwargs):
+        if maximo is None:
+            maximo = PRESUPUESTO_CONSULTAS[nombre_url]
+        url = reverse(nombre_url, args=args, kwargs=kwargs)
+        with registrar_consultas() as registro:
+            respuesta = getattr(self.client, metodo)(url, datos or {})
+        self.assertLess(respuesta.status_code, 400, f'{url} respondió {respuesta.status_code}')
+        self.assertLessEqual(
+            registro.total, maximo,
+            f'{nombre_url}: {registro.total} consultas, presupuesto {maximo}',
+        )
+        repetidas = registro.repetidas()
+        self.assertFalse(
+            repetidas,
+            f'{nombre_url}: posibles N+1: ' + '; '.join(f'{veces}x {forma}' for forma, veces in repetidas),
+        )
+        return respuesta
@@ -0,0 +1,151 @@
+"""
+Cola de exportaciones de reportes en segundo plano.
+
+Las vistas encolan un ExportacionReporte y el comando procesar_exportaciones
+lo genera fuera de la petición. Si el mismo usuario pide otra vez los mismos
+filtros y los datos no han cambiado, se reutiliza el trabajo existente y su
+archivo en lugar de volver a generarlo.
+
+Un trabajo que lleva más de TIENDA_EXPORTACION_MINUTOS_MAXIMOS en proceso se
+da por abandonado (el worker terminó a mitad): no se reutiliza y el
+siguiente worker libre lo vuelve a tomar.
+"""
+import hashlib
+import io
+import json
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache_reportes import version_ventas
+from .exportar import escribir_ventas
+from .models import Categoria, ExportacionReporte, Venta
+from .replica import lecturas_replica
+from .reports import escribir_pdf
+from .resumen import criterios_reporte, resumir_ventas
+
+
+def calcular_huella(formato, filtros):
+    """Huella estable del formato y los filtros normalizados"""
+    normalizado = json.dumps({'formato': formato, 'filtros': filtros}, sort_keys=True)
+    return hashlib.sha256(normalizado.encode('utf-8')).hexdigest()
+
+
+def version_datos():
+    """
+    Versión de los datos de los reportes: la de la caché de reportes, que
+    cambia con cualquier venta, producto, categoría o nombre de vendedor (ver
+    signals) y con las altas masivas (reconstruyen el resumen). Es una
+    lectura de la caché: encolar no consulta las ventas del rango.
+    """
+    return str(version_ventas())
+
+
+def _limite_procesando():
+    """Los trabajos en proceso que empezaron antes de este momento se consideran abandonados"""
+    minutos = getattr(settings, 'TIENDA_EXPORTACION_MINUTOS_MAXIMOS', 30)
+    return timezone.now() - timedelta(minutes=minutos)
+
+
+def _reclamables():
+    """Trabajos pendientes o abandonados en proceso"""
+    return Q(estado=ExportacionReporte.PENDIENTE) | Q(
+        estado=ExportacionReporte.PROCESANDO, iniciado__lt=_limite_procesando()
+    )
+
+
+def encolar_exportacion(usuario, formato, params):
+    """
+    Devuelve el trabajo para (usuario, formato, filtros): uno vigente si los
+    datos no cambiaron desde entonces, o uno nuevo en estado pendiente.
+    """
+    criterios, filtros = criterios_reporte(params)
+    huella = calcular_huella(formato, filtros)
+    version = version_datos()
+
+    existente = ExportacionReporte.objects.filter(
+        usuario=usuario,
+        huella=huella,
+        version_datos=version,
+        estado__in=[
+            ExportacionReporte.PENDIENTE,
+            ExportacionReporte.PROCESANDO,
+            ExportacionReporte.COMPLETADO,
+        ],
+    ).exclude(
+        estado=ExportacionReporte.PROCESANDO, iniciado__lt=_limite_procesando(),
+    ).order_by('-creado').first()
+    if existente is not None:
+        return existente
+
+    return ExportacionReporte.objects.create(
+        usuario=usuario,
+        formato=formato,
+        filtros=filtros,
+        huella=huella,
+        version_datos=version,
+    )
+
+
+def reclamar_siguiente():
+    """
+    Marca como 'procesando' el trabajo pendiente (o abandonado) más antiguo y
+    lo devuelve. El UPDATE condicional evita que dos workers tomen el mismo trabajo.
+    """
+    candidatos = ExportacionReporte.objects.filter(
+        _reclamables()
+    ).order_by('creado').values_list('pk', flat=True)[:10]
+    for pk in candidatos:
+        tomado = ExportacionReporte.objects.filter(
+            _reclamables(), pk=pk,
+        ).update(estado=ExportacionReporte.PROCESANDO, iniciado=timezone.now())
+        if tomado:
+            return ExportacionReporte.objects.get(pk=pk)
+    return None
+
+
+def procesar_exportacion(trabajo):
+    """Genera el archivo de un trabajo ya reclamado y guarda el resultado"""
+    with lecturas_replica():
+        _generar_archivo(trabajo)
+    trabajo.terminado = timezone.now()
+    trabajo.save()
+    return trabajo
+
+
+def _generar_archivo(trabajo):
+    try:
+        criterios, filtros = criterios_reporte(trabajo.filtros)
+        ventas = Venta.objects.filter(**criterios)
+        # La versión se toma antes de leer: si llegan ventas durante la
+        # generación, la siguiente petición no reutilizará este archivo
+        trabajo.version_datos = version_datos()
+
+        with tempfile.TemporaryFile() as tmp:
+            if trabajo.formato == 'pdf':
+                datos_reporte, reporte_categorias = resumir_ventas(criterios, Categoria.objects.all())
+                # Sin límite, un rango grande agotaría la memoria del worker (ver reports)
+                escribir_pdf(
+                    tmp, ventas, datos_reporte, reporte_categorias, filtros,
+                    limite=getattr(settings, 'TIENDA_EXPORTACION_PDF_MAX_FILAS', 20000),
+                    alternativa='descargue el CSV',
+                )
+            else:
+                texto = io.TextIOWrapper(tmp, encoding='utf-8', newline='')
+                escribir_ventas(texto, ventas, trabajo.formato)
+                texto.flush()
+                texto.detach()
+            trabajo.tamano = tmp.tell()
+            tmp.seek(0)
+            nombre = f"reporte_ventas_{trabajo.pk}.{trabajo.formato}"
+            trabajo.archivo.save(nombre, File(tmp), save=False)
+    except Exception as e:
+        trabajo.estado = ExportacionReporte.ERROR
+        trabajo.error = str(e)
+    else:
+        trabajo.estado = ExportacionReporte.COMPLETADO
+        trabajo.error = ''
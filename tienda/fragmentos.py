@@ -0,0 +1,71 @@
+"""
+Caché de fragmentos HTML de las tarjetas del catálogo.
+
+Cada tarjeta se guarda bajo una clave con la versión del producto, derivada
+de `actualizado` del producto y de su categoría: cualquier cambio de precio,
+stock, nombre o categoría genera una clave nueva y la anterior caduca sola.
+Las reservas no cambian la versión, así que la tarjeta solo distingue entre
+"en stock" y "sin stock"; el stock disponible se comprueba al agregar al
+carrito.
+El fragmento se guarda partido en dos alrededor del token CSRF, que es
+distinto por usuario y se inserta fuera de la parte cacheada.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .metricas import contar_cache
+
+PLANTILLA_TARJETA = 'tarjeta_producto.html'
+MARCA_CSRF = '<!--csrf-->'
+
+
+def version_producto(producto):
+    """Versión de la tarjeta: cambia al guardar el producto o su categoría"""
+    marcas = f'{producto.actualizado.isoformat()}|{producto.categoria.actualizado.isoformat()}'
+    return hashlib.md5(marcas.encode('utf-8')).hexdigest()[:16]
+
+
+def clave_tarjeta(producto):
+    return f'tienda:tarjeta:{producto.pk}:{version_producto(producto)}'
+
+
+def _renderizar(producto):
+    """(antes, despues) del marcador del token CSRF"""
+    html = render_to_string(PLANTILLA_TARJETA, {'p': producto})
+    antes, _, despues = html.partition(MARCA_CSRF)
+    return antes, despues
+
+
+def tarjetas_productos(productos):
+    """
+    Devuelve [(producto, antes, despues)] para la plantilla del catálogo.
+    Las tarjetas cacheadas se leen con una sola consulta a la caché y solo
+    se renderizan las que faltan. `productos` debe traer la categoría
+    (select_related).
+    """
+    productos = list(productos)
+    segundos = getattr(settings, 'TIENDA_CACHE_TARJETAS_SEGUNDOS', 3600)
+    if not segundos:
+        partes = [_renderizar(p) for p in productos]
+    else:
+        claves = {p.pk: clave_tarjeta(p) for p in productos}
+        cacheadas = cache.get_many(claves.values())
+        nuevas = {}
+        partes = []
+        for p in productos:
+            fragmento = cacheadas.get(claves[p.pk])
+            if fragmento is None:
+                fragmento = nuevas[claves[p.pk]] = _renderizar(p)
+            partes.append(fragmento)
+        if nuevas:
+            cache.set_many(nuevas, timeout=segundos)
+        contar_cache('tarjetas', aciertos=len(productos) - len(nuevas), fallos=len(nuevas))
+
+    return [
+        (p, mark_safe(antes), mark_safe(despues))
+        for p, (antes, despues) in zip(productos, partes)
+    ]
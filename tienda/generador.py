@@ -0,0 +1,212 @@
+"""
+Generación de datos de prueba en volumen (init_tienda, benchmarks).
+
+Las ventas siguen distribuciones sesgadas como las de una tienda real: pocos
+productos concentran la mayoría de las ventas (Zipf), la mayoría de las
+ventas son de una unidad, hay más ventas en fin de semana y en diciembre y
+el volumen crece a lo largo del periodo.
+
+Las ventas se generan en bloques de BLOQUE_VENTAS, cada uno con su propia
+semilla derivada de la semilla global: el resultado es el mismo con uno o
+varios procesos (`workers`). Cada bloque se inserta con bulk_create en lotes
+de TAMANO_LOTE, cada lote en su transacción, para no bloquear la base de
+datos mucho tiempo (con SQLite los procesos se turnan para escribir). Como
+bulk_create no envía señales, al terminar se reconstruye el resumen diario
+(lo que invalida también los reportes cacheados).
+"""
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+import django
+from django.contrib.auth.models import User
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from .models import Categoria, Producto, Venta
+from .resumen import reconstruir_resumen
+
+TAMANO_LOTE = 2000
+BLOQUE_VENTAS = 50000
+NUM_VENDEDORES = 5
+# Espera máxima de un proceso por el turno de escritura en SQLite
+ESPERA_SQLITE_MS = 120000
+CATEGORIAS = [
+    'Electrónica', 'Ropa', 'Alimentos', 'Hogar',
+    'Deportes', 'Juguetes', 'Libros', 'Belleza',
+]
+# Exponente de Zipf de la popularidad de productos y vendedores
+SESGO_PRODUCTOS = 1.1
+SESGO_VENDEDORES = 0.8
+# Peso de 1, 2, 3, 4 y 5 unidades por venta
+PESOS_CANTIDAD = [55, 22, 11, 7, 5]
+
+
+@contextmanager
+def _fechas_explicitas():
+    """bulk_create aplica auto_now_add: se desactiva para conservar las fechas generadas"""
+    campo = Venta._meta.get_field('fecha')
+    campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        campo.auto_now_add = True
+
+
+def _pesos_zipf(n, sesgo, azar):
+    """Pesos acumulados de Zipf en un orden aleatorio (la popularidad no sigue al id)"""
+    pesos = [1 / (rango + 1) ** sesgo for rango in range(n)]
+    azar.shuffle(pesos)
+    return list(accumulate(pesos))
+
+
+def _pesos_dias(hoy, dias):
+    """Pesos acumulados por día, del más reciente (0) al más antiguo"""
+    pesos = []
+    for atras in range(dias):
+        fecha = hoy - timedelta(days=atras)
+        peso = 0.6 + 0.4 * (1 - atras / dias)  # crecimiento a lo largo del periodo
+        if fecha.weekday() >= 5:
+            peso *= 1.5
+        if fecha.month == 12:
+            peso *= 1.8
+        pesos.append(peso)
+    return list(accumulate(pesos))
+
+
+class _Contexto:
+    """Lo que necesita cada bloque de ventas; se envía una vez a cada proceso"""
+
+    def __init__(self, semilla, productos, vendedores, hoy, dias):
+        azar = random.Random(semilla)
+        self.semilla = semilla
+        self.productos = productos  # [(id, precio)]
+        self.vendedores = vendedores
+        self.hoy = hoy
+        self.dias = dias
+        self.acum_productos = _pesos_zipf(len(productos), SESGO_PRODUCTOS, azar)
+        self.acum_vendedores = _pesos_zipf(len(vendedores), SESGO_VENDEDORES, azar)
+        self.acum_dias = _pesos_dias(hoy, dias)
+        self.acum_cantidad = list(accumulate(PESOS_CANTIDAD))
+
+
+def _crear_bloque(contexto, bloque, cantidad):
+    """Inserta las ventas del bloque `bloque`; devuelve cuántas"""
+    azar = random.Random(contexto.semilla * 1_000_003 + bloque)
+    productos = azar.choices(contexto.productos, cum_weights=contexto.acum_productos, k=cantidad)
+    vendedores = azar.choices(contexto.vendedores, cum_weights=contexto.acum_vendedores, k=cantidad)
+    atrases = azar.choices(range(contexto.dias), cum_weights=contexto.acum_dias, k=cantidad)
+    cantidades = azar.choices(range(1, 6), cum_weights=contexto.acum_cantidad, k=cantidad)
+
+    with _fechas_explicitas():
+        for inicio in range(0, cantidad, TAMANO_LOTE):
+            fin = min(inicio + TAMANO_LOTE, cantidad)
+            # bulk_create no llama a save(): precio y total se fijan aquí
+            lote = [
+                Venta(
+                    producto_id=producto_id,
+                    cantidad=unidades,
+                    precio_unitario=precio,
+                    total=unidades * precio,
+                    vendedor_id=vendedor_id,
+                    fecha=contexto.hoy - timedelta(days=atras),
+                )
+                for (producto_id, precio), vendedor_id, atras, unidades in zip(
+                    productos[inicio:fin], vendedores[inicio:fin], atrases[inicio:fin], cantidades[inicio:fin]
+                )
+            ]
+            with transaction.atomic():
+                Venta.objects.bulk_create(lote)
+    return cantidad
+
+
+_contexto_worker = None
+
+
+def _iniciar_worker(contexto):
+    global _contexto_worker
+    django.setup()
+    _contexto_worker = contexto
+    if connection.vendor == 'sqlite':
+        # Los procesos se turnan para escribir: esperar el turno más de lo habitual
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA busy_timeout = {ESPERA_SQLITE_MS}')
+
+
+def _crear_bloque_worker(bloque, cantidad):
+    return _crear_bloque(_contexto_worker, bloque, cantidad)
+
+
+def _categorias():
+    existentes = {c.nombre: c for c in Categoria.objects.filter(nombre__in=CATEGORIAS)}
+    Categoria.objects.bulk_create([
+        Categoria(nombre=nombre, descripcion=f'Productos de {nombre.lower()}')
+        for nombre in CATEGORIAS if nombre not in existentes
+    ])
+    return list(Categoria.objects.filter(nombre__in=CATEGORIAS).order_by('pk'))
+
+
+def _vendedores(semilla):
+    nombres = [f'vendedor_{semilla}_{i + 1}' for i in range(NUM_VENDEDORES)]
+    existentes = set(User.objects.filter(username__in=nombres).values_list('username', flat=True))
+    User.objects.bulk_create([User(username=nombre) for nombre in nombres if nombre not in existentes])
+    return list(User.objects.filter(username__in=nombres).order_by('username'))
+
+
+def generar_datos(num_productos, num_ventas, semilla=0, dias=365, workers=1, progreso=None):
+    """
+    Crea `num_productos` productos y `num_ventas` ventas repartidas en los
+    últimos `dias` días, con las categorías y vendedores que falten. Sin
+    productos nuevos, las ventas son de los productos existentes.
+    `progreso(ventas)` se llama tras cada bloque con las ventas insertadas
+    en él. Devuelve los vendedores.
+    """
+    azar = random.Random(semilla)
+    with transaction.atomic():
+        categorias = _categorias()
+        vendedores = _vendedores(semilla)
+        productos = Producto.objects.bulk_create([
+            Producto(
+                nombre=f'Producto {semilla}-{i + 1}',
+                categoria=categorias[i % len(categorias)],
+                # Precios log-normales: muchos baratos y pocos caros
+                precio=Decimal(f'{min(max(math.exp(azar.gauss(3.5, 1.2)), 0.5), 99999):.2f}'),
+                stock=azar.randint(10, 1000),
+            )
+            for i in range(num_productos)
+        ], batch_size=TAMANO_LOTE)
+
+    if not productos:
+        # Solo ventas: se reparten entre los productos que ya existen
+        productos = list(Producto.objects.order_by('pk'))
+    if num_ventas and productos:
+        contexto = _Contexto(
+            semilla,
+            [(p.pk, p.precio) for p in productos],
+            [v.pk for v in vendedores],
+            timezone.localdate(),
+            dias,
+        )
+        bloques = [
+            (bloque, min(BLOQUE_VENTAS, num_ventas - inicio))
+            for bloque, inicio in enumerate(range(0, num_ventas, BLOQUE_VENTAS))
+        ]
+        if workers > 1:
+            # Las conexiones abiertas no pueden compartirse con los procesos hijos
+            connections.close_all()
+            with ProcessPoolExecutor(workers, initializer=_iniciar_worker, initargs=(contexto,)) as ejecutor:
+                for hechas in ejecutor.map(_crear_bloque_worker, *zip(*bloques)):
+                    if progreso:
+                        progreso(hechas)
+        else:
+            for bloque, cantidad in bloques:
+                hechas = _crear_bloque(contexto, bloque, cantidad)
+                if progreso:
+                    progreso(hechas)
+
+    reconstruir_resumen()
+    return vendedores
@@ -0,0 +1,210 @@
+import gc
+import json
+import logging
+import math
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+
+from tienda.generador import generar_datos
+from tienda.models import Producto
+
+# (nombre, url, método); procesar_compra va al final porque crea ventas
+VISTAS = [
+    ('catalogo', 'tienda:productos', 'GET'),
+    ('ventas', 'tienda:ventas', 'GET'),
+    ('reporte_ventas', 'tienda:reporte_ventas', 'GET'),
+    ('reporte_por_categoria', 'tienda:reporte_categorias', 'GET'),
+    ('reporte_por_producto', 'tienda:reporte_productos', 'GET'),
+    ('carrito', 'tienda:carrito', 'GET'),
+    ('procesar_compra', 'tienda:procesar_compra', 'POST'),
+]
+# Diferencias menores que estas no cuentan como regresión (ruido de medida)
+MARGEN_MS = 3
+MARGEN_KB = 256
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[max(math.ceil(p * len(ordenados)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide latencia (p50/p95), consultas y memoria pico de las vistas de la tienda '
+        'con datos generados de distintos tamaños, y compara con una línea base JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ventas', default='1000,10000',
+                            help='Tamaños de datos a medir: ventas separadas por comas (por defecto 1000,10000)')
+        parser.add_argument('--productos', type=int, default=200, help='Productos generados (por defecto 200)')
+        parser.add_argument('--repeticiones', type=int, default=20,
+                            help='Peticiones medidas por vista y tamaño (por defecto 20)')
+        parser.add_argument('--semilla', type=int, default=0, help='Semilla de los datos generados')
+        parser.add_argument('--vistas', help=f"Vistas a medir, separadas por comas (por defecto todas: "
+                                             f"{', '.join(nombre for nombre, _, _ in VISTAS)})")
+        parser.add_argument('--sin-cache', action='store_true',
+                            help='Desactiva la caché de reportes y de tarjetas del catálogo')
+        parser.add_argument('--baseline', default=str(Path(settings.BASE_DIR) / 'bench_tienda.json'),
+                            help='Archivo JSON de la línea base (por defecto bench_tienda.json)')
+        parser.add_argument('--guardar', action='store_true',
+                            help='Guarda los resultados como nueva línea base en lugar de comparar')
+        parser.add_argument('--umbral', type=float, default=0.5,
+                            help='Aumento relativo de p50 o memoria que cuenta como regresión (por defecto 0.5)')
+        parser.add_argument('--umbral-p95', type=float, default=1.0,
+                            help='Aumento relativo de p95 que cuenta como regresión; es más ruidoso que p50 '
+                                 '(por defecto 1.0, el doble)')
+
+    def handle(self, *args, **options):
+        tamanos = [int(t) for t in options['ventas'].split(',') if t.strip()]
+        vistas = VISTAS
+        if options['vistas']:
+            pedidas = {v.strip() for v in options['vistas'].split(',')}
+            desconocidas = pedidas - {nombre for nombre, _, _ in VISTAS}
+            if desconocidas:
+                raise CommandError(f"Vistas desconocidas: {', '.join(sorted(desconocidas))}")
+            vistas = [vista for vista in VISTAS if vista[0] in pedidas]
+
+        ajustes = {}
+        if options['sin_cache']:
+            ajustes = {'TIENDA_CACHE_REPORTES_SEGUNDOS': 0, 'TIENDA_CACHE_TARJETAS_SEGUNDOS': 0}
+
+        # Todo ocurre en bases de datos de test: nunca se tocan los datos reales
+        setup_test_environment()
+        bases = setup_databases(verbosity=0, interactive=False)
+        # La línea de tiempos de cada petición (tienda.tiempos) taparía la tabla
+        log_tiempos = logging.getLogger('tienda.tiempos')
+        nivel = log_tiempos.level
+        log_tiempos.setLevel(logging.WARNING)
+        try:
+            with override_settings(**ajustes):
+                resultados = {}
+                for tamano in tamanos:
+                    resultados.update(self._medir_tamano(tamano, vistas, options))
+        finally:
+            log_tiempos.setLevel(nivel)
+            teardown_databases(bases, verbosity=0)
+            teardown_test_environment()
+
+        ruta = Path(options['baseline'])
+        if options['guardar']:
+            parametros = {k: options[k] for k in ('ventas', 'productos', 'repeticiones', 'semilla', 'sin_cache')}
+            ruta.write_text(json.dumps({'parametros': parametros, 'resultados': resultados}, indent=2))
+            self.stdout.write(self.style.SUCCESS(f"✓ Línea base guardada en {ruta}"))
+            return
+        if not ruta.exists():
+            self.stdout.write(f"Sin línea base en {ruta} (usar --guardar para crearla)")
+            return
+
+        base = json.loads(ruta.read_text())['resultados']
+        regresiones = self._comparar(base, resultados, options['umbral'], options['umbral_p95'])
+        if regresiones:
+            for regresion in regresiones:
+                self.stdout.write(self.style.ERROR(f"✗ {regresion}"))
+            raise CommandError(f"{len(regresiones)} regresiones respecto a {ruta}")
+        self.stdout.write(self.style.SUCCESS(f"✓ Sin regresiones respecto a {ruta}"))
+
+    def _medir_tamano(self, tamano, vistas, options):
+        call_command('flush', interactive=False, verbosity=0)
+        cache.clear()
+        inicio = time.perf_counter()
+        generar_datos(options['productos'], tamano, semilla=options['semilla'])
+        self.stdout.write(self.style.WARNING(
+            f"\n{tamano} ventas, {options['productos']} productos "
+            f"(generados en {time.perf_counter() - inicio:.1f} s)"
+        ))
+        self.stdout.write(f"{'vista':<24}{'p50 ms':>9}{'p95 ms':>9}{'consultas':>11}{'memoria KB':>12}")
+
+        usuario = User.objects.create_superuser('bench', 'bench@tienda.local', 'bench')
+        cliente = Client()
+        cliente.force_login(usuario)
+        # Los productos con más stock aguantan todas las compras de la medición
+        para_carrito = list(Producto.objects.order_by('-stock').values_list('pk', flat=True)[:3])
+
+        def llenar_carrito():
+            for producto_id in para_carrito:
+                cliente.post(reverse('tienda:agregar_carrito'), {'producto_id': producto_id, 'cantidad': 1})
+
+        resultados = {}
+        for nombre, url, metodo in vistas:
+            preparar = llenar_carrito if nombre == 'procesar_compra' else None
+            if nombre == 'carrito':
+                llenar_carrito()
+            peticion = (lambda url=url: cliente.post(reverse(url))) if metodo == 'POST' else \
+                (lambda url=url: cliente.get(reverse(url)))
+            medida = self._medir_vista(nombre, peticion, preparar, options['repeticiones'])
+            resultados[f'{nombre}:{tamano}'] = medida
+            self.stdout.write(
+                f"{nombre:<24}{medida['p50_ms']:>9.1f}{medida['p95_ms']:>9.1f}"
+                f"{medida['consultas']:>11}{medida['memoria_kb']:>12.0f}"
+            )
+        return resultados
+
+    def _medir_vista(self, nombre, peticion, preparar, repeticiones):
+        tiempos = []
+        consultas = []
+        gc.collect()
+        # La primera petición calienta cachés y plantillas y no se cuenta
+        for i in range(repeticiones + 1):
+            if preparar:
+                preparar()
+            with CaptureQueriesContext(connection) as contexto:
+                inicio = time.perf_counter()
+                respuesta = peticion()
+                if respuesta.streaming:
+                    b''.join(respuesta.streaming_content)
+                duracion = time.perf_counter() - inicio
+            if respuesta.status_code >= 400:
+                raise CommandError(f"{nombre} respondió {respuesta.status_code}")
+            if i:
+                tiempos.append(duracion * 1000)
+                consultas.append(len(contexto.captured_queries))
+
+        # Memoria en una petición aparte: tracemalloc ralentiza la medida de tiempo
+        if preparar:
+            preparar()
+        tracemalloc.start()
+        try:
+            peticion()
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'p50_ms': round(statistics.median(tiempos), 2),
+            'p95_ms': round(_percentil(tiempos, 0.95), 2),
+            'consultas': max(consultas),
+            'memoria_kb': round(pico / 1024, 1),
+        }
+
+    def _comparar(self, base, resultados, umbral, umbral_p95):
+        regresiones = []
+        for clave, actual in resultados.items():
+            anterior = base.get(clave)
+            if anterior is None:
+                continue
+            if actual['consultas'] > anterior['consultas']:
+                regresiones.append(f"{clave}: consultas {anterior['consultas']} → {actual['consultas']}")
+            for medida, limite, margen, unidad in [
+                ('p50_ms', umbral, MARGEN_MS, 'ms'),
+                ('p95_ms', umbral_p95, MARGEN_MS, 'ms'),
+                ('memoria_kb', umbral, MARGEN_KB, 'KB'),
+            ]:
+                if actual[medida] > anterior[medida] * (1 + limite) and actual[medida] - anterior[medida] > margen:
+                    regresiones.append(f"{clave}: {medida} {anterior[medida]} {unidad} → {actual[medida]} {unidad}")
+        return regresiones
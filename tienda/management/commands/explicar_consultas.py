@@ -0,0 +1,72 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Sum
+from django.test import RequestFactory
+
+from tienda.exportar import COLUMNAS
+from tienda.models import Venta, VentaDiaria
+from tienda.paginacion import _consulta_pagina
+from tienda.resumen import INGRESO_VENTA, criterios_reporte
+
+
+class Command(BaseCommand):
+    help = 'Muestra el plan de ejecución (EXPLAIN) de las consultas de ventas y reportes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha-inicio', default='', help='Filtro fecha_inicio (AAAA-MM-DD)')
+        parser.add_argument('--fecha-fin', default='', help='Filtro fecha_fin (AAAA-MM-DD)')
+        parser.add_argument('--categoria', default='', help='Filtro por id de categoría')
+        parser.add_argument('--producto', default='', help='Filtro por id de producto')
+        parser.add_argument('--analyze', action='store_true',
+                            help='Ejecuta las consultas (EXPLAIN ANALYZE, solo PostgreSQL)')
+        parser.add_argument('--sql', action='store_true', help='Muestra también el SQL de cada consulta')
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f'Base de datos no soportada: {vendor}')
+        if options['analyze'] and vendor != 'postgresql':
+            raise CommandError('--analyze solo está disponible en PostgreSQL')
+
+        criterios, filtros = criterios_reporte(options)
+        self.stdout.write(self.style.SUCCESS(f'Base de datos: {vendor} | Filtros: {filtros or "ninguno"}'))
+
+        ventas = Venta.objects.filter(**criterios)
+        listado = ventas.select_related('producto', 'producto__categoria', 'vendedor')
+        # Las páginas del listado salen de la misma función que usa la vista
+        fabrica = RequestFactory()
+        cursor = f'{date.today().isoformat()}_{2**31}'
+        primera, *_ = _consulta_pagina(fabrica.get('/'), listado)
+        siguiente, *_ = _consulta_pagina(fabrica.get('/', {'cursor': cursor, 'dir': 'next'}), listado)
+        anterior, *_ = _consulta_pagina(fabrica.get('/', {'cursor': cursor, 'dir': 'prev'}), listado)
+        grupos = ('producto__categoria_id', 'producto_id', 'vendedor__username')
+        consultas = [
+            ('Listado de ventas (primera página)', primera),
+            ('Listado de ventas (página siguiente por cursor)', siguiente),
+            ('Listado de ventas (página anterior por cursor)', anterior),
+            ('Totales del listado de ventas (filas que recorre el agregado)',
+             ventas.order_by().values_list('total')),
+            ('Resumen de reporte_ventas desde VentaDiaria',
+             VentaDiaria.objects.filter(**criterios).order_by().values(*grupos)
+             .annotate(num_ventas=Sum('num_ventas'), unidades=Sum('unidades'), ingreso=Sum('ingreso'))),
+            ('Resumen de reporte_ventas desde Venta',
+             ventas.order_by().values(*grupos)
+             .annotate(num_ventas=Count('id'), unidades=Sum('cantidad'), ingreso=INGRESO_VENTA)),
+            ('Reporte por categoría (VentaDiaria)',
+             VentaDiaria.objects.order_by().values('producto__categoria_id')
+             .annotate(num_ventas=Sum('num_ventas'), ingreso=Sum('ingreso'))),
+            ('Reporte por producto (VentaDiaria)',
+             VentaDiaria.objects.order_by().values('producto_id')
+             .annotate(num_ventas=Sum('num_ventas'), unidades=Sum('unidades'), ingreso=Sum('ingreso'))),
+            ('Exportación CSV / PDF (detalle)',
+             ventas.order_by('-fecha', '-id').values_list(*[c for _, c in COLUMNAS])),
+        ]
+
+        opciones = {'analyze': True} if options['analyze'] else {}
+        for titulo, qs in consultas:
+            self.stdout.write(self.style.WARNING(f'\n== {titulo}'))
+            if options['sql']:
+                self.stdout.write(str(qs.query))
+            self.stdout.write(qs.explain(**opciones))
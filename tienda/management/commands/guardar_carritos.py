@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tienda.carrito import guardar_pendientes
+
+
+class Command(BaseCommand):
+    help = 'Guarda en CarritoItem los carritos en caché modificados (TIENDA_CARRITO=cache)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalo', type=float,
+                            help='Repite cada N segundos en lugar de ejecutarse una sola vez')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            guardados = guardar_pendientes()
+            self.stdout.write(f"✓ {guardados} carritos guardados")
+            if not options['intervalo']:
+                return
+            time.sleep(options['intervalo'])
@@ -1,12 +1,36 @@
-from django.core.management.base import BaseCommand
+import time
+
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import User, Permission
+from tienda.generador import generar_datos
 from tienda.models import Categoria, Producto, Venta
 from datetime import datetime, timedelta
 
 class Command(BaseCommand):
-    help = 'Inicializa el sistema con usuarios, categorías, productos y ventas de prueba'
+    help = (
+        'Inicializa el sistema con usuarios, categorías, productos y ventas de prueba. '
+        'Con --productos/--ventas genera además datos en volumen (deterministas para una --seed)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=0,
+                            help='Productos generados además de los de ejemplo')
+        parser.add_argument('--ventas', type=int, default=0,
+                            help='Ventas generadas (sesgadas por producto, vendedor, día y cantidad)')
+        parser.add_argument('--seed', '--semilla', dest='semilla', type=int, default=0,
+                            help='Semilla de los datos generados (por defecto 0)')
+        parser.add_argument('--dias', type=int, default=365,
+                            help='Días hacia atrás en los que se reparten las ventas (por defecto 365)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Procesos que generan e insertan ventas en paralelo (por defecto 1; '
+                                 'con SQLite las escrituras se turnan y ayuda poco)')
 
     def handle(self, *args, **options):
+        if options['productos'] < 0 or options['ventas'] < 0:
+            raise CommandError('--productos y --ventas no pueden ser negativos')
+        if options['workers'] < 1 or options['dias'] < 1:
+            raise CommandError('--workers y --dias deben ser al menos 1')
+
         self.stdout.write(self.style.SUCCESS('\n' + '='*60))
         self.stdout.write(self.style.SUCCESS('Configuración Inicial del Sistema de Tienda'))
         self.stdout.write(self.style.SUCCESS('='*60))
@@ -25,7 +49,10 @@ class Command(BaseCommand):
 
         # Crear ventas
         self.stdout.write(self.style.WARNING('\n[4/5] Creando ventas de prueba...'))
-        self.crear_ventas()
+        if options['productos'] or options['ventas']:
+            self.generar_volumen(options)
+        else:
+            self.crear_ventas()
 
         # Mostrar resumen
         self.stdout.write(self.style.SUCCESS('\n[5/5] ¡Configuración completada!'))
@@ -123,7 +150,28 @@ class Command(BaseCommand):
                 vendedor=admin,
                 fecha=datetime.now().date() - timedelta(days=i)
             )
-            self.stdout.write(f"✓ Venta creada: {prod.nombre} (${venta.total():.2f})")
+            self.stdout.write(f"✓ Venta creada: {prod.nombre} (${venta.total:.2f})")
+
+    def generar_volumen(self, options):
+        total = options['ventas']
+        inicio = time.perf_counter()
+        hechas = 0
+
+        def progreso(ventas):
+            nonlocal hechas
+            hechas += ventas
+            segundos = time.perf_counter() - inicio
+            self.stdout.write(f"  {hechas:,}/{total:,} ventas ({hechas / segundos:,.0f}/s)")
+
+        generar_datos(
+            options['productos'], total,
+            semilla=options['semilla'], dias=options['dias'],
+            workers=options['workers'], progreso=progreso,
+        )
+        self.stdout.write(
+            f"✓ Generados {options['productos']:,} productos y {total:,} ventas "
+            f"en {time.perf_counter() - inicio:.1f} s (resumen diario reconstruido)"
+        )
 
     def mostrar_resumen(self):
         self.stdout.write(self.style.SUCCESS('\n' + '='*60))
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tienda.reservas import TAMANO_LOTE, expirar_reservas, limpiar_carritos_abandonados
+
+
+class Command(BaseCommand):
+    help = 'Elimina por lotes las reservas de stock caducadas y las líneas de carritos abandonados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                            help=f'Filas borradas por consulta (por defecto {TAMANO_LOTE})')
+        parser.add_argument('--dias-carrito', type=int,
+                            default=getattr(settings, 'TIENDA_CARRITO_ABANDONADO_DIAS', 7),
+                            help='Antigüedad en días de las líneas de carrito abandonadas (0 no las borra)')
+        parser.add_argument('--intervalo', type=float,
+                            help='Repite cada N segundos en lugar de ejecutarse una sola vez')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            reservas = expirar_reservas(options['lote'])
+            lineas = 0
+            if options['dias_carrito']:
+                lineas = limpiar_carritos_abandonados(options['dias_carrito'], options['lote'])
+            self.stdout.write(f"✓ {reservas} reservas caducadas y {lineas} líneas de carrito abandonadas eliminadas")
+            if not options['intervalo']:
+                return
+            time.sleep(options['intervalo'])
@@ -0,0 +1,163 @@
+import random
+import shutil
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.db.models import Count, F, Sum
+
+from tienda.models import Categoria, Producto, Venta
+
+PERFILES = {
+    # Configuración por defecto de Django: journal DELETE, transacciones DEFERRED
+    'basico': {},
+    'rendimiento': settings.SQLITE_OPCIONES_RENDIMIENTO,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el rendimiento de SQLite con lecturas (reportes) y escrituras (compras) '
+        'concurrentes, con la configuración por defecto y con el perfil de rendimiento'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--perfil', choices=[*PERFILES, 'ambos'], default='ambos')
+        parser.add_argument('--hilos', type=int, default=8, help='Hilos concurrentes (por defecto 8)')
+        parser.add_argument('--segundos', type=float, default=5, help='Duración de cada prueba (por defecto 5)')
+        parser.add_argument('--escrituras', type=float, default=0.3,
+                            help='Fracción de operaciones que son compras (por defecto 0.3)')
+        parser.add_argument('--ventas', type=int, default=20000,
+                            help='Ventas iniciales en la base de prueba (por defecto 20000)')
+
+    def handle(self, *args, **options):
+        perfiles = list(PERFILES) if options['perfil'] == 'ambos' else [options['perfil']]
+        self.stdout.write(
+            f"{options['hilos']} hilos, {options['segundos']} s, "
+            f"{options['escrituras']:.0%} escrituras, {options['ventas']} ventas iniciales"
+        )
+        resultados = {}
+        for perfil in perfiles:
+            directorio = tempfile.mkdtemp(prefix='tienda_concurrencia_')
+            alias = f'concurrencia_{perfil}'
+            try:
+                self._preparar(alias, Path(directorio) / 'db.sqlite3', PERFILES[perfil], options['ventas'])
+                resultados[perfil] = self._medir(alias, options)
+            finally:
+                connections[alias].close()
+                del connections.settings[alias]
+                shutil.rmtree(directorio, ignore_errors=True)
+            self._mostrar(perfil, resultados[perfil], options['segundos'])
+
+        if len(resultados) == 2:
+            antes = resultados['basico']['correctas']
+            despues = resultados['rendimiento']['correctas']
+            self.stdout.write(f"✓ Rendimiento / básico: {despues / antes:.1f}x operaciones correctas" if antes
+                              else "✓ El perfil básico no completó ninguna operación")
+
+    def _preparar(self, alias, nombre, opciones, num_ventas):
+        """Crea una base SQLite temporal con el esquema y datos de prueba"""
+        connections.settings[alias] = {
+            **connections.settings['default'],
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': str(nombre),
+            'OPTIONS': dict(opciones),
+            'CONN_MAX_AGE': None,
+        }
+        call_command('migrate', database=alias, verbosity=0)
+
+        vendedor = User(username='concurrencia')
+        User.objects.using(alias).bulk_create([vendedor])
+        categorias = Categoria.objects.using(alias).bulk_create(
+            [Categoria(nombre=f'Categoría {i}') for i in range(5)]
+        )
+        productos = Producto.objects.using(alias).bulk_create([
+            Producto(nombre=f'Producto {i}', categoria=categorias[i % 5], precio=Decimal(10 + i), stock=10 ** 6)
+            for i in range(50)
+        ])
+        azar = random.Random(0)
+        for inicio in range(0, num_ventas, 2000):
+            ventas = []
+            for _ in range(min(2000, num_ventas - inicio)):
+                venta = Venta(producto=azar.choice(productos), cantidad=azar.randint(1, 5), vendedor=vendedor)
+                venta.calcular_total()
+                ventas.append(venta)
+            Venta.objects.using(alias).bulk_create(ventas)
+        connections[alias].close()
+
+    def _medir(self, alias, options):
+        producto_ids = list(Producto.objects.using(alias).values_list('pk', flat=True))
+        vendedor = User.objects.using(alias).get()
+        connections[alias].close()
+
+        resultados = {'correctas': 0, 'lecturas': 0, 'escrituras': 0, 'bloqueos': 0, 'tiempos': []}
+        candado = threading.Lock()
+        salida = threading.Barrier(options['hilos'])
+
+        def trabajar(semilla):
+            azar = random.Random(semilla)
+            propios = {'correctas': 0, 'lecturas': 0, 'escrituras': 0, 'bloqueos': 0, 'tiempos': []}
+            salida.wait()
+            fin = time.perf_counter() + options['segundos']
+            try:
+                while time.perf_counter() < fin:
+                    inicio = time.perf_counter()
+                    escribe = azar.random() < options['escrituras']
+                    try:
+                        if escribe:
+                            self._comprar(alias, azar.choice(producto_ids), azar.randint(1, 3), vendedor)
+                        else:
+                            self._reportar(alias)
+                    except OperationalError:
+                        # "database is locked"
+                        propios['bloqueos'] += 1
+                        continue
+                    propios['correctas'] += 1
+                    propios['escrituras' if escribe else 'lecturas'] += 1
+                    propios['tiempos'].append(time.perf_counter() - inicio)
+            finally:
+                connections[alias].close()
+                with candado:
+                    for clave, valor in propios.items():
+                        resultados[clave] += valor
+
+        hilos = [threading.Thread(target=trabajar, args=(i,)) for i in range(options['hilos'])]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return resultados
+
+    def _comprar(self, alias, producto_id, cantidad, vendedor):
+        """Lee el stock y, dentro de la misma transacción, lo descuenta y registra la venta"""
+        with transaction.atomic(using=alias):
+            producto = Producto.objects.using(alias).get(pk=producto_id)
+            if producto.stock < cantidad:
+                return
+            Producto.objects.using(alias).filter(pk=producto_id).update(stock=F('stock') - cantidad)
+            venta = Venta(producto=producto, cantidad=cantidad, vendedor=vendedor)
+            venta.calcular_total()
+            Venta.objects.using(alias).bulk_create([venta])
+
+    def _reportar(self, alias):
+        """Agregado por producto sobre todas las ventas, como los reportes sin resumen"""
+        list(
+            Venta.objects.using(alias).order_by().values('producto_id')
+            .annotate(num_ventas=Count('id'), ingreso=Sum('total'))
+        )
+
+    def _mostrar(self, perfil, resultados, segundos):
+        tiempos = sorted(resultados['tiempos'])
+        p95 = tiempos[int(len(tiempos) * 0.95)] * 1000 if tiempos else 0
+        self.stdout.write(
+            f"{perfil:<12} {resultados['correctas'] / segundos:8.1f} op/s  "
+            f"(lecturas {resultados['lecturas']}, escrituras {resultados['escrituras']}, "
+            f"'database is locked' {resultados['bloqueos']}, p95 {p95:.1f} ms)"
+        )
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tienda.exportaciones import procesar_exportacion, reclamar_siguiente
+from tienda.models import ExportacionReporte
+
+
+class Command(BaseCommand):
+    help = 'Worker que genera en segundo plano las exportaciones de reportes encoladas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesa los trabajos pendientes y termina')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos de espera cuando no hay trabajos (por defecto 2)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Worker de exportaciones iniciado'))
+        while True:
+            close_old_connections()
+            trabajo = reclamar_siguiente()
+            if trabajo is None:
+                if options['una_vez']:
+                    return
+                time.sleep(options['intervalo'])
+                continue
+
+            inicio = time.monotonic()
+            trabajo = procesar_exportacion(trabajo)
+            duracion = time.monotonic() - inicio
+            if trabajo.estado == ExportacionReporte.COMPLETADO:
+                self.stdout.write(f"✓ Exportación {trabajo.pk} ({trabajo.formato}, {trabajo.tamano} bytes) en {duracion:.1f}s")
+            else:
+                self.stdout.write(self.style.ERROR(f"✗ Exportación {trabajo.pk}: {trabajo.error}"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from tienda.busqueda import crear_indice
+
+
+class Command(BaseCommand):
+    help = 'Crea (si falta) y rellena el índice de búsqueda de texto completo del catálogo'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            crear_indice(connection)
+        self.stdout.write(self.style.SUCCESS(f'✓ Índice de búsqueda reconstruido ({connection.vendor})'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from tienda.resumen import reconstruir_resumen
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el resumen diario de ventas (VentaDiaria), completo o para un rango de fechas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial (AAAA-MM-DD), inclusive')
+        parser.add_argument('--hasta', help='Fecha final (AAAA-MM-DD), inclusive')
+
+    def handle(self, *args, **options):
+        desde = self.parse_fecha(options['desde'])
+        hasta = self.parse_fecha(options['hasta'])
+        if desde and hasta and desde > hasta:
+            raise CommandError('--desde no puede ser posterior a --hasta')
+
+        creadas = reconstruir_resumen(desde, hasta)
+        rango = f"{desde or 'inicio'} → {hasta or 'hoy'}"
+        self.stdout.write(self.style.SUCCESS(f'✓ Resumen reconstruido ({rango}): {creadas} filas'))
+
+    def parse_fecha(self, valor):
+        if not valor:
+            return None
+        fecha = parse_date(valor)
+        if fecha is None:
+            raise CommandError(f'Fecha inválida: {valor}')
+        return fecha
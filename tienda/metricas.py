@@ -0,0 +1,159 @@
+"""
+Métricas de la tienda en formato Prometheus (endpoint /metrics).
+
+Se exponen:
+  - tienda_peticion_segundos: latencia por nombre de URL y método.
+  - tienda_peticion_consultas: consultas a la base de datos por petición.
+  - tienda_compras_total, tienda_compra_lineas_total y
+    tienda_compra_lineas_rechazadas_total (líneas sin stock en procesar_compra).
+  - tienda_pdf_segundos y tienda_pdf_bytes: duración y tamaño de los PDF.
+  - tienda_cache_total: aciertos y fallos de las cachés de reportes y de
+    tarjetas del catálogo; el ratio de acierto se calcula en Prometheus:
+      sum by (cache) (rate(tienda_cache_total{resultado="acierto"}[5m]))
+        / sum by (cache) (rate(tienda_cache_total[5m]))
+
+Con gunicorn cada worker es un proceso con sus propios contadores. Si la
+variable de entorno PROMETHEUS_MULTIPROC_DIR apunta a un directorio, los
+valores se escriben en archivos allí y /metrics los suma todos; el
+directorio debe vaciarse al arrancar y marcar los workers que terminan (lo
+hace gunicorn.conf.py). La variable debe estar definida antes de arrancar el
+proceso, no en settings.
+
+Si prometheus_client no está instalado las funciones de este módulo no hacen
+nada y /metrics responde 503.
+"""
+import hmac
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .consultas import registrar_consultas
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+        generate_latest, multiprocess,
+    )
+    PROMETHEUS_DISPONIBLE = True
+except ImportError:
+    PROMETHEUS_DISPONIBLE = False
+
+SIN_RUTA = '<sin_ruta>'
+# Otros métodos se agrupan en 'otro' para no crear series con lo que envíe el cliente
+METODOS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+if PROMETHEUS_DISPONIBLE:
+    PETICION_SEGUNDOS = Histogram(
+        'tienda_peticion_segundos', 'Duración de las peticiones por nombre de URL',
+        ['vista', 'metodo'],
+    )
+    PETICION_CONSULTAS = Histogram(
+        'tienda_peticion_consultas', 'Consultas a la base de datos por petición',
+        ['vista'], buckets=(0, 1, 2, 4, 8, 16, 32, 64, 128, float('inf')),
+    )
+    COMPRAS = Counter('tienda_compras', 'Compras confirmadas')
+    COMPRA_LINEAS = Counter('tienda_compra_lineas', 'Líneas de carrito vendidas')
+    COMPRA_RECHAZADAS = Counter(
+        'tienda_compra_lineas_rechazadas', 'Líneas de carrito rechazadas por falta de stock',
+    )
+    PDF_SEGUNDOS = Histogram(
+        'tienda_pdf_segundos', 'Duración de la generación de PDF de reportes',
+        buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, float('inf')),
+    )
+    PDF_BYTES = Histogram(
+        'tienda_pdf_bytes', 'Tamaño de los PDF de reportes',
+        buckets=(2 ** 14, 2 ** 16, 2 ** 18, 2 ** 20, 2 ** 22, 2 ** 24, 2 ** 26, float('inf')),
+    )
+    CACHE = Counter('tienda_cache', 'Aciertos y fallos de las cachés', ['cache', 'resultado'])
+
+
+def contar_compra(lineas, rechazadas):
+    """Anota una compra con `lineas` vendidas y `rechazadas` sin stock"""
+    if not PROMETHEUS_DISPONIBLE:
+        return
+    if lineas:
+        COMPRAS.inc()
+        COMPRA_LINEAS.inc(lineas)
+    if rechazadas:
+        COMPRA_RECHAZADAS.inc(rechazadas)
+
+
+def observar_pdf(segundos, tamano):
+    if not PROMETHEUS_DISPONIBLE:
+        return
+    PDF_SEGUNDOS.observe(segundos)
+    PDF_BYTES.observe(tamano)
+
+
+def contar_cache(cache, aciertos=0, fallos=0):
+    """Suma aciertos y fallos de la caché `cache` ('reportes' o 'tarjetas')"""
+    if not PROMETHEUS_DISPONIBLE:
+        return
+    if aciertos:
+        CACHE.labels(cache, 'acierto').inc(aciertos)
+    if fallos:
+        CACHE.labels(cache, 'fallo').inc(fallos)
+
+
+def exponer():
+    """(contenido, content_type) con todas las métricas, sumando los workers en modo multiproceso"""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    else:
+        registro = REGISTRY
+    return generate_latest(registro), CONTENT_TYPE_LATEST
+
+
+def autorizado(request):
+    """
+    Personal de la tienda, o quien envíe `Authorization: Bearer <TIENDA_METRICAS_TOKEN>`
+    (el scraper de Prometheus). Sin token configurado, cualquiera solo en DEBUG.
+    """
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    token = getattr(settings, 'TIENDA_METRICAS_TOKEN', '')
+    if not token:
+        return settings.DEBUG
+    cabecera = request.headers.get('Authorization', '')
+    return hmac.compare_digest(cabecera.encode(), f'Bearer {token}'.encode())
+
+
+class MetricasMiddleware:
+    """Latencia y consultas de cada petición, por nombre de URL"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not PROMETHEUS_DISPONIBLE or not getattr(settings, 'TIENDA_METRICAS', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        inicio = time.perf_counter()
+        with registrar_consultas() as consultas:
+            respuesta = self.get_response(request)
+        self._observar(request, consultas, time.perf_counter() - inicio)
+        return respuesta
+
+    async def __acall__(self, request):
+        inicio = time.perf_counter()
+        with registrar_consultas() as consultas:
+            respuesta = await self.get_response(request)
+        self._observar(request, consultas, time.perf_counter() - inicio)
+        return respuesta
+
+    def _observar(self, request, consultas, segundos):
+        # Nombre de URL y no ruta: /ventas/?page=3 y /ventas/ son la misma serie
+        coincidencia = getattr(request, 'resolver_match', None)
+        vista = coincidencia.view_name if coincidencia and coincidencia.view_name else SIN_RUTA
+        metodo = request.method if request.method in METODOS else 'otro'
+        PETICION_SEGUNDOS.labels(vista, metodo).observe(segundos)
+        PETICION_CONSULTAS.labels(vista).observe(consultas.total)
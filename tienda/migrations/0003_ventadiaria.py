@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Sum
+
+
+def poblar_resumen(apps, schema_editor):
+    Venta = apps.get_model('tienda', 'Venta')
+    VentaDiaria = apps.get_model('tienda', 'VentaDiaria')
+    alias = schema_editor.connection.alias
+    filas = Venta.objects.using(alias).order_by().values('fecha', 'producto_id', 'vendedor_id').annotate(
+        num_ventas=Count('id'),
+        unidades=Sum('cantidad'),
+        ingreso=Sum(
+            F('cantidad') * F('producto__precio'),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        ),
+    )
+    lote = []
+    for fila in filas.iterator(chunk_size=1000):
+        lote.append(VentaDiaria(**fila))
+        if len(lote) >= 1000:
+            VentaDiaria.objects.using(alias).bulk_create(lote)
+            lote = []
+    if lote:
+        VentaDiaria.objects.using(alias).bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0002_carritoitem'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('num_ventas', models.PositiveIntegerField(default=0)),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('ingreso', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tienda.producto')),
+                ('vendedor', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Ventas diarias',
+                'ordering': ['-fecha'],
+                'unique_together': {('fecha', 'producto', 'vendedor')},
+            },
+        ),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0003_ventadiaria'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportacionReporte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('formato', models.CharField(choices=[('pdf', 'PDF'), ('csv', 'CSV'), ('jsonl', 'JSON Lines')], max_length=10)),
+                ('filtros', models.JSONField(blank=True, default=dict)),
+                ('huella', models.CharField(db_index=True, max_length=64)),
+                ('version_datos', models.CharField(blank=True, max_length=64)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('error', 'Error')], default='pendiente', max_length=20)),
+                ('archivo', models.FileField(blank=True, upload_to='exportaciones/%Y/%m/')),
+                ('tamano', models.PositiveBigIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('iniciado', models.DateTimeField(blank=True, null=True)),
+                ('terminado', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exportaciones', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Exportaciones de reportes',
+                'ordering': ['-creado'],
+                'indexes': [models.Index(fields=['estado', 'creado'], name='tienda_expo_estado_52f3a3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0004_exportacionreporte'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['fecha', 'id'], name='venta_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['producto', 'fecha'], name='venta_producto_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['vendedor', 'fecha'], name='venta_vendedor_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ventadiaria',
+            index=models.Index(fields=['producto', 'fecha'], name='ventadiaria_producto_fecha_idx'),
+        ),
+    ]
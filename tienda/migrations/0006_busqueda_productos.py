@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from tienda.busqueda import crear_indice, eliminar_indice
+
+
+def crear(apps, schema_editor):
+    crear_indice(schema_editor.connection)
+
+
+def eliminar(apps, schema_editor):
+    eliminar_indice(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0005_indices_ventas'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear, eliminar),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:07
+
+from django.db import migrations, models
+
+from tienda.busqueda import crear_indice, suspender_triggers
+
+
+# En SQLite AddField reconstruye las tablas: los triggers del índice de
+# búsqueda se quitan antes y se vuelven a crear después
+def suspender_busqueda(apps, schema_editor):
+    suspender_triggers(schema_editor.connection)
+
+
+def restaurar_busqueda(apps, schema_editor):
+    crear_indice(schema_editor.connection, poblar=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0006_busqueda_productos'),
+    ]
+
+    operations = [
+        migrations.RunPython(suspender_busqueda, restaurar_busqueda),
+        migrations.AddField(
+            model_name='categoria',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(restaurar_busqueda, suspender_busqueda),
+    ]
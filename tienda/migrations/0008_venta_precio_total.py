@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:20
+
+from django.db import migrations, models, transaction
+from django.db.models import F, OuterRef, Subquery
+
+TAMANO_LOTE = 5000
+
+
+def rellenar_precio_total(apps, schema_editor):
+    """
+    Copia el precio actual del producto en las ventas existentes y calcula su
+    total, por tramos de id; cada tramo se confirma por separado, así que la
+    migración puede interrumpirse y repetirse.
+    """
+    Venta = apps.get_model('tienda', 'Venta')
+    Producto = apps.get_model('tienda', 'Producto')
+    alias = schema_editor.connection.alias
+    precio = Subquery(Producto.objects.filter(pk=OuterRef('producto_id')).values('precio')[:1])
+
+    pendientes = Venta.objects.using(alias).filter(total__isnull=True)
+    desde = pendientes.order_by('pk').values_list('pk', flat=True).first()
+    ultimo = pendientes.order_by('-pk').values_list('pk', flat=True).first()
+    while desde is not None and desde <= ultimo:
+        with transaction.atomic(using=alias):
+            lote = pendientes.filter(pk__gte=desde, pk__lt=desde + TAMANO_LOTE)
+            lote.update(precio_unitario=precio)
+            lote.update(total=F('cantidad') * F('precio_unitario'))
+        desde += TAMANO_LOTE
+
+
+class Migration(migrations.Migration):
+    # El relleno se confirma por lotes (ver rellenar_precio_total)
+    atomic = False
+
+    dependencies = [
+        ('tienda', '0007_actualizado_catalogo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='precio_unitario',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='total',
+            field=models.DecimalField(decimal_places=2, max_digits=14, null=True),
+        ),
+        migrations.RunPython(rellenar_precio_total, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0008_venta_precio_total'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='venta',
+            name='precio_unitario',
+            field=models.DecimalField(decimal_places=2, max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='venta',
+            name='total',
+            field=models.DecimalField(decimal_places=2, max_digits=14),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['fecha', 'total'], name='venta_fecha_total_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0009_venta_precio_total_obligatorio'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField()),
+                ('expira', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Reserva de stock',
+                'verbose_name_plural': 'Reservas de stock',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='carritoitem',
+            index=models.Index(fields=['fecha_agregado'], name='carrito_fecha_agregado_idx'),
+        ),
+        migrations.AddField(
+            model_name='reservastock',
+            name='producto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='tienda.producto'),
+        ),
+        migrations.AddField(
+            model_name='reservastock',
+            name='usuario',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_stock', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='reservastock',
+            index=models.Index(fields=['producto', 'expira'], name='reserva_producto_expira_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservastock',
+            index=models.Index(fields=['expira'], name='reserva_expira_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='reservastock',
+            unique_together={('usuario', 'producto')},
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0010_reservastock'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rol',
+            name='usuarios',
+            field=models.ManyToManyField(blank=True, related_name='roles', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -5,6 +5,7 @@ from django.contrib.contenttypes.models import ContentType
 class Categoria(models.Model):
     nombre = models.CharField(max_length=50)
     descripcion = models.TextField(blank=True)
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         verbose_name_plural = "Categorías"
@@ -20,6 +21,7 @@ class Producto(models.Model):
     categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE)
     precio = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         permissions = [
@@ -30,10 +32,15 @@ class Producto(models.Model):
         return self.nombre
 
 class Venta(models.Model):
-    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    # Sin índice propio en las FK: los índices (producto, fecha) y (vendedor, fecha)
+    # de Meta también sirven para buscar solo por producto o vendedor (borrados en cascada)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, db_index=False)
     cantidad = models.PositiveIntegerField()
+    # Precio y total en el momento de la venta: no cambian si luego cambia el precio del producto
+    precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
+    total = models.DecimalField(max_digits=14, decimal_places=2)
     fecha = models.DateField(auto_now_add=True)
-    vendedor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    vendedor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, db_index=False)
     
     class Meta:
         permissions = [
@@ -41,9 +48,26 @@ class Venta(models.Model):
             ("export_sales_reports", "Puede descargar reportes en PDF"),
         ]
         ordering = ['-fecha']
+        indexes = [
+            # Rango de fechas + paginación por cursor (-fecha, -id)
+            models.Index(fields=['fecha', 'id'], name='venta_fecha_id_idx'),
+            # Filtro por producto (o por categoría, vía sus productos) + rango de fechas
+            models.Index(fields=['producto', 'fecha'], name='venta_producto_fecha_idx'),
+            # Agrupación por vendedor (vendedor top) + rango de fechas
+            models.Index(fields=['vendedor', 'fecha'], name='venta_vendedor_fecha_idx'),
+            # Ingreso por rango de fechas (Sum('total')) leyendo solo el índice
+            models.Index(fields=['fecha', 'total'], name='venta_fecha_total_idx'),
+        ]
     
-    def total(self):
-        return self.cantidad * self.producto.precio
+    def calcular_total(self):
+        """Fija precio_unitario (si falta) con el precio actual del producto y calcula total"""
+        if self.precio_unitario is None:
+            self.precio_unitario = self.producto.precio
+        self.total = self.cantidad * self.precio_unitario
+    
+    def save(self, *args, **kwargs):
+        self.calcular_total()
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.producto.nombre} - {self.fecha}"
@@ -62,6 +86,7 @@ class Rol(models.Model):
     tipo = models.CharField(max_length=20, choices=OPCIONES_TIPO, unique=True)
     descripcion = models.TextField()
     permisos = models.ManyToManyField(Permission, blank=True)
+    usuarios = models.ManyToManyField(User, blank=True, related_name='roles')
     
     def __str__(self):
         return self.get_tipo_display()
@@ -81,9 +106,106 @@ class CarritoItem(models.Model):
     class Meta:
         unique_together = ('usuario', 'producto')
         ordering = ['-fecha_agregado']
+        indexes = [
+            # Limpieza de carritos abandonados (limpiar_reservas)
+            models.Index(fields=['fecha_agregado'], name='carrito_fecha_agregado_idx'),
+        ]
     
     def subtotal(self):
         return self.cantidad * self.producto.precio
     
     def __str__(self):
         return f"{self.usuario.username} - {self.producto.nombre} x{self.cantidad}"
+
+class ReservaStock(models.Model):
+    """
+    Unidades de un producto apartadas para el carrito de un usuario hasta
+    `expira`. El stock disponible para los demás es stock menos las reservas
+    vigentes (ver tienda.reservas).
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservas_stock')
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='reservas')
+    cantidad = models.PositiveIntegerField()
+    expira = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ('usuario', 'producto')
+        verbose_name = 'Reserva de stock'
+        verbose_name_plural = 'Reservas de stock'
+        indexes = [
+            # Unidades reservadas vigentes por producto: Sum(cantidad) WHERE producto = ? AND expira > ahora
+            models.Index(fields=['producto', 'expira'], name='reserva_producto_expira_idx'),
+            # Barrido de reservas caducadas
+            models.Index(fields=['expira'], name='reserva_expira_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.usuario.username} - {self.producto.nombre} x{self.cantidad}"
+
+class VentaDiaria(models.Model):
+    """
+    Resumen diario de ventas por (fecha, producto, vendedor).
+    Se mantiene de forma incremental al registrar ventas (ver tienda.resumen)
+    """
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    vendedor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    num_ventas = models.PositiveIntegerField(default=0)
+    unidades = models.PositiveIntegerField(default=0)
+    ingreso = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        verbose_name_plural = "Ventas diarias"
+        unique_together = ('fecha', 'producto', 'vendedor')
+        ordering = ['-fecha']
+        indexes = [
+            # unique_together ya indexa (fecha, producto, vendedor); este cubre el filtro por producto
+            models.Index(fields=['producto', 'fecha'], name='ventadiaria_producto_fecha_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.fecha} - {self.producto_id} x{self.unidades}"
+
+class ExportacionReporte(models.Model):
+    """
+    Trabajo de exportación de reportes procesado fuera de la petición
+    por el comando procesar_exportaciones
+    """
+    PENDIENTE = 'pendiente'
+    PROCESANDO = 'procesando'
+    COMPLETADO = 'completado'
+    ERROR = 'error'
+    OPCIONES_ESTADO = [
+        (PENDIENTE, 'Pendiente'),
+        (PROCESANDO, 'Procesando'),
+        (COMPLETADO, 'Completado'),
+        (ERROR, 'Error'),
+    ]
+    OPCIONES_FORMATO = [
+        ('pdf', 'PDF'),
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    ]
+    
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='exportaciones')
+    formato = models.CharField(max_length=10, choices=OPCIONES_FORMATO)
+    filtros = models.JSONField(default=dict, blank=True)
+    huella = models.CharField(max_length=64, db_index=True)
+    version_datos = models.CharField(max_length=64, blank=True)
+    estado = models.CharField(max_length=20, choices=OPCIONES_ESTADO, default=PENDIENTE)
+    archivo = models.FileField(upload_to='exportaciones/%Y/%m/', blank=True)
+    tamano = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    iniciado = models.DateTimeField(null=True, blank=True)
+    terminado = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name_plural = "Exportaciones de reportes"
+        ordering = ['-creado']
+        indexes = [
+            models.Index(fields=['estado', 'creado']),
+        ]
+    
+    def __str__(self):
+        return f"{self.usuario.username} - {self.formato} ({self.get_estado_display()})"
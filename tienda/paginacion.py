@@ -0,0 +1,137 @@
+"""
+Paginación por cursor (keyset) para listados de ventas.
+
+Las páginas se ordenan por (-fecha, -id) y cada enlace lleva la clave de la
+última (o primera) fila mostrada, de modo que una página profunda cuesta lo
+mismo que la primera: no hay OFFSET.
+"""
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+
+POR_PAGINA_MAX = 500
+
+
+class PaginaKeyset:
+    """Página de resultados con los querystrings para moverse a la anterior/siguiente"""
+
+    def __init__(self, items, query_anterior, query_siguiente, por_pagina):
+        self.items = items
+        self.query_anterior = query_anterior
+        self.query_siguiente = query_siguiente
+        self.por_pagina = por_pagina
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    @property
+    def tiene_anterior(self):
+        return self.query_anterior is not None
+
+    @property
+    def tiene_siguiente(self):
+        return self.query_siguiente is not None
+
+
+def _codificar(venta):
+    return f"{venta.fecha.isoformat()}_{venta.pk}"
+
+
+def _decodificar(cursor):
+    """Devuelve (fecha, id) o None si el cursor no es válido"""
+    try:
+        fecha, pk = cursor.split('_', 1)
+        fecha = parse_date(fecha)
+        pk = int(pk)
+    except (ValueError, TypeError, AttributeError):
+        return None
+    if fecha is None:
+        return None
+    return fecha, pk
+
+
+def _query(params, cursor, direccion):
+    params = params.copy()
+    params['cursor'] = cursor
+    params['dir'] = direccion
+    return params.urlencode()
+
+
+def tamano_pagina(request):
+    """Tamaño de página pedido en ?por_pagina=, acotado a [1, POR_PAGINA_MAX]"""
+    por_defecto = getattr(settings, 'TIENDA_VENTAS_POR_PAGINA', 50)
+    try:
+        por_pagina = int(request.GET.get('por_pagina', por_defecto))
+    except (ValueError, TypeError):
+        por_pagina = por_defecto
+    return max(1, min(por_pagina, POR_PAGINA_MAX))
+
+
+def _consulta_pagina(request, ventas):
+    """Consulta de la página pedida (una fila de más para saber si hay otra) y datos para armarla"""
+    por_pagina = tamano_pagina(request)
+    clave = _decodificar(request.GET.get('cursor', ''))
+    hacia_atras = clave is not None and request.GET.get('dir') == 'prev'
+
+    if clave is None:
+        qs = ventas.order_by('-fecha', '-id')
+    else:
+        fecha, pk = clave
+        # El rango sobre fecha permite recorrer el índice (fecha, id) en orden;
+        # el OR solo descarta las filas de la misma fecha ya mostradas
+        if hacia_atras:
+            qs = ventas.filter(fecha__gte=fecha).filter(
+                Q(fecha__gt=fecha) | Q(id__gt=pk)
+            ).order_by('fecha', 'id')
+        else:
+            qs = ventas.filter(fecha__lte=fecha).filter(
+                Q(fecha__lt=fecha) | Q(id__lt=pk)
+            ).order_by('-fecha', '-id')
+
+    return qs[:por_pagina + 1], por_pagina, clave, hacia_atras
+
+
+def _armar_pagina(request, items, por_pagina, clave, hacia_atras):
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    params.pop('dir', None)
+
+    hay_mas = len(items) > por_pagina
+    items = items[:por_pagina]
+    if hacia_atras:
+        items.reverse()
+
+    query_anterior = query_siguiente = None
+    if items:
+        if hacia_atras:
+            if hay_mas:
+                query_anterior = _query(params, _codificar(items[0]), 'prev')
+            query_siguiente = _query(params, _codificar(items[-1]), 'next')
+        else:
+            if clave is not None:
+                query_anterior = _query(params, _codificar(items[0]), 'prev')
+            if hay_mas:
+                query_siguiente = _query(params, _codificar(items[-1]), 'next')
+
+    return PaginaKeyset(items, query_anterior, query_siguiente, por_pagina)
+
+
+def paginar_ventas(request, ventas):
+    """
+    Devuelve la página de `ventas` indicada por ?cursor=&dir= (next/prev).
+    Los demás parámetros GET (filtros activos) se conservan en los enlaces.
+    """
+    qs, *datos = _consulta_pagina(request, ventas)
+    return _armar_pagina(request, list(qs), *datos)
+
+
+async def apaginar_ventas(request, ventas):
+    """Versión async de paginar_ventas"""
+    qs, *datos = _consulta_pagina(request, ventas)
+    return _armar_pagina(request, [venta async for venta in qs.aiterator()], *datos)
@@ -0,0 +1,86 @@
+"""
+Resolución de permisos con roles y caché.
+
+RolBackend sustituye a ModelBackend: los permisos efectivos de un usuario
+son los asignados directamente, los de sus grupos y los de sus roles
+(Rol.permisos de los Rol en los que figura en Rol.usuarios). Se obtienen
+con una sola consulta y se guardan en la caché bajo una clave con dos
+versiones: una global, que cambia al modificar roles, grupos o permisos, y
+otra por usuario, que cambia al modificar sus permisos, grupos o roles
+(ver tienda.signals). Dentro de una petición se reutilizan desde el propio
+objeto usuario.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+CLAVE_VERSION = 'tienda:permisos:version'
+SEGUNDOS = 24 * 3600
+
+
+def _clave_version_usuario(usuario_id):
+    return f'{CLAVE_VERSION}:{usuario_id}'
+
+
+def _incrementar(clave):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        # Basada en el reloj: si la caché pierde la clave, nunca se reutiliza una versión antigua
+        cache.set(clave, time.time_ns(), timeout=None)
+
+
+def invalidar_permisos(usuario_ids=None):
+    """
+    Invalida al confirmarse la transacción los permisos cacheados de los
+    usuarios indicados, o de todos si no se indican.
+    """
+    if usuario_ids is None:
+        transaction.on_commit(lambda: _incrementar(CLAVE_VERSION))
+        return
+    claves = [_clave_version_usuario(pk) for pk in usuario_ids]
+    transaction.on_commit(lambda: [_incrementar(clave) for clave in claves])
+
+
+def clave_permisos(usuario_id):
+    claves = [CLAVE_VERSION, _clave_version_usuario(usuario_id)]
+    versiones = cache.get_many(claves)
+    return 'tienda:permisos:{}:{}:{}'.format(usuario_id, *(versiones.get(c, 0) for c in claves))
+
+
+def resolver_permisos(usuario):
+    """Permisos efectivos ('app_label.codename') del usuario, desde la base de datos"""
+    permisos = Permission.objects.all()
+    if not usuario.is_superuser:
+        permisos = permisos.filter(
+            Q(user=usuario) | Q(group__user=usuario) | Q(rol__usuarios=usuario)
+        )
+    return {
+        f'{app_label}.{codename}'
+        for app_label, codename in permisos.values_list('content_type__app_label', 'codename').distinct()
+    }
+
+
+class RolBackend(ModelBackend):
+    """ModelBackend con permisos de Rol y caché de permisos por usuario"""
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            clave = clave_permisos(user_obj.pk)
+            permisos = cache.get(clave)
+            if permisos is None:
+                permisos = resolver_permisos(user_obj)
+                cache.set(clave, permisos, timeout=SEGUNDOS)
+            user_obj._perm_cache = permisos
+        return user_obj._perm_cache
+
+    async def aget_all_permissions(self, user_obj, obj=None):
+        # ModelBackend tiene su propia versión async que no pasaría por la caché
+        return await sync_to_async(self.get_all_permissions)(user_obj, obj)
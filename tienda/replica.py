@@ -0,0 +1,171 @@
+"""
+Lecturas de reportes desde una réplica de la base de datos.
+
+Si REPORTS_DATABASE_URL está definido, settings añade el alias 'reportes'.
+Las vistas de reportes, las exportaciones y el listado de ventas del admin
+leen de él las ventas, el resumen diario, los productos y las categorías
+(decorador leer_de_replica o `with lecturas_replica()`); el carrito, la
+compra y el resto de la aplicación siguen en 'default', y toda escritura va
+siempre a 'default'.
+
+Una réplica puede ir con retraso: tras una escritura, las lecturas de la
+misma sesión se hacen en la primaria durante TIENDA_REPLICA_RETRASO_SEGUNDOS
+(ReplicaMiddleware), de modo que el usuario ve sus propios cambios.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+ALIAS = 'reportes'
+CLAVE_SESION = 'tienda_ultima_escritura'
+MODELOS = {'tienda.venta', 'tienda.ventadiaria', 'tienda.producto', 'tienda.categoria'}
+# Escrituras que no cuentan para fijar la sesión a la primaria
+MODELOS_SIN_SEGUIMIENTO = {'sessions.session'}
+METODOS_LECTURA = ('GET', 'HEAD')
+
+
+class _Estado:
+    """Estado de la petición en curso; es mutable para que lo vean también los hilos de sync_to_async"""
+
+    def __init__(self, primaria=False):
+        self.replica = False
+        self.primaria = primaria
+        self.escritura = False
+
+
+_estado = ContextVar('tienda_replica', default=None)
+
+
+def hay_replica():
+    return ALIAS in settings.DATABASES
+
+
+def retraso_replica():
+    return getattr(settings, 'TIENDA_REPLICA_RETRASO_SEGUNDOS', 10)
+
+
+@contextmanager
+def lecturas_replica():
+    """Dentro del bloque, los modelos de reportes se leen de la réplica (si la hay)"""
+    estado = _estado.get()
+    token = None
+    if estado is None:
+        estado = _Estado()
+        token = _estado.set(estado)
+    anterior = estado.replica
+    estado.replica = True
+    try:
+        yield
+    finally:
+        estado.replica = anterior
+        if token is not None:
+            _estado.reset(token)
+
+
+def _renderizar(respuesta):
+    # Una TemplateResponse evalúa sus querysets al renderizarse: se hace aquí,
+    # todavía dentro de lecturas_replica()
+    if hasattr(respuesta, 'render') and not respuesta.is_rendered:
+        respuesta.render()
+    return respuesta
+
+
+def leer_de_replica(vista):
+    """Decorador de vistas (sync o async): las peticiones GET/HEAD leen de la réplica"""
+    if iscoroutinefunction(vista):
+        @wraps(vista)
+        async def envoltura(request, *args, **kwargs):
+            if request.method not in METODOS_LECTURA:
+                return await vista(request, *args, **kwargs)
+            with lecturas_replica():
+                return _renderizar(await vista(request, *args, **kwargs))
+    else:
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if request.method not in METODOS_LECTURA:
+                return vista(request, *args, **kwargs)
+            with lecturas_replica():
+                return _renderizar(vista(request, *args, **kwargs))
+    return envoltura
+
+
+class RouterReplica:
+    """
+    Envía a la réplica las lecturas de MODELOS dentro de lecturas_replica(),
+    salvo si la sesión escribió hace poco o hay una transacción abierta en la
+    primaria. Las escrituras van siempre a 'default'.
+    """
+
+    def db_for_read(self, model, **hints):
+        estado = _estado.get()
+        if (
+            estado is not None
+            and estado.replica
+            and not estado.primaria
+            and model._meta.label_lower in MODELOS
+            and hay_replica()
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        estado = _estado.get()
+        if estado is not None and model._meta.label_lower not in MODELOS_SIN_SEGUIMIENTO:
+            estado.escritura = True
+        # Sin esto, guardar un objeto leído de la réplica escribiría en ella
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primaria y réplica tienen los mismos datos
+        return True
+
+
+class ReplicaMiddleware:
+    """
+    Fija a la primaria las lecturas de una sesión que escribió hace menos de
+    TIENDA_REPLICA_RETRASO_SEGUNDOS y anota en la sesión cuándo escribe.
+    Debe ir después de SessionMiddleware. Sin réplica configurada no se usa.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not hay_replica():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _reciente(self, ultima_escritura):
+        return ultima_escritura is not None and time.time() - ultima_escritura < retraso_replica()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        estado = _Estado(primaria=self._reciente(request.session.get(CLAVE_SESION)))
+        token = _estado.set(estado)
+        try:
+            respuesta = self.get_response(request)
+        finally:
+            _estado.reset(token)
+        if estado.escritura:
+            request.session[CLAVE_SESION] = time.time()
+        return respuesta
+
+    async def __acall__(self, request):
+        estado = _Estado(primaria=self._reciente(await request.session.aget(CLAVE_SESION)))
+        token = _estado.set(estado)
+        try:
+            respuesta = await self.get_response(request)
+        finally:
+            _estado.reset(token)
+        if estado.escritura:
+            await request.session.aset(CLAVE_SESION, time.time())
+        return respuesta
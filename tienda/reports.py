@@ -1,18 +1,275 @@
-from reportlab.pdfgen import canvas
-from django.http import HttpResponse
-from .models import Venta
+"""
+Motor único de reportes PDF.
 
+La portada (filtros, resumen y ventas por categoría) se arma con platypus y el
+detalle de ventas se genera por lotes desde la base de datos a medida que
+platypus consume la historia. El PDF se escribe en un fichero temporal y se
+devuelve con FileResponse en lugar de acumularse en el buffer de la respuesta.
+
+Aun así la memoria crece con el detalle (unos 0,6 KB por fila): el canvas de
+ReportLab conserva todas las páginas terminadas hasta guardar el documento.
+Por eso la descarga directa limita el detalle a TIENDA_PDF_MAX_FILAS filas; el
+detalle completo de rangos mayores se obtiene con la exportación en segundo
+plano (tienda.exportaciones) o en CSV.
+"""
+import tempfile
+import time
+from datetime import datetime
+from itertools import chain
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required, permission_required
+from django.http import FileResponse, HttpResponse
+
+from .exportar import filas_ventas
+from .metricas import observar_pdf
+from .models import Categoria, Venta
+from .resumen import resumir_ventas
+from .tiempos import medir
+
+# Importar para PDF
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.enums import TA_CENTER
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+
+# Filas de detalle por tabla (y por consulta a la base de datos)
+FILAS_POR_LOTE = 200
+
+ENCABEZADO_DETALLE = ['Fecha', 'Producto', 'Categoría', 'Cant.', 'Precio', 'Total', 'Vendedor']
+
+
+class HistoriaPerezosa(list):
+    """
+    Lista de flowables que platypus consume por el frente y que se rellena
+    desde un generador cuando quedan pocos elementos.
+    """
+
+    def __init__(self, iniciales, generador, minimo=2):
+        super().__init__(iniciales)
+        self._generador = generador
+        self._minimo = minimo
+
+    def __len__(self):
+        while self._generador is not None and list.__len__(self) < self._minimo:
+            try:
+                self.append(next(self._generador))
+            except StopIteration:
+                self._generador = None
+        return list.__len__(self)
+
+
+def _estilo_tabla(fondo, tamano_encabezado=10):
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f4788')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), tamano_encabezado),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), fondo),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ])
+
+
+def max_filas_pdf():
+    return getattr(settings, 'TIENDA_PDF_MAX_FILAS', 2000)
+
+
+def _tablas_detalle(ventas, limite=None):
+    """Genera una tabla platypus por cada lote de FILAS_POR_LOTE ventas (como mucho `limite` filas)"""
+    estilo = _estilo_tabla(colors.white, tamano_encabezado=8)
+    estilo.add('FONTSIZE', (0, 1), (-1, -1), 7)
+    estilo.add('BOTTOMPADDING', (0, 0), (-1, 0), 6)
+    anchos = [0.8*inch, 1.9*inch, 1.1*inch, 0.5*inch, 0.8*inch, 0.9*inch, 1.0*inch]
+
+    lote = []
+    for _, fecha, producto, categoria, cantidad, precio, total, vendedor in filas_ventas(ventas, limite):
+        lote.append([
+            fecha.strftime('%d/%m/%Y'),
+            producto[:40],
+            categoria,
+            str(cantidad),
+            f"${float(precio):.2f}",
+            f"${float(total):.2f}",
+            vendedor or 'Sistema',
+        ])
+        if len(lote) >= FILAS_POR_LOTE:
+            yield Table([ENCABEZADO_DETALLE] + lote, colWidths=anchos, repeatRows=1, style=estilo)
+            lote = []
+    if lote:
+        yield Table([ENCABEZADO_DETALLE] + lote, colWidths=anchos, repeatRows=1, style=estilo)
+
+
+def _portada(datos_reporte, reporte_categorias, filtros):
+    """Flowables de título, filtros, resumen general y ventas por categoría"""
+    elements = []
+
+    # Estilos
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=16,
+        textColor=colors.HexColor('#1f4788'),
+        spaceAfter=30,
+        alignment=TA_CENTER,
+    )
+
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=12,
+        textColor=colors.HexColor('#2e5090'),
+        spaceAfter=12,
+        spaceBefore=12,
+    )
+
+    # Título
+    elements.append(Paragraph("REPORTE DE VENTAS", title_style))
+
+    # Información de filtros
+    fecha_reporte = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+    info_filtros = f"Generado: {fecha_reporte}"
+    if filtros and any(filtros.values()):
+        info_filtros += " | Filtros aplicados:"
+        if filtros.get('fecha_inicio'):
+            info_filtros += f" Desde {filtros['fecha_inicio']}"
+        if filtros.get('fecha_fin'):
+            info_filtros += f" Hasta {filtros['fecha_fin']}"
+        if filtros.get('categoria'):
+            info_filtros += f" Categoría: {filtros['categoria']}"
+        if filtros.get('producto'):
+            info_filtros += f" Producto: {filtros['producto']}"
+
+    elements.append(Paragraph(info_filtros, styles['Normal']))
+    elements.append(Spacer(1, 0.3*inch))
+
+    # Resumen general
+    elements.append(Paragraph("RESUMEN GENERAL", heading_style))
+
+    try:
+        ingreso_total = float(datos_reporte.get('ingreso_total', 0))
+        total_ventas = int(datos_reporte.get('total_ventas', 0))
+        cantidad_productos = int(datos_reporte.get('cantidad_productos', 0))
+        vendedor_top = datos_reporte.get('vendedor_top') or 'N/A'
+    except (ValueError, TypeError):
+        ingreso_total = 0
+        total_ventas = 0
+        cantidad_productos = 0
+        vendedor_top = 'N/A'
+
+    datos_resumen = [
+        ['Métrica', 'Valor'],
+        ['Total de Ventas', str(total_ventas)],
+        ['Ingreso Total', f"${ingreso_total:.2f}"],
+        ['Cantidad de Productos', str(cantidad_productos)],
+        ['Vendedor Top', str(vendedor_top)],
+    ]
+
+    tabla_resumen = Table(datos_resumen, colWidths=[3*inch, 2*inch])
+    tabla_resumen.setStyle(_estilo_tabla(colors.beige, tamano_encabezado=12))
+
+    elements.append(tabla_resumen)
+    elements.append(Spacer(1, 0.3*inch))
+
+    # Reporte por categoría
+    if reporte_categorias:
+        datos_categorias = [
+            ['Categoría', 'Cantidad', 'Ingreso Total', 'Promedio'],
+        ]
+
+        for item in reporte_categorias:
+            try:
+                datos_categorias.append([
+                    str(item['categoria'].nombre),
+                    str(item['cantidad']),
+                    f"${float(item['ingreso']):.2f}",
+                    f"${float(item['promedio']):.2f}",
+                ])
+            except (ValueError, KeyError, TypeError):
+                continue
+
+        if len(datos_categorias) > 1:  # Si hay más que el encabezado
+            elements.append(Paragraph("VENTAS POR CATEGORÍA", heading_style))
+            tabla_categorias = Table(datos_categorias, colWidths=[2*inch, 1.2*inch, 1.2*inch, 1.2*inch])
+            tabla_categorias.setStyle(_estilo_tabla(colors.lightgrey))
+            elements.append(tabla_categorias)
+            elements.append(Spacer(1, 0.3*inch))
+
+    elements.append(Paragraph("DETALLE DE VENTAS", heading_style))
+    return elements
+
+
+def _aviso_recorte(limite, total, alternativa):
+    yield Spacer(1, 0.2*inch)
+    yield Paragraph(
+        f"Se muestran las primeras {limite} de {total} ventas. Para el detalle completo, "
+        f"{alternativa}.",
+        getSampleStyleSheet()['Italic'],
+    )
+
+
+def escribir_pdf(archivo, ventas, datos_reporte, reporte_categorias, filtros, limite=None,
+                 alternativa='solicite la exportación en segundo plano o descargue el CSV'):
+    """
+    Escribe el PDF del reporte (portada + detalle por lotes) en `archivo`.
+    Con `limite`, el detalle se corta en esa cantidad de filas y el PDF avisa
+    de dónde obtener el detalle completo (`alternativa`).
+    """
+    inicio = time.perf_counter()
+    doc = SimpleDocTemplate(archivo, pagesize=letter, pageCompression=1)
+    detalle = _tablas_detalle(ventas, limite)
+    total = datos_reporte.get('total_ventas') or 0
+    if limite is not None and total > limite:
+        detalle = chain(detalle, _aviso_recorte(limite, total, alternativa))
+    historia = HistoriaPerezosa(
+        _portada(datos_reporte, reporte_categorias, filtros),
+        detalle,
+    )
+    doc.build(historia)
+    observar_pdf(time.perf_counter() - inicio, archivo.tell())
+
+
+def generar_pdf_reporte(ventas, datos_reporte, reporte_categorias, filtros):
+    """
+    Genera un PDF con el reporte de ventas y su detalle (hasta TIENDA_PDF_MAX_FILAS filas)
+    """
+    if not REPORTLAB_AVAILABLE:
+        return HttpResponse(
+            "ReportLab no está instalado. Instálalo con: pip install reportlab",
+            status=400
+        )
+
+    archivo = tempfile.TemporaryFile()
+    try:
+        with medir('pdf'):
+            escribir_pdf(archivo, ventas, datos_reporte, reporte_categorias, filtros, limite=max_filas_pdf())
+    except Exception as e:
+        archivo.close()
+        return HttpResponse(
+            f"Error al generar PDF: {str(e)}",
+            status=500
+        )
+
+    archivo.seek(0)
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=f'reporte_ventas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf',
+        content_type='application/pdf',
+    )
+
+
+@login_required
+@permission_required('tienda.export_sales_reports', raise_exception=True)
 def reporte_pdf(request):
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="reporte_ventas.pdf"'
-
-    p = canvas.Canvas(response)
-    p.drawString(200, 800, "Reporte de Ventas")
-    y = 750
-    ventas = Venta.objects.all()
-    for v in ventas:
-        p.drawString(100, y, f"{v.fecha} - {v.producto.nombre} - {v.cantidad} - ${v.total()}")
-        y -= 20
-    p.showPage()
-    p.save()
-    return response
+    """Reporte PDF de todas las ventas (usa el mismo motor que reporte_ventas)"""
+    datos_reporte, reporte_categorias = resumir_ventas({}, Categoria.objects.all())
+    return generar_pdf_reporte(Venta.objects.all(), datos_reporte, reporte_categorias, {})
@@ -0,0 +1,143 @@
+"""
+Reservas temporales de stock para las líneas del carrito.
+
+Al añadir o cambiar una línea se aparta la cantidad durante
+TIENDA_RESERVA_MINUTOS (0 desactiva las reservas). El stock disponible para
+un usuario es el stock del producto menos las reservas vigentes de los demás
+usuarios, calculado con un agregado sobre el índice (producto, expira).
+Las reservas caducadas y los carritos abandonados los elimina el comando
+limpiar_reservas.
+
+Con las reservas desactivadas no se escribe nada: limitar una cantidad al
+stock es una lectura, sin transacción ni bloqueo de los productos.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Sum
+from django.utils import timezone
+
+from .models import CarritoItem, Producto, ReservaStock
+
+TAMANO_LOTE = 1000
+
+
+def minutos_reserva():
+    return getattr(settings, 'TIENDA_RESERVA_MINUTOS', 15)
+
+
+def reservado(producto_ids, excluir_usuario_id=None):
+    """{producto_id: unidades con reserva vigente} (sin las del usuario excluido)"""
+    reservas = ReservaStock.objects.filter(producto_id__in=producto_ids, expira__gt=timezone.now())
+    if excluir_usuario_id is not None:
+        reservas = reservas.exclude(usuario_id=excluir_usuario_id)
+    return dict(
+        reservas.order_by().values('producto_id').annotate(unidades=Sum('cantidad'))
+        .values_list('producto_id', 'unidades')
+    )
+
+
+def disponible(productos, usuario_id):
+    """{producto_id: stock disponible para el usuario} de los productos dados"""
+    apartado = reservado([p.pk for p in productos], excluir_usuario_id=usuario_id) if minutos_reserva() else {}
+    return {p.pk: max(p.stock - apartado.get(p.pk, 0), 0) for p in productos}
+
+
+def _conceder(cantidades, libres, parcial):
+    concedidas = {}
+    for producto_id, cantidad in cantidades.items():
+        if producto_id not in libres:
+            continue
+        if cantidad <= libres[producto_id]:
+            concedidas[producto_id] = cantidad
+        elif parcial:
+            concedidas[producto_id] = libres[producto_id]
+    return concedidas
+
+
+def limitar_varios(usuario_id, cantidades, parcial=True):
+    """Como reservar_varios() pero sin apartar nada: solo lee el stock disponible"""
+    if not cantidades:
+        return {}
+    productos = list(Producto.objects.filter(pk__in=cantidades).only('stock'))
+    return _conceder(cantidades, disponible(productos, usuario_id), parcial)
+
+
+def reservar_varios(usuario_id, cantidades, parcial=True):
+    """
+    Aparta {producto_id: cantidad} para el usuario y renueva la caducidad.
+    Con parcial=True se reserva lo que haya disponible; con parcial=False las
+    líneas sin stock suficiente se dejan como estaban. Devuelve
+    {producto_id: cantidad concedida} (las no concedidas no aparecen).
+    """
+    if not cantidades:
+        return {}
+    if not minutos_reserva():
+        return limitar_varios(usuario_id, cantidades, parcial)
+    with transaction.atomic():
+        # El bloqueo de los productos serializa las reservas concurrentes
+        productos = list(Producto.objects.select_for_update().filter(pk__in=cantidades).order_by('pk'))
+        concedidas = _conceder(cantidades, disponible(productos, usuario_id), parcial)
+
+        if concedidas:
+            expira = timezone.now() + timedelta(minutes=minutos_reserva())
+            ReservaStock.objects.filter(usuario_id=usuario_id, producto_id__in=concedidas).delete()
+            ReservaStock.objects.bulk_create([
+                ReservaStock(usuario_id=usuario_id, producto_id=producto_id, cantidad=cantidad, expira=expira)
+                for producto_id, cantidad in concedidas.items()
+                if cantidad > 0
+            ])
+    return concedidas
+
+
+def reservar(usuario_id, producto_id, cantidad, parcial=True):
+    """Versión de una línea de reservar_varios(); devuelve la cantidad concedida o None"""
+    return reservar_varios(usuario_id, {producto_id: cantidad}, parcial).get(producto_id)
+
+
+def sincronizar(usuario_id, cantidades):
+    """
+    Deja reservadas solo las líneas {producto_id: cantidad} del usuario, con
+    lo que haya disponible (carritos en caché o sesión, al persistirlos).
+    """
+    with transaction.atomic():
+        ReservaStock.objects.filter(usuario_id=usuario_id).exclude(producto_id__in=cantidades).delete()
+        return reservar_varios(usuario_id, cantidades)
+
+
+def liberar(usuario_id, producto_ids=None):
+    """Elimina las reservas del usuario (de todos sus productos si no se indican)"""
+    reservas = ReservaStock.objects.filter(usuario_id=usuario_id)
+    if producto_ids is not None:
+        reservas = reservas.filter(producto_id__in=producto_ids)
+    reservas.delete()
+
+
+def _borrar_por_lotes(queryset, lote):
+    borrados = 0
+    while True:
+        pks = list(queryset.order_by().values_list('pk', flat=True)[:lote])
+        if not pks:
+            return borrados
+        borrados += queryset.model.objects.filter(pk__in=pks).delete()[0]
+
+
+def expirar_reservas(lote=TAMANO_LOTE):
+    """Elimina por lotes las reservas caducadas; devuelve cuántas"""
+    return _borrar_por_lotes(ReservaStock.objects.filter(expira__lte=timezone.now()), lote)
+
+
+def limpiar_carritos_abandonados(dias, lote=TAMANO_LOTE):
+    """
+    Elimina por lotes las líneas de CarritoItem añadidas hace más de `dias`
+    días que ya no tienen reserva vigente; devuelve cuántas.
+    """
+    limite = timezone.now() - timedelta(days=dias)
+    reserva_vigente = ReservaStock.objects.filter(
+        usuario_id=OuterRef('usuario_id'),
+        producto_id=OuterRef('producto_id'),
+        expira__gt=timezone.now(),
+    )
+    abandonados = CarritoItem.objects.filter(fecha_agregado__lt=limite).exclude(Exists(reserva_vigente))
+    return _borrar_por_lotes(abandonados, lote)
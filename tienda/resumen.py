@@ -0,0 +1,366 @@
+"""
+Mantenimiento y consulta del resumen diario de ventas (VentaDiaria).
+
+Las ventas nuevas se suman al resumen en la misma transacción en la que se
+crean; los reportes agregan sobre el resumen (unas 365 × productos filas por
+año) en lugar de recorrer todas las ventas.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.utils.dateparse import parse_date
+
+from .cache_reportes import invalidar_reportes
+from .models import Categoria, Producto, Venta, VentaDiaria
+
+# Ingreso de un conjunto de ventas: suma del total guardado en cada venta
+# (cantidad × precio en el momento de la venta), sin unir con Producto
+INGRESO_VENTA = Sum('total')
+
+TAMANO_LOTE = 1000
+
+# Agrupación del resumen de reporte_ventas
+GRUPOS_RESUMEN = ('producto__categoria_id', 'producto_id', 'vendedor__username')
+
+
+def usar_resumen():
+    """Indica si los reportes deben leer de VentaDiaria"""
+    return getattr(settings, 'TIENDA_REPORTES_DESDE_RESUMEN', True)
+
+
+def criterios_reporte(params):
+    """
+    Traduce los parámetros de filtro de reporte_ventas (fecha_inicio,
+    fecha_fin, categoria, producto) a criterios de consulta.
+    Devuelve (criterios, filtros_activos); los valores no válidos se ignoran.
+    """
+    criterios = {}
+    filtros_activos = {}
+    
+    fecha_inicio = (params.get('fecha_inicio') or '').strip()
+    fecha_fin = (params.get('fecha_fin') or '').strip()
+    categoria = (params.get('categoria') or '').strip()
+    producto = (params.get('producto') or '').strip()
+    
+    if fecha_inicio:
+        try:
+            fecha_inicio_parsed = parse_date(fecha_inicio)
+            if fecha_inicio_parsed:
+                criterios['fecha__gte'] = fecha_inicio_parsed
+                filtros_activos['fecha_inicio'] = fecha_inicio
+        except ValueError:
+            pass
+    
+    if fecha_fin:
+        try:
+            fecha_fin_parsed = parse_date(fecha_fin)
+            if fecha_fin_parsed:
+                criterios['fecha__lte'] = fecha_fin_parsed
+                filtros_activos['fecha_fin'] = fecha_fin
+        except ValueError:
+            pass
+    
+    if categoria:
+        try:
+            criterios['producto__categoria_id'] = int(categoria)
+            filtros_activos['categoria'] = categoria
+        except (ValueError, TypeError):
+            pass
+    
+    if producto:
+        try:
+            criterios['producto_id'] = int(producto)
+            filtros_activos['producto'] = producto
+        except (ValueError, TypeError):
+            pass
+    
+    return criterios, filtros_activos
+
+
+def agregar_ventas(criterios, campos):
+    """
+    Agrupa las ventas que cumplen `criterios` por `campos` y anota
+    num_ventas, unidades e ingreso.
+
+    Los criterios y campos usan nombres válidos tanto en Venta como en
+    VentaDiaria (fecha, producto_id, producto__categoria_id, vendedor__username...).
+    """
+    if usar_resumen():
+        return VentaDiaria.objects.filter(**criterios).order_by().values(*campos).annotate(
+            num_ventas=Sum('num_ventas'),
+            unidades=Sum('unidades'),
+            ingreso=Sum('ingreso'),
+        )
+    return Venta.objects.filter(**criterios).order_by().values(*campos).annotate(
+        num_ventas=Count('id'),
+        unidades=Sum('cantidad'),
+        ingreso=INGRESO_VENTA,
+    )
+
+
+def resumir_ventas(criterios, categorias):
+    """
+    Calcula el resumen de las ventas que cumplen `criterios` con una única
+    consulta agrupada por (categoría, producto, vendedor).
+    Devuelve (datos_reporte, reporte_categorias) con importes en Decimal.
+    """
+    return _combinar_resumen(agregar_ventas(criterios, GRUPOS_RESUMEN), categorias)
+
+
+async def aresumir_ventas(criterios, categorias):
+    """Versión async de resumir_ventas (`categorias` ya evaluadas)"""
+    filas = [fila async for fila in agregar_ventas(criterios, GRUPOS_RESUMEN).aiterator()]
+    return _combinar_resumen(filas, categorias)
+
+
+def _combinar_resumen(filas, categorias):
+    total_ventas = 0
+    ingreso_total = Decimal('0')
+    productos_vendidos = set()
+    unidades_vendedor = {}
+    por_categoria = {}
+    
+    for fila in filas:
+        ingreso = fila['ingreso'] or Decimal('0')
+        total_ventas += fila['num_ventas']
+        ingreso_total += ingreso
+        productos_vendidos.add(fila['producto_id'])
+        vendedor = fila['vendedor__username']
+        unidades_vendedor[vendedor] = unidades_vendedor.get(vendedor, 0) + fila['unidades']
+        cat = por_categoria.setdefault(fila['producto__categoria_id'], [0, Decimal('0')])
+        cat[0] += fila['num_ventas']
+        cat[1] += ingreso
+    
+    datos_reporte = {
+        'total_ventas': total_ventas,
+        'ingreso_total': ingreso_total,
+        'cantidad_productos': len(productos_vendidos),
+        'vendedor_top': None,
+    }
+    if unidades_vendedor:
+        datos_reporte['vendedor_top'] = max(unidades_vendedor.items(), key=lambda kv: kv[1])[0]
+    
+    reporte_categorias = []
+    for cat in categorias:
+        if cat.id in por_categoria:
+            cantidad, ingreso = por_categoria[cat.id]
+            reporte_categorias.append({
+                'categoria': cat,
+                'cantidad': cantidad,
+                'ingreso': ingreso,
+                'promedio': ingreso / cantidad if cantidad > 0 else Decimal('0'),
+            })
+    
+    return datos_reporte, reporte_categorias
+
+
+def _productos_por_categoria():
+    # values() y no values_list(): este último no admite aiterator() sin consultar en el hilo async
+    return Producto.objects.order_by().values('categoria_id').annotate(n=Count('id'))
+
+
+def resumir_por_categoria():
+    """Ventas, ingreso y número de productos de cada categoría con ventas"""
+    return _combinar_por_categoria(
+        agregar_ventas({}, ('producto__categoria_id',)),
+        _productos_por_categoria(),
+        Categoria.objects.all(),
+    )
+
+
+async def aresumir_por_categoria():
+    """Versión async de resumir_por_categoria"""
+    return _combinar_por_categoria(
+        [fila async for fila in agregar_ventas({}, ('producto__categoria_id',)).aiterator()],
+        [fila async for fila in _productos_por_categoria().aiterator()],
+        [cat async for cat in Categoria.objects.aiterator()],
+    )
+
+
+def _combinar_por_categoria(filas, productos_por_categoria, categorias):
+    totales = {fila['producto__categoria_id']: fila for fila in filas}
+    productos_por_categoria = {fila['categoria_id']: fila['n'] for fila in productos_por_categoria}
+    
+    reporte_datos = []
+    for cat in categorias:
+        fila = totales.get(cat.id)
+        if fila and fila['num_ventas']:
+            reporte_datos.append({
+                'categoria': cat,
+                'total_ventas': fila['num_ventas'],
+                'ingreso': fila['ingreso'],
+                'productos': productos_por_categoria.get(cat.id, 0),
+            })
+    return reporte_datos
+
+
+def resumir_por_producto():
+    """Ventas, unidades e ingreso de cada producto con ventas"""
+    return _combinar_por_producto(
+        agregar_ventas({}, ('producto_id',)),
+        Producto.objects.select_related('categoria'),
+    )
+
+
+async def aresumir_por_producto():
+    """Versión async de resumir_por_producto"""
+    return _combinar_por_producto(
+        [fila async for fila in agregar_ventas({}, ('producto_id',)).aiterator()],
+        [prod async for prod in Producto.objects.select_related('categoria').aiterator()],
+    )
+
+
+def _combinar_por_producto(filas, productos):
+    totales = {fila['producto_id']: fila for fila in filas}
+    
+    reporte_datos = []
+    for prod in productos:
+        fila = totales.get(prod.id)
+        if fila and fila['num_ventas']:
+            reporte_datos.append({
+                'producto': prod,
+                'total_ventas': fila['num_ventas'],
+                'ingreso': fila['ingreso'],
+                'cantidad_vendida': fila['unidades'],
+                'ingreso_promedio': fila['ingreso'] / fila['num_ventas'],
+            })
+    return reporte_datos
+
+
+def _filas_existentes(claves):
+    """{(fecha, producto_id, vendedor_id): pk} de las claves que ya tienen fila en el resumen"""
+    vendedores = {vendedor_id for _, _, vendedor_id in claves}
+    filtro_vendedor = Q(vendedor_id__in=vendedores - {None})
+    if None in vendedores:
+        filtro_vendedor |= Q(vendedor__isnull=True)
+    # Un filtro por columnas (no por clave) puede traer filas de más: se descartan aquí
+    filas = VentaDiaria.objects.filter(
+        filtro_vendedor,
+        fecha__in={fecha for fecha, _, _ in claves},
+        producto_id__in={producto_id for _, producto_id, _ in claves},
+    ).values_list('fecha', 'producto_id', 'vendedor_id', 'pk')
+    return {
+        (fecha, producto_id, vendedor_id): pk
+        for fecha, producto_id, vendedor_id, pk in filas
+        if (fecha, producto_id, vendedor_id) in claves
+    }
+
+
+def _fila_nueva(clave, delta):
+    fecha, producto_id, vendedor_id = clave
+    num_ventas, unidades, ingreso = delta
+    return VentaDiaria(
+        fecha=fecha,
+        producto_id=producto_id,
+        vendedor_id=vendedor_id,
+        num_ventas=num_ventas,
+        unidades=unidades,
+        ingreso=ingreso,
+    )
+
+
+def acumular_ventas(ventas):
+    """
+    Suma al resumen un lote de ventas recién creadas.
+    Cada venta debe tener su `total` calculado. Cuesta un número fijo de
+    consultas sea cual sea el número de claves: un SELECT de las filas
+    existentes, un INSERT de las que faltan y un UPDATE de las demás.
+    """
+    deltas = {}
+    for venta in ventas:
+        clave = (venta.fecha, venta.producto_id, venta.vendedor_id)
+        delta = deltas.setdefault(clave, [0, 0, Decimal('0')])
+        delta[0] += 1
+        delta[1] += venta.cantidad
+        delta[2] += venta.total
+    if not deltas:
+        return
+
+    with transaction.atomic(savepoint=False):
+        while True:
+            existentes = _filas_existentes(deltas)
+            nuevas = [clave for clave in deltas if clave not in existentes]
+            if not nuevas:
+                break
+            try:
+                with transaction.atomic():
+                    VentaDiaria.objects.bulk_create([_fila_nueva(clave, deltas[clave]) for clave in nuevas])
+                break
+            except IntegrityError:
+                # Otra transacción creó alguna de las filas entre la consulta y
+                # el insert: se vuelven a leer y esas se suman con el UPDATE
+                continue
+
+        if existentes:
+            def por_fila(indice, campo):
+                return Case(
+                    *[When(pk=pk, then=Value(deltas[clave][indice])) for clave, pk in existentes.items()],
+                    output_field=campo,
+                )
+            VentaDiaria.objects.filter(pk__in=existentes.values()).update(
+                num_ventas=F('num_ventas') + por_fila(0, IntegerField()),
+                unidades=F('unidades') + por_fila(1, IntegerField()),
+                ingreso=F('ingreso') + por_fila(2, DecimalField(max_digits=14, decimal_places=2)),
+            )
+        invalidar_reportes()
+
+
+def recalcular_clave(fecha, producto_id, vendedor_id):
+    """Recalcula desde Venta la fila del resumen de una clave concreta"""
+    with transaction.atomic():
+        invalidar_reportes()
+        VentaDiaria.objects.filter(
+            fecha=fecha, producto_id=producto_id, vendedor_id=vendedor_id
+        ).delete()
+        totales = Venta.objects.filter(
+            fecha=fecha, producto_id=producto_id, vendedor_id=vendedor_id
+        ).order_by().aggregate(
+            num_ventas=Count('id'),
+            unidades=Sum('cantidad'),
+            ingreso=INGRESO_VENTA,
+        )
+        if totales['num_ventas']:
+            VentaDiaria.objects.create(
+                fecha=fecha,
+                producto_id=producto_id,
+                vendedor_id=vendedor_id,
+                **totales,
+            )
+
+
+def reconstruir_resumen(desde=None, hasta=None):
+    """
+    Regenera el resumen desde Venta, completo o para un rango de fechas.
+    Devuelve el número de filas creadas.
+    """
+    criterios = {}
+    if desde:
+        criterios['fecha__gte'] = desde
+    if hasta:
+        criterios['fecha__lte'] = hasta
+    
+    filas = Venta.objects.filter(**criterios).order_by().values(
+        'fecha', 'producto_id', 'vendedor_id'
+    ).annotate(
+        num_ventas=Count('id'),
+        unidades=Sum('cantidad'),
+        ingreso=INGRESO_VENTA,
+    )
+    
+    creadas = 0
+    with transaction.atomic():
+        invalidar_reportes()
+        VentaDiaria.objects.filter(**criterios).delete()
+        lote = []
+        for fila in filas.iterator(chunk_size=TAMANO_LOTE):
+            lote.append(VentaDiaria(**fila))
+            if len(lote) >= TAMANO_LOTE:
+                VentaDiaria.objects.bulk_create(lote)
+                creadas += len(lote)
+                lote = []
+        if lote:
+            VentaDiaria.objects.bulk_create(lote)
+            creadas += len(lote)
+    return creadas
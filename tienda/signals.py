@@ -0,0 +1,126 @@
+"""
+Señales que mantienen el resumen diario de ventas al crear, editar o borrar
+ventas individualmente (los altas masivas llaman a resumen.acumular_ventas)
+e invalidan la caché de reportes cuando cambian productos, categorías o el
+nombre de un vendedor.
+También guardan en CarritoItem el carrito en caché o sesión al cerrar sesión
+e invalidan los permisos cacheados (tienda.permisos) al cambiar permisos,
+grupos o roles.
+"""
+from django.contrib.auth.models import Group, Permission, User
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import resumen
+from .carrito import obtener_carrito
+from .cache_reportes import invalidar_reportes
+from .models import Categoria, Producto, Rol, Venta
+from .permisos import invalidar_permisos
+
+
+def _clave(venta):
+    return (venta.fecha, venta.producto_id, venta.vendedor_id)
+
+
+@receiver(pre_save, sender=Venta)
+def guardar_clave_anterior(sender, instance, raw=False, **kwargs):
+    """Recuerda la clave del resumen antes de editar una venta existente"""
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    anterior = Venta.objects.filter(pk=instance.pk).values_list(
+        'fecha', 'producto_id', 'vendedor_id'
+    ).first()
+    instance._clave_resumen_anterior = anterior
+
+
+@receiver(post_save, sender=Venta)
+def actualizar_resumen(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        resumen.acumular_ventas([instance])
+        return
+    claves = {_clave(instance)}
+    anterior = getattr(instance, '_clave_resumen_anterior', None)
+    if anterior:
+        claves.add(tuple(anterior))
+    for clave in claves:
+        resumen.recalcular_clave(*clave)
+
+
+@receiver(post_delete, sender=Venta)
+def descontar_resumen(sender, instance, **kwargs):
+    resumen.recalcular_clave(*_clave(instance))
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_por_catalogo(sender, raw=False, **kwargs):
+    """Precios, nombres y categorías aparecen en los reportes"""
+    if not raw:
+        invalidar_reportes()
+
+
+@receiver(pre_save, sender=User)
+def guardar_nombre_anterior(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Recuerda el nombre antes de guardar: los reportes muestran el del vendedor"""
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    instance._nombre_anterior = User.objects.filter(pk=instance.pk).values_list(
+        'username', flat=True
+    ).first()
+
+
+@receiver(post_save, sender=User)
+def invalidar_por_vendedor(sender, instance, created, raw=False, **kwargs):
+    anterior = getattr(instance, '_nombre_anterior', None)
+    if not raw and not created and anterior is not None and anterior != instance.username:
+        invalidar_reportes()
+    instance._nombre_anterior = None
+
+
+@receiver(user_logged_out)
+def guardar_carrito(sender, request, user, **kwargs):
+    """La sesión se borra al salir: antes se vuelca el carrito a la base de datos"""
+    if request is not None and user is not None:
+        obtener_carrito(request).persistir()
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+@receiver(m2m_changed, sender=Rol.permisos.through)
+@receiver(m2m_changed, sender=Rol.usuarios.through)
+def invalidar_permisos_m2m(sender, instance, action, model, pk_set, **kwargs):
+    """Solo los usuarios afectados cuando se conocen; si no, todos"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if isinstance(instance, User):
+        invalidar_permisos([instance.pk])
+    elif model is User and pk_set:
+        invalidar_permisos(pk_set)
+    else:
+        invalidar_permisos()
+
+
+@receiver(post_save, sender=User)
+def invalidar_permisos_usuario(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """is_superuser cambia el conjunto de permisos resuelto"""
+    # El login solo guarda last_login: no cambia permisos
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    if not raw and not created:
+        invalidar_permisos([instance.pk])
+
+
+@receiver(post_delete, sender=Rol)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def invalidar_permisos_borrado(sender, **kwargs):
+    """Al borrar se eliminan filas M2M sin enviar m2m_changed"""
+    invalidar_permisos()
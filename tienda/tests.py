@@ -1,3 +1,768 @@
-from django.test import TestCase
+import io
+import json
+import logging
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import Group, Permission, User
+from django.contrib.sessions.backends.cache import SessionStore
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import metricas
+from .busqueda import buscar_productos
+from .cache_reportes import aobtener_reporte
+from .carrito import CarritoBD
+from .compras import CONSULTAS_COMPRA, procesar_carrito
+from .consultas import PresupuestoConsultasMixin
+from .exportaciones import encolar_exportacion, procesar_exportacion, reclamar_siguiente, version_datos
+from .fragmentos import _renderizar as _renderizar_tarjeta
+from .generador import generar_datos
+from .models import CarritoItem, Categoria, ExportacionReporte, Producto, ReservaStock, Rol, Venta, VentaDiaria
+from .paginacion import paginar_ventas
+from .replica import CLAVE_SESION as CLAVE_SESION_REPLICA
+from .replica import ReplicaMiddleware, RouterReplica, lecturas_replica, leer_de_replica
+from .reports import _tablas_detalle
+
+
+_nivel_log_tiempos = None
+
+
+def setUpModule():
+    # La línea de tiempos de cada petición (tienda.tiempos) taparía la salida de los tests
+    global _nivel_log_tiempos
+    log_tiempos = logging.getLogger('tienda.tiempos')
+    _nivel_log_tiempos = log_tiempos.level
+    log_tiempos.setLevel(logging.WARNING)
+
+
+def tearDownModule():
+    logging.getLogger('tienda.tiempos').setLevel(_nivel_log_tiempos)
+
+
+def crear_catalogo(num_productos, stock=100):
+    categoria = Categoria.objects.create(nombre='Electrónica')
+    return [
+        Producto.objects.create(nombre=f'Producto {i + 1}', categoria=categoria, precio=Decimal('10.00') + i, stock=stock)
+        for i in range(num_productos)
+    ]
+
+
+class CompraTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('comprador', password='x')
+        cls.productos = crear_catalogo(10)
+
+    def _comprar(self, lineas):
+        for producto in self.productos[:lineas]:
+            CarritoItem.objects.create(usuario=self.usuario, producto=producto, cantidad=2)
+        with CaptureQueriesContext(connection) as contexto:
+            ventas, rechazadas = procesar_carrito(self.usuario)
+        self.assertEqual((len(ventas), rechazadas), (lineas, []))
+        return len(contexto.captured_queries)
+
+    def test_consultas_no_dependen_de_las_lineas(self):
+        # La primera compra solo crea filas del resumen; las otras dos crean y actualizan
+        consultas = [self._comprar(lineas) for lineas in (1, 3, 10)]
+        self.assertEqual(consultas[1], consultas[2], f'consultas por compra de 1, 3 y 10 líneas: {consultas}')
+        self.assertLessEqual(max(consultas), CONSULTAS_COMPRA)
+
+    def test_resumen_suma_sobre_filas_existentes(self):
+        self._comprar(3)
+        self._comprar(10)
+        self.assertEqual(VentaDiaria.objects.count(), 10)
+        fila = VentaDiaria.objects.get(producto=self.productos[0])
+        self.assertEqual((fila.num_ventas, fila.unidades, fila.ingreso), (2, 4, Decimal('40.00')))
+        self.assertEqual(Venta.objects.count(), 13)
+
+
+
+class CompraConcurrenteTests(TransactionTestCase):
+    """
+    Compras simultáneas desde varios hilos (cada uno con su conexión) del mismo
+    producto. Con SQLite requiere el perfil de rendimiento (transacciones
+    IMMEDIATE y espera por bloqueos); con SQLITE_PERFIL=basico las compras
+    fallan con "database is locked". La base de tests en memoria no espera
+    por los bloqueos: con SQLite se ejecuta solo con SQLITE_TESTS_ARCHIVO=1.
+    """
+
+    COMPRADORES = 10
+    STOCK = 4
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('requiere la base de tests en archivo (SQLITE_TESTS_ARCHIVO=1)')
+
+    def test_no_se_vende_mas_stock_del_que_hay(self):
+        producto = crear_catalogo(1, stock=self.STOCK)[0]
+        usuarios = [User.objects.create_user(f'comprador_{i}') for i in range(self.COMPRADORES)]
+        for usuario in usuarios:
+            CarritoItem.objects.create(usuario=usuario, producto=producto, cantidad=1)
+
+        resultados = []
+        errores = []
+        salida = threading.Barrier(self.COMPRADORES)
+
+        def comprar(usuario):
+            try:
+                salida.wait()
+                ventas, rechazadas = procesar_carrito(usuario)
+                resultados.append((len(ventas), len(rechazadas)))
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=comprar, args=(usuario,)) for usuario in usuarios]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        vendidas = sum(ventas for ventas, _ in resultados)
+        rechazadas = sum(rechazadas for _, rechazadas in resultados)
+        self.assertEqual((vendidas, rechazadas), (self.STOCK, self.COMPRADORES - self.STOCK))
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 0)
+        self.assertEqual(Venta.objects.count(), self.STOCK)
+        self.assertEqual(VentaDiaria.objects.aggregate(unidades=Sum('unidades'))['unidades'], self.STOCK)
+
+
+class ExportacionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@tienda.local', 'x')
+        for producto in crear_catalogo(3):
+            Venta.objects.create(producto=producto, cantidad=1, vendedor=cls.admin)
+
+    def test_wsgi_exporta_con_iterador_sincrono(self):
+        # Un iterador async bajo WSGI se consumiría entero en memoria
+        self.client.force_login(self.admin)
+        for url in ('tienda:ventas', 'tienda:reporte_ventas'):
+            respuesta = self.client.get(reverse(url), {'formato': 'csv'})
+            self.assertFalse(respuesta.is_async)
+            self.assertEqual(len(b''.join(respuesta.streaming_content).splitlines()), 4)
+
+    async def test_asgi_exporta_con_iterador_async(self):
+        cliente = AsyncClient()
+        await cliente.aforce_login(self.admin)
+        respuesta = await cliente.get(reverse('tienda:ventas'), {'formato': 'jsonl'})
+        self.assertTrue(respuesta.is_async)
+        self.assertEqual(len([linea async for linea in respuesta.streaming_content]), 3)
+
+
+class ReportePdfTests(TestCase):
+    def test_detalle_limitado(self):
+        producto = crear_catalogo(1)[0]
+        for _ in range(7):
+            Venta.objects.create(producto=producto, cantidad=1)
+        filas = [len(tabla._cellvalues) - 1 for tabla in _tablas_detalle(Venta.objects.all(), limite=5)]
+        self.assertEqual(sum(filas), 5)
+
+
+class PresupuestoConsultasTests(PresupuestoConsultasMixin, TestCase):
+    """Una vista que supere su presupuesto de PRESUPUESTO_CONSULTAS o repita una consulta N+1 falla"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@tienda.local', 'x')
+        cls.productos = crear_catalogo(12)
+        for producto in cls.productos:
+            for cantidad in (1, 2):
+                Venta.objects.create(producto=producto, cantidad=cantidad, vendedor=cls.admin)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _llenar_carrito(self, lineas=5):
+        for producto in self.productos[:lineas]:
+            self.client.post(reverse('tienda:agregar_carrito'), {'producto_id': producto.pk, 'cantidad': 1})
+
+    def test_catalogo(self):
+        self.assertPresupuestoConsultas('tienda:productos')
+
+    def test_carrito(self):
+        self._llenar_carrito()
+        self.assertPresupuestoConsultas('tienda:carrito')
+
+    def test_compra(self):
+        self._llenar_carrito()
+        self.assertPresupuestoConsultas('tienda:procesar_compra', metodo='post')
+        self.assertEqual(Venta.objects.count(), 29)
+
+    def test_reportes(self):
+        for nombre_url in ('tienda:ventas', 'tienda:reporte_ventas', 'tienda:reporte_categorias',
+                           'tienda:reporte_productos'):
+            with self.subTest(nombre_url):
+                self.assertPresupuestoConsultas(nombre_url)
+
+
+class ExportacionSegundoPlanoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('gerente')
+        cls.producto = crear_catalogo(1)[0]
+        Venta.objects.create(producto=cls.producto, cantidad=1, vendedor=cls.usuario)
+
+    def test_error_al_calcular_la_version_marca_el_trabajo(self):
+        encolar_exportacion(self.usuario, 'csv', {})
+        trabajo = reclamar_siguiente()
+        with mock.patch('tienda.exportaciones.version_datos', side_effect=RuntimeError('sin conexión')):
+            trabajo = procesar_exportacion(trabajo)
+        self.assertEqual((trabajo.estado, trabajo.error), (ExportacionReporte.ERROR, 'sin conexión'))
+
+    def test_trabajo_abandonado_se_vuelve_a_tomar(self):
+        abandonado = encolar_exportacion(self.usuario, 'csv', {})
+        self.assertEqual(reclamar_siguiente(), abandonado)
+        # El worker murió a mitad hace una hora
+        ExportacionReporte.objects.filter(pk=abandonado.pk).update(
+            iniciado=timezone.now() - timedelta(hours=1),
+        )
+        self.assertNotEqual(encolar_exportacion(self.usuario, 'csv', {}), abandonado)
+        self.assertEqual(reclamar_siguiente(), abandonado)
+
+    def test_encolar_no_lee_las_ventas(self):
+        with CaptureQueriesContext(connection) as contexto:
+            encolar_exportacion(self.usuario, 'csv', {})
+        self.assertFalse([c['sql'] for c in contexto.captured_queries if 'tienda_venta' in c['sql']])
+
+    @override_settings(TIENDA_EXPORTACION_PDF_MAX_FILAS=100)
+    def test_pdf_limitado(self):
+        encolar_exportacion(self.usuario, 'pdf', {})
+        with mock.patch('tienda.exportaciones.escribir_pdf') as escribir:
+            procesar_exportacion(reclamar_siguiente())
+        self.assertEqual(escribir.call_args.kwargs['limite'], 100)
+
+    def test_version_cambia_con_vendedor_y_catalogo(self):
+        # La versión de la caché de reportes sube al confirmar la transacción
+        otro = User.objects.create_user('vendedor')
+        versiones = [version_datos()]
+        venta = Venta.objects.get()
+        venta.vendedor = otro
+        with self.captureOnCommitCallbacks(execute=True):
+            venta.save()
+        versiones.append(version_datos())
+        otro.username = 'vendedora'
+        with self.captureOnCommitCallbacks(execute=True):
+            otro.save()
+        versiones.append(version_datos())
+        self.producto.nombre = 'Producto renombrado'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.save()
+        versiones.append(version_datos())
+        self.assertEqual(len(set(versiones)), 4)
+
+
+class VentaAdminTests(TestCase):
+    def test_alta_calcula_precio_y_total(self):
+        admin = User.objects.create_superuser('admin', 'admin@tienda.local', 'x')
+        producto = crear_catalogo(1)[0]
+        self.client.force_login(admin)
+        respuesta = self.client.post(reverse('admin:tienda_venta_add'), {
+            'producto': producto.pk, 'cantidad': 3, 'vendedor': admin.pk,
+        })
+        self.assertEqual(respuesta.status_code, 302)
+        venta = Venta.objects.get()
+        self.assertEqual((venta.precio_unitario, venta.total), (Decimal('10.00'), Decimal('30.00')))
+
+
+class PermisosCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('vendedor', password='x')
+        cls.rol = Rol.objects.create(tipo='vendedor', descripcion='Vendedores')
+        cls.ver_ventas = Permission.objects.get(codename='view_venta')
+        cls.cambiar_productos = Permission.objects.get(codename='change_producto')
+
+    def setUp(self):
+        cache.clear()
+
+    def _permisos(self):
+        # Un objeto nuevo en cada llamada: el usuario guarda los permisos en _perm_cache
+        return User.objects.get(pk=self.usuario.pk).get_all_permissions()
+
+    def test_permisos_de_rol(self):
+        self.assertEqual(self._permisos(), set())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rol.permisos.add(self.ver_ventas)
+            self.rol.usuarios.add(self.usuario)
+        self.assertEqual(self._permisos(), {'tienda.view_venta'})
+
+    def test_segunda_resolucion_usa_la_cache(self):
+        self._permisos()
+        usuario = User.objects.get(pk=self.usuario.pk)
+        with self.assertNumQueries(0):
+            usuario.get_all_permissions()
+
+    def test_cambios_de_rol_y_grupo_invalidan(self):
+        self.rol.usuarios.add(self.usuario)
+        self.assertEqual(self._permisos(), set())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rol.permisos.add(self.ver_ventas)
+        self.assertEqual(self._permisos(), {'tienda.view_venta'})
+
+        grupo = Group.objects.create(name='Catálogo')
+        grupo.permissions.add(self.cambiar_productos)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.groups.add(grupo)
+        self.assertEqual(self._permisos(), {'tienda.view_venta', 'tienda.change_producto'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            grupo.permissions.clear()
+        self.assertEqual(self._permisos(), {'tienda.view_venta'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rol.usuarios.remove(self.usuario)
+        self.assertEqual(self._permisos(), set())
+
+    def test_login_no_invalida_permisos(self):
+        usuario = self.usuario
+        with mock.patch('tienda.signals.invalidar_permisos') as invalidar:
+            self.client.login(username='vendedor', password='x')
+            invalidar.assert_not_called()
+            usuario.is_superuser = True
+            usuario.save()
+            invalidar.assert_called_once_with([usuario.pk])
+
+
+class TarjetasCatalogoTests(TestCase):
+    def test_tarjeta_no_muestra_stock_exacto(self):
+        # Con reservas de otros usuarios el stock del producto no es el disponible
+        producto = crear_catalogo(1, stock=37)[0]
+        self.client.force_login(User.objects.create_user('cliente'))
+        respuesta = self.client.get(reverse('tienda:productos'))
+        self.assertContains(respuesta, producto.nombre)
+        self.assertContains(respuesta, 'En stock')
+        self.assertNotContains(respuesta, 'Stock disponible')
+        # Ni como texto ni como atributo (max) en la parte cacheada de la tarjeta
+        antes, despues = _renderizar_tarjeta(producto)
+        self.assertNotIn('37', antes + despues)
+
+
+@override_settings(DEBUG=False)
+class ServerTimingTests(TestCase):
+    def test_cabecera_solo_para_el_personal(self):
+        url = reverse('tienda:productos')
+        self.client.force_login(User.objects.create_user('cliente'))
+        self.assertNotIn('Server-Timing', self.client.get(url))
+        self.client.force_login(User.objects.create_user('encargado', is_staff=True))
+        self.assertIn('db;dur=', self.client.get(url)['Server-Timing'])
+
+    async def test_cabecera_en_asgi(self):
+        cliente = AsyncClient()
+        await cliente.aforce_login(await User.objects.acreate(username='encargado', is_staff=True))
+        respuesta = await cliente.get(reverse('tienda:productos'))
+        self.assertIn('total;dur=', respuesta['Server-Timing'])
+
+
+
+@skipUnless(metricas.PROMETHEUS_DISPONIBLE, 'prometheus_client no está instalado')
+class MetricasTests(TestCase):
+    def setUp(self):
+        self.url = reverse('metricas')
+
+    def test_sin_token_solo_el_personal(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_login(User.objects.create_user('cliente'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_login(User.objects.create_user('encargado', is_staff=True))
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, 'tienda_compras_total')
+
+    @override_settings(TIENDA_METRICAS_TOKEN='secreto')
+    def test_token_bearer(self):
+        self.assertEqual(self.client.get(self.url, headers={'authorization': 'Bearer secreto'}).status_code, 200)
+        self.assertEqual(self.client.get(self.url, headers={'authorization': 'Bearer otro'}).status_code, 403)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    @override_settings(DEBUG=True)
+    def test_abierto_en_debug_sin_token(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+class ReservasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('cliente')
+        cls.producto = crear_catalogo(1, stock=5)[0]
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def _agregar(self, cantidad):
+        with CaptureQueriesContext(connection) as contexto:
+            self.client.post(reverse('tienda:agregar_carrito'), {'producto_id': self.producto.pk, 'cantidad': cantidad})
+        return [consulta['sql'] for consulta in contexto.captured_queries]
+
+    def test_agregar_reserva(self):
+        self._agregar(7)
+        self.assertEqual(CarritoItem.objects.get().cantidad, 5)
+        self.assertEqual(ReservaStock.objects.get().cantidad, 5)
+
+    @override_settings(TIENDA_RESERVA_MINUTOS=0)
+    def test_sin_reservas_solo_lee_el_stock(self):
+        consultas = self._agregar(2)
+        self.assertFalse([sql for sql in consultas if 'tienda_reservastock' in sql])
+        self.assertEqual(CarritoItem.objects.get().cantidad, 2)
+
+    def test_fallo_al_guardar_la_linea_deshace_la_reserva(self):
+        with mock.patch.object(CarritoItem.objects, 'update_or_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                CarritoBD(self.usuario.pk).agregar(self.producto, 1)
+        self.assertFalse(ReservaStock.objects.exists())
+
+
+class CarritoMemoriaTests(TestCase):
+    """Carritos en caché y en sesión: añadir y cambiar líneas no escribe en la base de datos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('cliente')
+        cls.productos = crear_catalogo(2, stock=5)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def _escrituras(self, funcion):
+        with CaptureQueriesContext(connection) as contexto:
+            funcion()
+        return [
+            consulta['sql'] for consulta in contexto.captured_queries
+            if not consulta['sql'].startswith('SELECT') and 'tienda_' in consulta['sql']
+        ]
+
+    def _probar_modo(self, modo):
+        with self.settings(TIENDA_CARRITO=modo):
+            agregar = reverse('tienda:agregar_carrito')
+            self.assertEqual(self._escrituras(lambda: self.client.post(
+                agregar, {'producto_id': self.productos[0].pk, 'cantidad': 7},
+            )), [])
+            self.client.post(agregar, {'producto_id': self.productos[1].pk, 'cantidad': 1})
+            respuestas = []
+            self.assertEqual(self._escrituras(lambda: respuestas.append(self.client.post(
+                reverse('tienda:api_actualizar_carrito'),
+                json.dumps({'cantidades': {self.productos[1].pk: 3}}),
+                content_type='application/json',
+            ))), [])
+            self.assertEqual(respuestas[0].json()['unidades'], 8)
+            self.assertFalse(CarritoItem.objects.exists())
+            self.assertFalse(ReservaStock.objects.exists())
+
+    def _guardar_carritos(self):
+        # close_old_connections cerraría la conexión de la transacción del test
+        with mock.patch('tienda.management.commands.guardar_carritos.close_old_connections'):
+            call_command('guardar_carritos', stdout=io.StringIO())
+
+    def test_cache(self):
+        self._probar_modo('cache')
+        self._guardar_carritos()
+        lineas = dict(CarritoItem.objects.values_list('producto_id', 'cantidad'))
+        self.assertEqual(lineas, {self.productos[0].pk: 5, self.productos[1].pk: 3})
+        reservas = dict(ReservaStock.objects.values_list('producto_id', 'cantidad'))
+        self.assertEqual(reservas, lineas)
+        # Una línea eliminada libera su reserva en el siguiente volcado
+        with self.settings(TIENDA_CARRITO='cache'):
+            self.client.post(reverse('tienda:eliminar_carrito', args=[self.productos[0].pk]))
+        self._guardar_carritos()
+        self.assertEqual(list(ReservaStock.objects.values_list('producto_id', flat=True)), [self.productos[1].pk])
+
+    def test_sesion(self):
+        self._probar_modo('sesion')
+        with self.settings(TIENDA_CARRITO='sesion'):
+            self.client.post(reverse('tienda:procesar_compra'))
+        self.assertEqual(Venta.objects.aggregate(unidades=Sum('cantidad'))['unidades'], 8)
+        self.assertFalse(ReservaStock.objects.exists())
+
+
+
+class ApiCarritoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('cliente')
+        cls.productos = crear_catalogo(2, stock=5)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+        for producto in self.productos:
+            self.client.post(reverse('tienda:api_agregar_carrito'), {'producto_id': producto.pk, 'cantidad': 2})
+
+    def _actualizar(self, cantidades):
+        return self.client.post(
+            reverse('tienda:api_actualizar_carrito'),
+            json.dumps({'cantidades': cantidades}),
+            content_type='application/json',
+        )
+
+    def test_agregar(self):
+        respuesta = self.client.post(
+            reverse('tienda:api_agregar_carrito'), {'producto_id': self.productos[0].pk, 'cantidad': 1},
+        )
+        datos = respuesta.json()
+        self.assertEqual(datos['linea']['cantidad'], 3)
+        self.assertEqual((datos['num_lineas'], datos['unidades']), (2, 5))
+        respuesta = self.client.post(reverse('tienda:api_agregar_carrito'), {'producto_id': 0})
+        self.assertEqual(respuesta.status_code, 404)
+        respuesta = self.client.post(reverse('tienda:api_agregar_carrito'), {'producto_id': 'x'})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_actualizar_varios_informa_de_las_rechazadas(self):
+        primero, segundo = self.productos
+        respuesta = self._actualizar({primero.pk: 9, segundo.pk: 4})
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertEqual(datos['rechazadas'], [
+            {'producto_id': primero.pk, 'producto': primero.nombre, 'cantidad': 9, 'disponible': 5},
+        ])
+        cantidades = {linea['producto_id']: linea['cantidad'] for linea in datos['lineas']}
+        self.assertEqual(cantidades, {primero.pk: 2, segundo.pk: 4})
+        self.assertEqual(self._actualizar({primero.pk: 3}).json()['rechazadas'], [])
+
+    def test_actualizar_una_linea(self):
+        url = reverse('tienda:api_actualizar_cantidad', args=[self.productos[0].pk])
+        datos = self.client.post(url, {'cantidad': 6}).json()
+        self.assertEqual(datos['linea']['cantidad'], 2)
+        self.assertEqual(datos['rechazadas'][0]['disponible'], 5)
+        datos = self.client.post(url, {'cantidad': 0}).json()
+        self.assertIsNone(datos['linea'])
+        self.assertEqual(datos['num_lineas'], 1)
+        self.assertEqual(self.client.post(url, {'cantidad': 1}).status_code, 404)
+        self.assertEqual(self.client.post(url, {'cantidad': 'x'}).status_code, 400)
+
+    def test_cuerpo_invalido(self):
+        respuesta = self.client.post(
+            reverse('tienda:api_actualizar_carrito'), '{"lineas": []}', content_type='application/json',
+        )
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(self._actualizar({'x': 1}).status_code, 400)
+
+class CacheReportesAsyncTests(TestCase):
+    async def test_no_usa_la_cache_sincrona(self):
+        # Con Redis, cache.get/incr en la corrutina bloquearían el bucle de eventos
+        falsa = mock.Mock()
+        for metodo in ('get', 'add', 'incr', 'set', 'get_many', 'set_many'):
+            getattr(falsa, metodo).side_effect = AssertionError(f'cache.{metodo} síncrono')
+        falsa.aget = mock.AsyncMock(return_value=None)
+        falsa.aadd = mock.AsyncMock(return_value=True)
+        falsa.aincr = mock.AsyncMock(return_value=1)
+        falsa.aset = mock.AsyncMock()
+
+        async def calcular():
+            return {'total': 3}
+
+        with mock.patch('tienda.cache_reportes.cache', falsa):
+            self.assertEqual(await aobtener_reporte('prueba', {}, calcular), {'total': 3})
+        falsa.aset.assert_awaited_once()
+
+
+@mock.patch('tienda.replica.hay_replica', return_value=True)
+class ReplicaTests(SimpleTestCase):
+    """
+    Enrutado de la réplica sin una segunda base de datos: el router solo
+    decide el alias (fuera de transacción, por eso SimpleTestCase). La suite
+    se ejecuta sin REPORTS_DATABASE_URL: en un TestCase la réplica espejo es
+    otra conexión y no vería los datos sin confirmar del test.
+    """
+
+    def setUp(self):
+        self.router = RouterReplica()
+        self.fabrica = RequestFactory()
+
+    def _peticion(self, metodo='get', sesion=None):
+        request = getattr(self.fabrica, metodo)('/')
+        request.session = SessionStore()
+        request.session.update(sesion or {})
+        return request
+
+    def test_lecturas_de_reportes_van_a_la_replica(self, _):
+        @leer_de_replica
+        def vista(request):
+            return HttpResponse(f'{self.router.db_for_read(Venta)} {self.router.db_for_read(CarritoItem)}')
+
+        self.assertEqual(vista(self._peticion()).content, b'reportes None')
+        # Fuera de la vista, y en un POST, todo en la primaria
+        self.assertIsNone(self.router.db_for_read(Venta))
+        self.assertEqual(vista(self._peticion('post')).content, b'None None')
+
+    def test_escrituras_van_a_la_primaria(self, _):
+        with lecturas_replica():
+            self.assertEqual(self.router.db_for_write(Venta), 'default')
+
+    def test_la_sesion_lee_de_la_primaria_tras_escribir(self, _):
+        def comprar(request):
+            self.router.db_for_write(Venta)
+            return HttpResponse()
+
+        def leer(request):
+            with lecturas_replica():
+                return HttpResponse(str(self.router.db_for_read(Venta)))
+
+        request = self._peticion('post')
+        ReplicaMiddleware(comprar)(request)
+        sesion = dict(request.session)
+        self.assertIn(CLAVE_SESION_REPLICA, sesion)
+        self.assertEqual(ReplicaMiddleware(leer)(self._peticion(sesion=sesion)).content, b'None')
+        with self.settings(TIENDA_REPLICA_RETRASO_SEGUNDOS=0):
+            self.assertEqual(ReplicaMiddleware(leer)(self._peticion(sesion=sesion)).content, b'reportes')
+
+    def test_sin_replica_todo_va_a_la_primaria(self, hay_replica):
+        hay_replica.return_value = False
+        with lecturas_replica():
+            self.assertIsNone(self.router.db_for_read(Venta))
+        with self.assertRaises(MiddlewareNotUsed):
+            ReplicaMiddleware(lambda request: HttpResponse())
+
+
+class BusquedaTests(TestCase):
+    """Índice FTS5 de SQLite mantenido por triggers (migración 0006)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.bebidas = Categoria.objects.create(nombre='Bebidas')
+        cls.cafe = Producto.objects.create(nombre='Café Molido', categoria=cls.bebidas, precio=5, stock=1)
+        Producto.objects.create(nombre='Cafetera Italiana', categoria=cls.bebidas, precio=30, stock=1)
+        Producto.objects.create(nombre='Lámpara de Mesa', categoria=Categoria.objects.create(nombre='Hogar'),
+                                precio=20, stock=1)
+
+    def _buscar(self, q):
+        return list(buscar_productos(Producto.objects.all(), q).values_list('nombre', flat=True))
+
+    def test_ignora_acentos_y_mayusculas(self):
+        for q in ('cafe molido', 'CAFÉ MOLIDO', 'Cafe Molído'):
+            with self.subTest(q):
+                self.assertEqual(self._buscar(q), ['Café Molido'])
+
+    def test_prefijos_y_categoria(self):
+        self.assertEqual(self._buscar('lamp'), ['Lámpara de Mesa'])
+        self.assertEqual(sorted(self._buscar('caf')), ['Cafetera Italiana', 'Café Molido'])
+        self.assertEqual(len(self._buscar('bebid')), 2)
+
+    def test_sin_terminos_devuelve_todo(self):
+        self.assertEqual(len(self._buscar('  ¿? ')), 3)
+
+    def test_triggers_mantienen_el_indice(self):
+        Producto.objects.create(nombre='Té Verde', categoria=self.bebidas, precio=3, stock=1)
+        self.assertEqual(self._buscar('te verde'), ['Té Verde'])
+
+        self.cafe.nombre = 'Cacao en Polvo'
+        self.cafe.save()
+        self.assertEqual(self._buscar('molido'), [])
+        self.assertEqual(self._buscar('cacao'), ['Cacao en Polvo'])
+
+        self.bebidas.nombre = 'Desayuno'
+        self.bebidas.save()
+        self.assertEqual(len(self._buscar('desayuno')), 3)
+
+        self.cafe.delete()
+        self.assertEqual(self._buscar('cacao'), [])
+
+
+class CatalogoCondicionalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('cliente')
+        cls.productos = crear_catalogo(3)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+        self.url = reverse('tienda:productos')
+        self.primera = self.client.get(self.url)
+
+    def test_sin_cambios_responde_304(self):
+        self.assertEqual(self.primera.status_code, 200)
+        respuesta = self.client.get(self.url, headers={'if-none-match': self.primera['ETag']})
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta['ETag'], self.primera['ETag'])
+        respuesta = self.client.get(self.url, headers={'if-modified-since': self.primera['Last-Modified']})
+        self.assertEqual(respuesta.status_code, 304)
+
+    def test_cambio_de_producto_responde_200(self):
+        producto = self.productos[0]
+        producto.precio = Decimal('99.00')
+        producto.save()
+        respuesta = self.client.get(self.url, headers={'if-none-match': self.primera['ETag']})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], self.primera['ETag'])
+        self.assertContains(respuesta, '$99')
+
+    def test_otra_pagina_o_filtro_no_reutiliza_el_etag(self):
+        respuesta = self.client.get(self.url, {'q': 'producto'}, headers={'if-none-match': self.primera['ETag']})
+        self.assertEqual(respuesta.status_code, 200)
+
+
+class PaginacionKeysetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        producto = crear_catalogo(1)[0]
+        ventas = [Venta.objects.create(producto=producto, cantidad=1) for _ in range(8)]
+        # Tres fechas, con varias ventas el mismo día: el id desempata
+        hoy = timezone.localdate()
+        for venta, dias in zip(ventas, (0, 0, 0, 1, 1, 1, 1, 2)):
+            Venta.objects.filter(pk=venta.pk).update(fecha=hoy - timedelta(days=dias))
+        cls.orden = list(Venta.objects.order_by('-fecha', '-id').values_list('pk', flat=True))
+
+    def _pagina(self, query=''):
+        request = RequestFactory().get(f'/ventas/?por_pagina=3&{query}')
+        return paginar_ventas(request, Venta.objects.all())
+
+    def _ids(self, pagina):
+        return [venta.pk for venta in pagina]
+
+    def test_recorrer_hacia_delante_y_atras(self):
+        paginas = [self._pagina()]
+        while paginas[-1].tiene_siguiente:
+            paginas.append(self._pagina(paginas[-1].query_siguiente))
+        self.assertEqual([len(p) for p in paginas], [3, 3, 2])
+        self.assertEqual(sum((self._ids(p) for p in paginas), []), self.orden)
+        self.assertFalse(paginas[0].tiene_anterior)
+
+        # Volver desde la última reproduce las mismas páginas
+        atras = [paginas[-1]]
+        while atras[-1].tiene_anterior:
+            atras.append(self._pagina(atras[-1].query_anterior))
+        self.assertEqual([self._ids(p) for p in reversed(atras)], [self._ids(p) for p in paginas])
+        self.assertTrue(atras[-1].tiene_siguiente)
+
+    def test_cursor_invalido_da_la_primera_pagina(self):
+        for cursor in ('basura', '2024-13-01_5', '2024-01-01_x', ''):
+            with self.subTest(cursor):
+                pagina = self._pagina(f'cursor={cursor}&dir=next')
+                self.assertEqual(self._ids(pagina), self.orden[:3])
+                self.assertFalse(pagina.tiene_anterior)
+
+    def test_conserva_los_filtros(self):
+        request = RequestFactory().get('/ventas/?por_pagina=3&producto=1')
+        pagina = paginar_ventas(request, Venta.objects.all())
+        self.assertIn('producto=1', pagina.query_siguiente)
+
+
+class GeneradorTests(TestCase):
+    def _datos(self, semilla):
+        generar_datos(12, 300, semilla=semilla, dias=60)
+        productos = list(Producto.objects.order_by('pk').values_list('nombre', 'categoria__nombre', 'precio', 'stock'))
+        ventas = list(Venta.objects.order_by('pk').values_list(
+            'producto__nombre', 'vendedor__username', 'cantidad', 'precio_unitario', 'total', 'fecha',
+        ))
+        Venta.objects.all().delete()
+        Producto.objects.all().delete()
+        return productos, ventas
+
+    @mock.patch('tienda.generador.BLOQUE_VENTAS', 100)
+    def test_misma_semilla_mismos_datos(self):
+        primeros = self._datos(7)
+        self.assertEqual(len(primeros[1]), 300)
+        self.assertEqual(self._datos(7), primeros)
+        # Los nombres llevan la semilla: se comparan solo cantidades e importes
+        self.assertNotEqual([venta[2:5] for venta in self._datos(8)[1]], [venta[2:5] for venta in primeros[1]])
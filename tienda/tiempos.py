@@ -0,0 +1,148 @@
+"""
+Desglose del tiempo de cada petición por fases: base de datos, plantillas y PDF.
+
+ServerTimingMiddleware abre un registro por petición (una ContextVar, como
+tienda.consultas) y al terminar envía la cabecera Server-Timing, que las
+herramientas de desarrollo del navegador muestran junto a la petición, y una
+línea JSON en el logger 'tienda.tiempos'. Las fases se miden con
+`with medir('fase')`: el tiempo de base de datos lo da el registro de
+consultas, el de plantillas el backend DjangoTemplates de este módulo y el
+del PDF generar_pdf_reporte. Cuesta un par de llamadas a perf_counter por
+fase y por consulta, así que puede quedar activo en producción
+(TIENDA_SERVER_TIMING). La cabecera solo se envía en DEBUG o al personal de
+la tienda: a cualquier otro le diría cuánto tarda la base de datos en cada
+vista. La línea de log se escribe siempre.
+
+Las fases pueden solaparse: una consulta lanzada desde una plantilla cuenta
+en 'db' y en 'plantilla'.
+"""
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as backend_django
+
+from .consultas import registrar_consultas
+
+logger = logging.getLogger('tienda.tiempos')
+
+
+class Fases:
+    """Segundos acumulados por fase en la petición en curso"""
+
+    def __init__(self):
+        self.segundos = {}
+        self.activas = set()
+
+
+_fases = ContextVar('tienda_tiempos', default=None)
+
+
+@contextmanager
+def medir(fase):
+    """Suma la duración del bloque a `fase`; las mediciones anidadas de la misma fase no se cuentan dos veces"""
+    fases = _fases.get()
+    if fases is None or fase in fases.activas:
+        yield
+        return
+    fases.activas.add(fase)
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        fases.activas.discard(fase)
+        fases.segundos[fase] = fases.segundos.get(fase, 0.0) + time.perf_counter() - inicio
+
+
+class Template(backend_django.Template):
+    def render(self, context=None, request=None):
+        with medir('plantilla'):
+            return super().render(context, request)
+
+
+class DjangoTemplates(backend_django.DjangoTemplates):
+    """DjangoTemplates que mide el renderizado en la fase 'plantilla'"""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            backend_django.reraise(exc, self)
+
+
+def _ver_cabecera(usuario):
+    return settings.DEBUG or (usuario is not None and usuario.is_authenticated and usuario.is_staff)
+
+
+class ServerTimingMiddleware:
+    """Cabecera Server-Timing y línea de log con el desglose de cada petición"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'TIENDA_SERVER_TIMING', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        fases = Fases()
+        token = _fases.set(fases)
+        inicio = time.perf_counter()
+        try:
+            with registrar_consultas() as consultas:
+                respuesta = self.get_response(request)
+        finally:
+            _fases.reset(token)
+        total = time.perf_counter() - inicio
+        cabecera = _ver_cabecera(getattr(request, 'user', None))
+        return self._informar(request, respuesta, fases, consultas, total, cabecera)
+
+    async def __acall__(self, request):
+        fases = Fases()
+        token = _fases.set(fases)
+        inicio = time.perf_counter()
+        try:
+            with registrar_consultas() as consultas:
+                respuesta = await self.get_response(request)
+        finally:
+            _fases.reset(token)
+        total = time.perf_counter() - inicio
+        cabecera = _ver_cabecera(await request.auser() if hasattr(request, 'auser') else None)
+        return self._informar(request, respuesta, fases, consultas, total, cabecera)
+
+    def _informar(self, request, respuesta, fases, consultas, total, cabecera):
+        medidas = [('db', consultas.segundos, f'{consultas.total} consultas')]
+        medidas += [(fase, segundos, None) for fase, segundos in fases.segundos.items()]
+        medidas.append(('total', total, None))
+
+        if cabecera:
+            partes = []
+            for fase, segundos, descripcion in medidas:
+                parte = f'{fase};dur={segundos * 1000:.1f}'
+                if descripcion:
+                    parte += f';desc="{descripcion}"'
+                partes.append(parte)
+            respuesta['Server-Timing'] = ', '.join(partes)
+
+        linea = {
+            'metodo': request.method,
+            'ruta': request.path,
+            'estado': respuesta.status_code,
+            'consultas': consultas.total,
+        }
+        linea.update({f'{fase}_ms': round(segundos * 1000, 1) for fase, segundos, _ in medidas})
+        logger.info(json.dumps(linea))
+        return respuesta
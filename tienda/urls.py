@@ -15,10 +15,20 @@ urlpatterns = [
     path('carrito/eliminar/<int:item_id>/', views.eliminar_carrito, name='eliminar_carrito'),
     path('carrito/actualizar/<int:item_id>/', views.actualizar_cantidad, name='actualizar_cantidad'),
     path('carrito/procesar/', views.procesar_compra, name='procesar_compra'),
+    path('carrito/api/agregar/', views.api_agregar_carrito, name='api_agregar_carrito'),
+    path('carrito/api/actualizar/', views.api_actualizar_carrito, name='api_actualizar_carrito'),
+    path('carrito/api/actualizar/<int:item_id>/', views.api_actualizar_cantidad, name='api_actualizar_cantidad'),
+    path('carrito/api/eliminar/<int:item_id>/', views.api_eliminar_carrito, name='api_eliminar_carrito'),
     path('compra-exitosa/', views.compra_exitosa, name='compra_exitosa'),
     
     # Reportes
     path('reportes/ventas/', views.reporte_ventas, name='reporte_ventas'),
     path('reportes/categorias/', views.reporte_por_categoria, name='reporte_categorias'),
     path('reportes/productos/', views.reporte_por_producto, name='reporte_productos'),
+    path('reportes/cache/', views.estadisticas_cache, name='estadisticas_cache'),
+    
+    # Exportaciones en segundo plano
+    path('reportes/exportaciones/', views.encolar_reporte, name='encolar_reporte'),
+    path('reportes/exportaciones/<int:trabajo_id>/', views.estado_exportacion, name='estado_exportacion'),
+    path('reportes/exportaciones/<int:trabajo_id>/descargar/', views.descargar_exportacion, name='descargar_exportacion'),
 ]
@@ -4,27 +4,41 @@ from django.contrib.auth import logout, authenticate, login
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import Permission
-from django.db.models import Sum, F, DecimalField, Q
-from django.http import HttpResponse
+from django.db.models import Sum, F, DecimalField, Q, Count, Max
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, FileResponse, Http404
+from django.urls import reverse
 from django.views.decorators.http import require_http_methods
-from .models import Venta, Producto, Categoria, CarritoItem
+from django.views.decorators.cache import cache_control
+from django.core.paginator import Page, Paginator
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .models import Venta, Producto, Categoria, ExportacionReporte
+from .resumen import (
+    INGRESO_VENTA, criterios_reporte, aresumir_por_categoria, aresumir_por_producto, aresumir_ventas,
+)
+from .cache_reportes import aobtener_reporte, estadisticas as estadisticas_cache_reportes
+from .paginacion import apaginar_ventas
+from .exportar import FORMATOS as FORMATOS_EXPORTACION, exportar_ventas_para
+from .reports import generar_pdf_reporte
+from .exportaciones import encolar_exportacion
+from .busqueda import buscar_productos
+from .fragmentos import tarjetas_productos
+from .compras import procesar_carrito
+from .carrito import obtener_carrito, total_carrito
+from .reservas import disponible
+from .replica import leer_de_replica
+from . import metricas as metricas_prometheus
 from datetime import date, datetime, timedelta
+from decimal import Decimal
 from django.utils.dateparse import parse_date
+import hashlib
 import json
 from django.db.models import Q as Qfilter
 
-# Importar para PDF
-try:
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import letter, A4
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-    from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
-    REPORTLAB_AVAILABLE = True
-except ImportError:
-    REPORTLAB_AVAILABLE = False
-
 def check_permission(user, permission_codename):
     """
     Verifica si un usuario tiene un permiso específico
@@ -85,35 +99,117 @@ def home(request):
     return render(request, 'home.html', context)
 
 
-@login_required
-def catalogo(request):
-    """Listado público (para usuarios autenticados) de productos - catálogo"""
-    productos = Producto.objects.select_related('categoria').all()
-    categorias = Categoria.objects.all()
-
+def _productos_catalogo(request):
+    """Productos del catálogo con los filtros de la petición (categoría y búsqueda)"""
+    productos = Producto.objects.select_related('categoria').order_by('id')
+    
     # Filtros simples: categoría y búsqueda por nombre
     categoria_id = request.GET.get('categoria')
     q = request.GET.get('q', '').strip()
-
+    
     if categoria_id:
         productos = productos.filter(categoria__id=categoria_id)
-
+    
     if q:
-        productos = productos.filter(Qfilter(nombre__icontains=q) | Qfilter(categoria__nombre__icontains=q))
+        # Búsqueda de texto completo ordenada por relevancia (ver tienda.busqueda)
+        productos = buscar_productos(productos, q)
+    
+    return productos
 
-    return render(request, 'catalogo.html', {
+async def _estado_catalogo(request):
+    """Última modificación y número de productos filtrados y de categorías (para ETag y Last-Modified)"""
+    productos = await _productos_catalogo(request).order_by().aaggregate(
+        ultima=Max('actualizado'), total=Count('id')
+    )
+    categorias = await Categoria.objects.aaggregate(ultima=Max('actualizado'), total=Count('id'))
+    ultimas = [f for f in (productos['ultima'], categorias['ultima']) if f]
+    return {
+        'ultima': max(ultimas) if ultimas else None,
         'productos': productos,
         'categorias': categorias,
-        'q': q,
-        'categoria_seleccionada': categoria_id,
-    })
+    }
+
+def _etag_catalogo(request, usuario, estado):
+    """
+    ETag del catálogo: cambia con los productos filtrados, las categorías,
+    la página pedida y el usuario (la página incluye su nombre y token CSRF)
+    """
+    # En la primera visita la cookie CSRF aún no existe: get_token la crea ya
+    # (la plantilla la crearía después del ETag y este no coincidiría con el
+    # de las siguientes peticiones)
+    get_token(request)
+    partes = [
+        usuario.pk,
+        request.META.get('CSRF_COOKIE', ''),
+        sorted(request.GET.lists()),
+        estado['productos']['ultima'],
+        estado['productos']['total'],
+        estado['categorias']['ultima'],
+        estado['categorias']['total'],
+    ]
+    return quote_etag(hashlib.md5(repr(partes).encode('utf-8')).hexdigest())
+
+async def arender(request, plantilla, contexto):
+    """
+    render() desde una vista async. Se ejecuta en un hilo porque los context
+    processors (usuario, permisos) pueden consultar la base de datos; los
+    datos de la vista ya deben venir evaluados.
+    """
+    return await sync_to_async(render)(request, plantilla, contexto)
+
+@login_required
+@cache_control(private=True, no_cache=True)
+async def catalogo(request):
+    """Listado público (para usuarios autenticados) de productos - catálogo"""
+    # GET condicional: si nada cambió se responde 304 sin leer los productos
+    estado = await _estado_catalogo(request)
+    etag = _etag_catalogo(request, await request.auser(), estado)
+    ultima = int(estado['ultima'].timestamp()) if estado['ultima'] else None
+    respuesta = get_conditional_response(request, etag=etag, last_modified=ultima)
+    
+    if respuesta is None:
+        productos = _productos_catalogo(request)
+        categorias = [cat async for cat in Categoria.objects.aiterator()]
+        
+        categoria_id = request.GET.get('categoria')
+        q = request.GET.get('q', '').strip()
+        
+        # El total ya se contó para el ETag: el paginador no vuelve a contar
+        por_pagina = getattr(settings, 'TIENDA_CATALOGO_POR_PAGINA', 24)
+        paginador = Paginator(range(estado['productos']['total']), por_pagina)
+        numero = paginador.get_page(request.GET.get('pagina')).number
+        inicio = (numero - 1) * por_pagina
+        items = [p async for p in productos[inicio:inicio + por_pagina].aiterator()]
+        pagina = Page(items, numero, paginador)
+        
+        # Parámetros actuales sin la página, para los enlaces de paginación
+        params = request.GET.copy()
+        params.pop('pagina', None)
+
+        respuesta = await arender(request, 'catalogo.html', {
+            'productos': pagina,
+            # Caché y render_to_string son síncronos: fuera del bucle de eventos
+            'tarjetas': await sync_to_async(tarjetas_productos)(items),
+            'pagina': pagina,
+            'query_filtros': params.urlencode(),
+            'categorias': categorias,
+            'q': q,
+            'categoria_seleccionada': categoria_id,
+        })
+    
+    respuesta.headers.setdefault('ETag', etag)
+    if ultima:
+        respuesta.headers.setdefault('Last-Modified', http_date(ultima))
+    return respuesta
 
 @login_required
 @permission_required('tienda.view_venta', raise_exception=True)
-def ventas(request):
+@leer_de_replica
+async def ventas(request):
     """Lista todas las ventas con filtros opcionales"""
     ventas = Venta.objects.select_related('producto', 'producto__categoria', 'vendedor').all()
-    categorias = Categoria.objects.all()
+    usuario = await request.auser()
+    puede_exportar = await usuario.ahas_perm('tienda.export_sales_reports')
     
     # Filtros
     fecha_inicio = request.GET.get('inicio')
@@ -147,329 +243,194 @@ def ventas(request):
         ventas = ventas.filter(producto__id=producto)
         filtros_activos['producto'] = producto
     
-    # Cálculos
-    total_ventas = ventas.count()
-    ingreso_total = sum(float(v.total()) for v in ventas) if ventas.exists() else 0
-    promedio_por_venta = ingreso_total / total_ventas if total_ventas > 0 else 0
-    
-    productos = Producto.objects.all()
-    
-    return render(request, 'ventas.html', {
-        'ventas': ventas,
-        'categorias': categorias,
-        'productos': productos,
+    # Exportación en streaming (CSV / JSON Lines)
+    formato = request.GET.get('formato', 'web').strip()
+    if formato in FORMATOS_EXPORTACION:
+        if not puede_exportar:
+            return redirect('tienda:ventas')
+        return exportar_ventas_para(request, ventas, formato)
+    
+    # Cálculos (agregados en la base de datos)
+    totales = await ventas.order_by().aaggregate(num_ventas=Count('id'), ingreso=INGRESO_VENTA)
+    total_ventas = totales['num_ventas']
+    ingreso_total = totales['ingreso'] or Decimal('0')
+    promedio_por_venta = ingreso_total / total_ventas if total_ventas > 0 else Decimal('0')
+    
+    return await arender(request, 'ventas.html', {
+        'ventas': await apaginar_ventas(request, ventas),
+        'categorias': [cat async for cat in Categoria.objects.aiterator()],
+        'productos': [prod async for prod in Producto.objects.aiterator()],
         'total': ingreso_total,
         'cantidad_ventas': total_ventas,
         'promedio_venta': promedio_por_venta,
         'filtros': filtros_activos,
+        'puede_exportar': puede_exportar,
     })
 
 @login_required
 @permission_required('tienda.view_sales_reports', raise_exception=True)
-def reporte_ventas(request):
+@leer_de_replica
+async def reporte_ventas(request):
     """
     Vista de reportes de ventas con filtros avanzados
     Soporta visualización web y descarga PDF
     """
     ventas = Venta.objects.select_related('producto', 'producto__categoria', 'vendedor').all()
-    categorias = Categoria.objects.all()
-    productos = Producto.objects.all()
+    usuario = await request.auser()
+    puede_exportar = await usuario.ahas_perm('tienda.export_sales_reports')
     
     # Parámetros de filtro
     fecha_inicio = request.GET.get('fecha_inicio', '').strip()
     fecha_fin = request.GET.get('fecha_fin', '').strip()
-    categoria = request.GET.get('categoria', '').strip()
-    producto = request.GET.get('producto', '').strip()
-    formato = request.GET.get('formato', 'web').strip()  # web o pdf
-    
-    # Aplicar filtros
-    filtros_activos = {}
-    
-    if fecha_inicio:
-        try:
-            fecha_inicio_parsed = parse_date(fecha_inicio)
-            if fecha_inicio_parsed:
-                ventas = ventas.filter(fecha__gte=fecha_inicio_parsed)
-                filtros_activos['fecha_inicio'] = fecha_inicio
-        except:
-            fecha_inicio = None
+    formato = request.GET.get('formato', 'web').strip()  # web, pdf, csv o jsonl
     
-    if fecha_fin:
-        try:
-            fecha_fin_parsed = parse_date(fecha_fin)
-            if fecha_fin_parsed:
-                ventas = ventas.filter(fecha__lte=fecha_fin_parsed)
-                filtros_activos['fecha_fin'] = fecha_fin
-        except:
-            fecha_fin = None
+    # Aplicar filtros (los mismos criterios sirven para Venta y VentaDiaria)
+    criterios, filtros_activos = criterios_reporte(request.GET)
+    ventas = ventas.filter(**criterios)
     
-    if categoria:
-        try:
-            cat_id = int(categoria)
-            ventas = ventas.filter(producto__categoria_id=cat_id)
-            filtros_activos['categoria'] = categoria
-        except (ValueError, TypeError):
-            pass
-    
-    if producto:
-        try:
-            prod_id = int(producto)
-            ventas = ventas.filter(producto_id=prod_id)
-            filtros_activos['producto'] = producto
-        except (ValueError, TypeError):
-            pass
+    # Exportación en streaming (CSV / JSON Lines): no necesita el resumen
+    if formato in FORMATOS_EXPORTACION:
+        if not puede_exportar:
+            return redirect('tienda:reporte_ventas')
+        return exportar_ventas_para(request, ventas, formato, prefijo='reporte_ventas')
     
-    # Cálculos agregados
-    total_ventas_count = ventas.count()
-    ingreso_total = sum(float(v.total()) for v in ventas) if ventas.exists() else 0
-    cantidad_productos = ventas.values('producto').distinct().count() if ventas.exists() else 0
+    categorias = [cat async for cat in Categoria.objects.aiterator()]
     
-    datos_reporte = {
-        'total_ventas': total_ventas_count,
-        'ingreso_total': ingreso_total,
-        'cantidad_productos': cantidad_productos,
-        'vendedor_top': None,
-    }
+    # Cálculos agregados: una sola consulta agrupada alimenta los KPIs,
+    # el vendedor top y el desglose por categoría
+    datos_reporte, reporte_categorias = await aobtener_reporte(
+        'ventas', criterios, lambda: aresumir_ventas(criterios, categorias)
+    )
     
-    if ventas.exists():
-        vendedor_stats = ventas.values('vendedor__username').annotate(
-            cantidad=Sum('cantidad')
-        ).order_by('-cantidad').first()
-        if vendedor_stats:
-            datos_reporte['vendedor_top'] = vendedor_stats['vendedor__username']
-    
-    # Agrupar por categoría
-    reporte_categorias = []
-    for cat in categorias:
-        ventas_cat = ventas.filter(producto__categoria=cat)
-        if ventas_cat.exists():
-            ingreso_cat = sum(float(v.total()) for v in ventas_cat)
-            reporte_categorias.append({
-                'categoria': cat,
-                'cantidad': ventas_cat.count(),
-                'ingreso': ingreso_cat,
-                'promedio': ingreso_cat / ventas_cat.count() if ventas_cat.count() > 0 else 0,
-            })
-    
-    # Si es PDF, generar descarga
+    # Si es PDF, generar descarga (ReportLab es síncrono: se ejecuta en un hilo)
     if formato == 'pdf':
-        if not check_permission(request.user, 'export_sales_reports'):
+        if not puede_exportar:
             return redirect('tienda:reporte_ventas')
-        return generar_pdf_reporte(ventas, datos_reporte, reporte_categorias, filtros_activos)
+        return await sync_to_async(generar_pdf_reporte)(ventas, datos_reporte, reporte_categorias, filtros_activos)
     
     context = {
-        'ventas': ventas,
+        'ventas': await apaginar_ventas(request, ventas),
         'categorias': categorias,
-        'productos': productos,
+        'productos': [prod async for prod in Producto.objects.aiterator()],
         'datos_reporte': datos_reporte,
         'reporte_categorias': reporte_categorias,
         'filtros': filtros_activos,
-        'puede_exportar': check_permission(request.user, 'export_sales_reports'),
+        'puede_exportar': puede_exportar,
         'fecha_inicio': fecha_inicio,
         'fecha_fin': fecha_fin,
     }
     
-    return render(request, 'reportes/reporte_ventas.html', context)
+    return await arender(request, 'reportes/reporte_ventas.html', context)
+
+def _estado_exportacion(trabajo):
+    """Representación JSON de un trabajo de exportación"""
+    datos = {
+        'id': trabajo.pk,
+        'formato': trabajo.formato,
+        'estado': trabajo.estado,
+        'filtros': trabajo.filtros,
+        'creado': trabajo.creado.isoformat(),
+        'terminado': trabajo.terminado.isoformat() if trabajo.terminado else None,
+        'url_estado': reverse('tienda:estado_exportacion', args=[trabajo.pk]),
+        'url_descarga': None,
+    }
+    if trabajo.estado == ExportacionReporte.COMPLETADO:
+        datos['url_descarga'] = reverse('tienda:descargar_exportacion', args=[trabajo.pk])
+        datos['tamano'] = trabajo.tamano
+    elif trabajo.estado == ExportacionReporte.ERROR:
+        datos['error'] = trabajo.error
+    return datos
 
-def generar_pdf_reporte(ventas, datos_reporte, reporte_categorias, filtros):
+@login_required
+@permission_required('tienda.export_sales_reports', raise_exception=True)
+@require_http_methods(['POST'])
+def encolar_reporte(request):
     """
-    Genera un PDF con el reporte de ventas
+    Encola la exportación de reporte_ventas con los filtros recibidos.
+    Reutiliza un trabajo anterior si los filtros y los datos no cambiaron.
     """
-    if not REPORTLAB_AVAILABLE:
-        return HttpResponse(
-            "ReportLab no está instalado. Instálalo con: pip install reportlab",
-            status=400
-        )
+    formato = request.POST.get('formato', 'pdf').strip()
+    if formato not in dict(ExportacionReporte.OPCIONES_FORMATO):
+        return JsonResponse({'error': f'Formato no soportado: {formato}'}, status=400)
     
-    try:
-        # Crear respuesta HTTP
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="reporte_ventas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf"'
-        
-        # Crear PDF
-        doc = SimpleDocTemplate(response, pagesize=letter)
-        elements = []
-        
-        # Estilos
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            textColor=colors.HexColor('#1f4788'),
-            spaceAfter=30,
-            alignment=TA_CENTER,
-        )
-        
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading2'],
-            fontSize=12,
-            textColor=colors.HexColor('#2e5090'),
-            spaceAfter=12,
-            spaceBefore=12,
-        )
-        
-        # Título
-        titulo = Paragraph("REPORTE DE VENTAS", title_style)
-        elements.append(titulo)
-        
-        # Información de filtros
-        fecha_reporte = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-        info_filtros = f"Generado: {fecha_reporte}"
-        if filtros and any(filtros.values()):
-            info_filtros += " | Filtros aplicados:"
-            if filtros.get('fecha_inicio'):
-                info_filtros += f" Desde {filtros['fecha_inicio']}"
-            if filtros.get('fecha_fin'):
-                info_filtros += f" Hasta {filtros['fecha_fin']}"
-            if filtros.get('categoria'):
-                info_filtros += f" Categoría: {filtros['categoria']}"
-        
-        elements.append(Paragraph(info_filtros, styles['Normal']))
-        elements.append(Spacer(1, 0.3*inch))
-        
-        # Resumen general
-        elements.append(Paragraph("RESUMEN GENERAL", heading_style))
-        
-        try:
-            ingreso_total = float(datos_reporte.get('ingreso_total', 0))
-            total_ventas = int(datos_reporte.get('total_ventas', 0))
-            cantidad_productos = int(datos_reporte.get('cantidad_productos', 0))
-            vendedor_top = datos_reporte.get('vendedor_top') or 'N/A'
-        except (ValueError, TypeError):
-            ingreso_total = 0
-            total_ventas = 0
-            cantidad_productos = 0
-            vendedor_top = 'N/A'
-        
-        datos_resumen = [
-            ['Métrica', 'Valor'],
-            ['Total de Ventas', str(total_ventas)],
-            ['Ingreso Total', f"${ingreso_total:.2f}"],
-            ['Cantidad de Productos', str(cantidad_productos)],
-            ['Vendedor Top', str(vendedor_top)],
-        ]
-        
-        tabla_resumen = Table(datos_resumen, colWidths=[3*inch, 2*inch])
-        tabla_resumen.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f4788')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
-        
-        elements.append(tabla_resumen)
-        elements.append(Spacer(1, 0.3*inch))
-        
-        # Reporte por categoría
-        if reporte_categorias and len(reporte_categorias) > 0:
-            elements.append(Paragraph("VENTAS POR CATEGORÍA", heading_style))
-            
-            datos_categorias = [
-                ['Categoría', 'Cantidad', 'Ingreso Total', 'Promedio'],
-            ]
-            
-            for item in reporte_categorias:
-                try:
-                    datos_categorias.append([
-                        str(item['categoria'].nombre),
-                        str(item['cantidad']),
-                        f"${float(item['ingreso']):.2f}",
-                        f"${float(item['promedio']):.2f}",
-                    ])
-                except (ValueError, KeyError, TypeError):
-                    continue
-            
-            if len(datos_categorias) > 1:  # Si hay más que el encabezado
-                tabla_categorias = Table(datos_categorias, colWidths=[2*inch, 1.2*inch, 1.2*inch, 1.2*inch])
-                tabla_categorias.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f4788')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.lightgrey),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ]))
-                elements.append(tabla_categorias)
-        
-        # Construir PDF
-        doc.build(elements)
-        return response
-    
-    except Exception as e:
-        return HttpResponse(
-            f"Error al generar PDF: {str(e)}",
-            status=500
-        )
+    trabajo = encolar_exportacion(request.user, formato, request.POST)
+    return JsonResponse(_estado_exportacion(trabajo), status=202)
+
+@login_required
+def estado_exportacion(request, trabajo_id):
+    """Estado de un trabajo de exportación del usuario"""
+    trabajo = get_object_or_404(ExportacionReporte, id=trabajo_id, usuario=request.user)
+    return JsonResponse(_estado_exportacion(trabajo))
+
+@login_required
+def descargar_exportacion(request, trabajo_id):
+    """Descarga el archivo de un trabajo de exportación completado"""
+    trabajo = get_object_or_404(ExportacionReporte, id=trabajo_id, usuario=request.user)
+    if trabajo.estado != ExportacionReporte.COMPLETADO or not trabajo.archivo:
+        raise Http404("La exportación aún no está disponible")
+    
+    return FileResponse(
+        trabajo.archivo.open('rb'),
+        as_attachment=True,
+        filename=f"reporte_ventas_{trabajo.creado.strftime('%Y%m%d_%H%M%S')}.{trabajo.formato}",
+    )
 
 @login_required
 @permission_required('tienda.view_sales_reports', raise_exception=True)
-def reporte_por_categoria(request):
+@leer_de_replica
+async def reporte_por_categoria(request):
     """Reporte detallado por categoría"""
-    categorias = Categoria.objects.all()
-    categoria_id = request.GET.get('categoria')
+    usuario = await request.auser()
     
-    reporte_datos = []
+    reporte_datos = await aobtener_reporte('categorias', {}, aresumir_por_categoria)
     
-    for cat in categorias:
-        ventas = Venta.objects.filter(producto__categoria=cat)
-        if ventas.exists():
-            reporte_datos.append({
-                'categoria': cat,
-                'total_ventas': ventas.count(),
-                'ingreso': sum(float(v.total()) for v in ventas),
-                'productos': Producto.objects.filter(categoria=cat).count(),
-            })
-    
-    return render(request, 'reportes/reporte_categorias.html', {
+    return await arender(request, 'reportes/reporte_categorias.html', {
         'reporte': reporte_datos,
-        'categorias': categorias,
-        'puede_exportar': check_permission(request.user, 'export_sales_reports'),
+        'categorias': [cat async for cat in Categoria.objects.aiterator()],
+        'puede_exportar': await usuario.ahas_perm('tienda.export_sales_reports'),
     })
 
 @login_required
-def reporte_por_producto(request):
+@leer_de_replica
+async def reporte_por_producto(request):
     """Reporte detallado por producto"""
-    productos = Producto.objects.all()
-    
-    reporte_datos = []
-    
-    for prod in productos:
-        ventas = Venta.objects.filter(producto=prod)
-        if ventas.exists():
-            ingreso_total = sum(float(v.total()) for v in ventas)
-            cantidad_ventas = ventas.count()
-            ingreso_promedio = ingreso_total / cantidad_ventas if cantidad_ventas > 0 else 0
-            reporte_datos.append({
-                'producto': prod,
-                'total_ventas': cantidad_ventas,
-                'ingreso': ingreso_total,
-                'cantidad_vendida': sum(v.cantidad for v in ventas),
-                'ingreso_promedio': ingreso_promedio,
-            })
-    
-    return render(request, 'reportes/reporte_productos.html', {
+    usuario = await request.auser()
+    
+    reporte_datos = await aobtener_reporte('productos', {}, aresumir_por_producto)
+    
+    return await arender(request, 'reportes/reporte_productos.html', {
         'reporte': reporte_datos,
-        'productos': productos,
-        'puede_exportar': check_permission(request.user, 'export_sales_reports'),
+        'productos': [prod async for prod in Producto.objects.select_related('categoria').aiterator()],
+        'puede_exportar': await usuario.ahas_perm('tienda.export_sales_reports'),
     })
 
+@login_required
+def estadisticas_cache(request):
+    """Aciertos y fallos de la caché de reportes (solo staff)"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Solo personal autorizado'}, status=403)
+    return JsonResponse(estadisticas_cache_reportes())
+
+def metricas(request):
+    """Métricas en formato Prometheus (ver tienda.metricas)"""
+    if not metricas_prometheus.PROMETHEUS_DISPONIBLE:
+        return HttpResponse(
+            "prometheus_client no está instalado. Instálalo con: pip install prometheus-client",
+            status=503
+        )
+    if not metricas_prometheus.autorizado(request):
+        return HttpResponse("No autorizado", status=403)
+    contenido, tipo = metricas_prometheus.exponer()
+    return HttpResponse(contenido, content_type=tipo)
+
 @login_required
 def carrito(request):
     """Vista del carrito de compras"""
-    items = CarritoItem.objects.filter(usuario=request.user).select_related('producto')
-    total = sum(float(item.subtotal()) for item in items) if items.exists() else 0
+    items = obtener_carrito(request).lineas()
     
     return render(request, 'carrito.html', {
         'items': items,
-        'total': total,
+        'total': total_carrito(items),
     })
 
 @login_required
@@ -481,80 +442,155 @@ def agregar_carrito(request):
     
     try:
         producto = Producto.objects.get(id=producto_id)
-        
-        # Verificar stock
-        if cantidad > producto.stock:
-            cantidad = producto.stock
-        
-        # Obtener o crear item del carrito
-        item, created = CarritoItem.objects.get_or_create(
-            usuario=request.user,
-            producto=producto,
-            defaults={'cantidad': cantidad}
-        )
-        
-        if not created:
-            # Si el item ya existe, aumentar cantidad
-            item.cantidad += cantidad
-            if item.cantidad > producto.stock:
-                item.cantidad = producto.stock
-            item.save()
-        
-        return redirect('tienda:carrito')
     except Producto.DoesNotExist:
         return redirect('tienda:productos')
+    
+    # La cantidad se limita al stock disponible
+    obtener_carrito(request).agregar(producto, cantidad)
+    return redirect('tienda:carrito')
 
 @login_required
 @require_http_methods(['POST'])
 def eliminar_carrito(request, item_id):
-    """Eliminar un item del carrito"""
-    item = get_object_or_404(CarritoItem, id=item_id, usuario=request.user)
-    item.delete()
+    """Eliminar un item del carrito (item_id es el id del producto)"""
+    if not obtener_carrito(request).eliminar(item_id):
+        raise Http404
     return redirect('tienda:carrito')
 
 @login_required
 @require_http_methods(['POST'])
 def actualizar_cantidad(request, item_id):
-    """Actualizar cantidad de un item en el carrito"""
+    """Actualizar cantidad de un item en el carrito (item_id es el id del producto)"""
     cantidad = int(request.POST.get('cantidad', 1))
-    item = get_object_or_404(CarritoItem, id=item_id, usuario=request.user)
-    
-    if cantidad > 0 and cantidad <= item.producto.stock:
-        item.cantidad = cantidad
-        item.save()
-    elif cantidad <= 0:
-        item.delete()
-    
+    if not obtener_carrito(request).actualizar(item_id, cantidad):
+        raise Http404
     return redirect('tienda:carrito')
 
+def _rechazadas(usuario_id, cantidades, rechazados):
+    """Líneas no actualizadas por falta de stock, como las `rechazadas` de procesar_compra"""
+    if not rechazados:
+        return []
+    productos = list(Producto.objects.filter(pk__in=rechazados).only('nombre', 'stock').order_by('pk'))
+    libres = disponible(productos, usuario_id)
+    return [
+        {
+            'producto_id': producto.pk,
+            'producto': producto.nombre,
+            'cantidad': cantidades[producto.pk],
+            'disponible': libres[producto.pk],
+        }
+        for producto in productos
+    ]
+
+def _respuesta_carrito(carrito_usuario, producto_ids, una_linea=False, rechazadas=()):
+    """
+    Líneas afectadas y totales del carrito (un único agregado en la base de
+    datos), más las líneas que no se pudieron actualizar por falta de stock
+    """
+    lineas = [linea.como_dict() for linea in carrito_usuario.lineas(producto_ids)]
+    totales = carrito_usuario.totales()
+    datos = {
+        'num_lineas': totales['num_lineas'],
+        'unidades': totales['unidades'],
+        'total': str(totales['total']),
+    }
+    if una_linea:
+        # None si la línea se eliminó
+        datos['linea'] = lineas[0] if lineas else None
+    else:
+        datos['lineas'] = lineas
+    datos['rechazadas'] = list(rechazadas)
+    return JsonResponse(datos)
+
+def _entero(valor, por_defecto=None):
+    try:
+        return int(valor) if valor not in (None, '') else por_defecto
+    except (TypeError, ValueError):
+        return None
+
+@login_required
+@require_http_methods(['POST'])
+def api_agregar_carrito(request):
+    """Versión JSON de agregar_carrito"""
+    producto_id = _entero(request.POST.get('producto_id'))
+    cantidad = _entero(request.POST.get('cantidad'), 1)
+    if producto_id is None or cantidad is None or cantidad <= 0:
+        return JsonResponse({'error': 'producto_id y cantidad deben ser enteros positivos'}, status=400)
+    
+    producto = Producto.objects.filter(id=producto_id).first()
+    if producto is None:
+        return JsonResponse({'error': 'Producto no encontrado'}, status=404)
+    
+    carrito_usuario = obtener_carrito(request)
+    carrito_usuario.agregar(producto, cantidad)
+    return _respuesta_carrito(carrito_usuario, {producto_id}, una_linea=True)
+
+@login_required
+@require_http_methods(['POST'])
+def api_actualizar_cantidad(request, item_id):
+    """Versión JSON de actualizar_cantidad (cantidad <= 0 elimina la línea)"""
+    cantidad = _entero(request.POST.get('cantidad'), 1)
+    if cantidad is None:
+        return JsonResponse({'error': 'cantidad debe ser un entero'}, status=400)
+    
+    carrito_usuario = obtener_carrito(request)
+    presentes, rechazados = carrito_usuario.actualizar_varios({item_id: cantidad})
+    if item_id not in presentes:
+        return JsonResponse({'error': 'El producto no está en el carrito'}, status=404)
+    return _respuesta_carrito(
+        carrito_usuario, {item_id}, una_linea=True,
+        rechazadas=_rechazadas(request.user.pk, {item_id: cantidad}, rechazados),
+    )
+
+@login_required
+@require_http_methods(['POST'])
+def api_eliminar_carrito(request, item_id):
+    """Versión JSON de eliminar_carrito"""
+    carrito_usuario = obtener_carrito(request)
+    if not carrito_usuario.eliminar(item_id):
+        return JsonResponse({'error': 'El producto no está en el carrito'}, status=404)
+    return _respuesta_carrito(carrito_usuario, {item_id}, una_linea=True)
+
+@login_required
+@require_http_methods(['POST'])
+def api_actualizar_carrito(request):
+    """
+    Actualiza varias cantidades en una petición.
+    Cuerpo JSON: {"cantidades": {"<producto_id>": <cantidad>, ...}}
+    """
+    try:
+        cantidades = json.loads(request.body)['cantidades']
+        cantidades = {int(producto_id): int(cantidad) for producto_id, cantidad in cantidades.items()}
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse({'error': 'Se esperaba {"cantidades": {"<producto_id>": <cantidad>}}'}, status=400)
+    
+    carrito_usuario = obtener_carrito(request)
+    actualizados, rechazados = carrito_usuario.actualizar_varios(cantidades)
+    return _respuesta_carrito(
+        carrito_usuario, actualizados,
+        rechazadas=_rechazadas(request.user.pk, cantidades, rechazados),
+    )
+
 @login_required
 @require_http_methods(['POST'])
 def procesar_compra(request):
-    """Procesar la compra: crear ventas y limpiar carrito"""
-    items = CarritoItem.objects.filter(usuario=request.user).select_related('producto')
-    
-    if not items.exists():
+    """Procesar la compra: crear ventas y limpiar carrito (ver tienda.compras)"""
+    # Con el carrito en caché o sesión, se vuelca a CarritoItem antes de comprar
+    carrito_usuario = obtener_carrito(request)
+    carrito_usuario.persistir()
+    ventas, rechazadas = procesar_carrito(request.user)
+    carrito_usuario.vaciar()
+    if not ventas and not rechazadas:
+        # Carrito vacío
         return redirect('tienda:carrito')
     
-    # Crear ventas por cada item del carrito
-    for item in items:
-        # Verificar stock disponible
-        if item.cantidad <= item.producto.stock:
-            Venta.objects.create(
-                producto=item.producto,
-                cantidad=item.cantidad,
-                vendedor=request.user
-            )
-            # Reducir stock del producto
-            item.producto.stock -= item.cantidad
-            item.producto.save()
-    
-    # Limpiar carrito
-    items.delete()
-    
+    # Las líneas sin stock suficiente se muestran en la página de confirmación
+    request.session['compra_rechazadas'] = rechazadas
     return redirect('tienda:compra_exitosa')
 
 @login_required
 def compra_exitosa(request):
     """Página de confirmación de compra"""
-    return render(request, 'compra_exitosa.html')
+    rechazadas = request.session.pop('compra_rechazadas', [])
+    return render(request, 'compra_exitosa.html', {'rechazadas': rechazadas})
+